@@ -0,0 +1,34 @@
+"""audio inverted index
+
+Revision ID: 004
+Revises: 003
+Create Date: 2024-01-04 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "004"
+down_revision: Union[str, None] = "003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "audio_index",
+        sa.Column("video_id", sa.UUID(), sa.ForeignKey("base_videos.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("hash", sa.Integer(), nullable=False),
+        sa.Column("sample_offset", sa.Integer(), nullable=False),
+    )
+
+    op.create_index("idx_audio_index_hash", "audio_index", ["hash"])
+    op.create_index("idx_audio_index_video_id", "audio_index", ["video_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("idx_audio_index_video_id")
+    op.drop_index("idx_audio_index_hash")
+    op.drop_table("audio_index")
@@ -0,0 +1,30 @@
+"""frame embedding ann index
+
+Revision ID: 005
+Revises: 004
+Create Date: 2024-01-05 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "005"
+down_revision: Union[str, None] = "004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # pgvector cannot index vector columns wider than 2000 dimensions, so the
+    # 2048-d embedding is indexed through a half-precision expression instead.
+    op.execute("""
+        CREATE INDEX idx_frame_fingerprints_embedding_hnsw
+        ON frame_fingerprints
+        USING hnsw ((embedding::halfvec(2048)) halfvec_cosine_ops)
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_frame_fingerprints_embedding_hnsw")
@@ -0,0 +1,43 @@
+"""compact embeddings
+
+Revision ID: 006
+Revises: 005
+Create Date: 2024-01-06 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "006"
+down_revision: Union[str, None] = "005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "embedding_projections",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("dim", sa.Integer(), nullable=False),
+        sa.Column("components", sa.LargeBinary(), nullable=False),
+        sa.Column("center", sa.LargeBinary(), nullable=False),
+        sa.Column("scale", sa.LargeBinary(), nullable=False),
+        sa.Column("sample_size", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(), server_default=sa.func.now()),
+    )
+
+    op.add_column("frame_fingerprints", sa.Column("compact_embedding", sa.LargeBinary()))
+    op.add_column(
+        "frame_fingerprints",
+        sa.Column("compact_projection_id", sa.Integer(), sa.ForeignKey("embedding_projections.id")),
+    )
+    op.add_column("frame_fingerprints", sa.Column("compact_method", sa.String(16)))
+
+
+def downgrade() -> None:
+    op.drop_column("frame_fingerprints", "compact_method")
+    op.drop_column("frame_fingerprints", "compact_projection_id")
+    op.drop_column("frame_fingerprints", "compact_embedding")
+    op.drop_table("embedding_projections")
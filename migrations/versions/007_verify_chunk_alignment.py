@@ -0,0 +1,26 @@
+"""verify chunk temporal alignment
+
+Revision ID: 007
+Revises: 006
+Create Date: 2024-01-07 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "007"
+down_revision: Union[str, None] = "006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("verify_chunks", sa.Column("alignment_score", sa.Float()))
+    op.add_column("verify_chunks", sa.Column("alignment_offset_seconds", sa.Float()))
+
+
+def downgrade() -> None:
+    op.drop_column("verify_chunks", "alignment_offset_seconds")
+    op.drop_column("verify_chunks", "alignment_score")
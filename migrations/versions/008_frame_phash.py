@@ -0,0 +1,25 @@
+"""frame perceptual hash
+
+Revision ID: 008
+Revises: 007
+Create Date: 2024-01-08 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "008"
+down_revision: Union[str, None] = "007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 64-bit dHash of each frame, stored as a signed bigint
+    op.add_column("frame_fingerprints", sa.Column("phash", sa.BigInteger()))
+
+
+def downgrade() -> None:
+    op.drop_column("frame_fingerprints", "phash")
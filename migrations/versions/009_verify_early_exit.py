@@ -0,0 +1,28 @@
+"""verify early exit
+
+Revision ID: 009
+Revises: 008
+Create Date: 2024-01-09 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "009"
+down_revision: Union[str, None] = "008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("verify_sessions", sa.Column("decision", sa.String(50)))
+    op.add_column("verify_sessions", sa.Column("decided_at", sa.TIMESTAMP()))
+    op.add_column("verify_chunks", sa.Column("worker_seconds", sa.Float()))
+
+
+def downgrade() -> None:
+    op.drop_column("verify_chunks", "worker_seconds")
+    op.drop_column("verify_sessions", "decided_at")
+    op.drop_column("verify_sessions", "decision")
@@ -0,0 +1,27 @@
+"""verify session group
+
+Revision ID: 010
+Revises: 009
+Create Date: 2024-01-10 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "010"
+down_revision: Union[str, None] = "009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Sessions verifying one query against several bases share a group_id
+    op.add_column("verify_sessions", sa.Column("group_id", sa.UUID()))
+    op.create_index("idx_verify_sessions_group_id", "verify_sessions", ["group_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("idx_verify_sessions_group_id")
+    op.drop_column("verify_sessions", "group_id")
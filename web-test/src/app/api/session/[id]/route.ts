@@ -28,6 +28,8 @@ export async function GET(
       let isClosed = false;
       let completedCount = 0;
       let finalizeCompleted = false;
+      let decidedTaskId: string | null = null;
+      let decision: string | null = null;
 
       const cleanup = () => {
         if (isClosed) return;
@@ -78,10 +80,17 @@ export async function GET(
           const taskId = channel.replace("task:status:", "");
           sendEvent(JSON.stringify({ ...data, taskId }));
 
+          // An early-exit decision is final; the deciding chunk's own result follows it
+          if (data.status === "decided") {
+            decidedTaskId = taskId;
+            decision = data.decision;
+            return;
+          }
+
           if (data.status === "completed" || data.status === "failed") {
             completedCount++;
-            if (!waitForFinalize && completedCount >= totalChunks) {
-              sendEvent(JSON.stringify({ type: "session_complete", sessionId }));
+            if (!waitForFinalize && (completedCount >= totalChunks || taskId === decidedTaskId)) {
+              sendEvent(JSON.stringify({ type: "session_complete", sessionId, decision }));
               safeClose();
             }
           }
@@ -144,6 +144,7 @@ export default function JobList({ videoId, refreshTrigger }: Props) {
   const getStatusBadge = (status: string) => {
     const colors: Record<string, string> = {
       completed: "bg-green-500/20 text-green-400",
+      decided: "bg-blue-500/20 text-blue-400",
       processing: "bg-yellow-500/20 text-yellow-400",
       pending: "bg-gray-500/20 text-gray-400",
       failed: "bg-red-500/20 text-red-400",
@@ -251,7 +252,7 @@ export default function JobList({ videoId, refreshTrigger }: Props) {
                     </div>
                   </div>
                   <div className="flex items-center gap-3">
-                    {session.status === "completed" && session.avgImageSimilarity !== null && (
+                    {(session.status === "completed" || session.status === "decided") && session.avgImageSimilarity !== null && (
                       <div className="text-right">
                         <div className={`text-lg font-bold ${getSimilarityColor(session.avgImageSimilarity)}`}>
                           {((session.avgImageSimilarity || 0) * 100).toFixed(1)}%
@@ -114,6 +114,8 @@ export default function ResultDisplay({ results, sessionId }: Props) {
                 ? "bg-red-500/10 border-red-500/30"
                 : result.status === "completed"
                 ? "bg-green-500/10 border-green-500/30"
+                : result.status === "decided"
+                ? "bg-blue-500/10 border-blue-500/30"
                 : "bg-yellow-500/10 border-yellow-500/30"
             }`}
           >
@@ -153,6 +155,8 @@ export default function ResultDisplay({ results, sessionId }: Props) {
                   ? "bg-green-500/20 text-green-400"
                   : result.status === "failed"
                   ? "bg-red-500/20 text-red-400"
+                  : result.status === "decided"
+                  ? "bg-blue-500/20 text-blue-400"
                   : "bg-yellow-500/20 text-yellow-400"
               }`}>
                 {result.status === "processing" && (
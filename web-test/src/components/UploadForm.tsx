@@ -116,7 +116,13 @@ export default function UploadForm({ type, baseVideoId, onTaskStarted, onResult,
 
             if (parsed.type === "session_complete") {
               eventSource.close();
-              setStatus(type === "register" ? "Registration completed" : "All chunks completed");
+              setStatus(
+                type === "register"
+                  ? "Registration completed"
+                  : parsed.decision
+                  ? `Decided: ${parsed.decision}`
+                  : "All chunks completed"
+              );
               setUploading(false);
               setFileName("");
               setChunkProgress(null);
@@ -0,0 +1,77 @@
+"""
+Benchmark the vectorized audio sliding-window search against the previous
+pure-Python implementation and check both return the same best match.
+
+    python -m benchmarks.audio_compare [--base-seconds 7200] [--query-seconds 60]
+"""
+import argparse
+import time
+import numpy as np
+from services.audio_fingerprint import (
+    SECONDS_PER_SAMPLE,
+    SLIDING_WINDOW_STEP_COARSE,
+    SLIDING_WINDOW_STEP_FINE,
+    TOP_CANDIDATES_FOR_FINE_SEARCH,
+    find_best_audio_offset,
+)
+
+
+def _legacy_similarity_at_offset(query: list[int], base: list[int], offset: int) -> float:
+    compare_len = min(len(query), len(base) - offset)
+    matching_bits = 0
+    for i in range(compare_len):
+        matching_bits += 32 - bin((query[i] ^ base[offset + i]) & 0xFFFFFFFF).count("1")
+    return matching_bits / (compare_len * 32)
+
+
+def _legacy_best_offset(query: list[int], base: list[int]) -> tuple[float, int]:
+    max_offset = len(base) - 1
+    coarse = [
+        (offset, _legacy_similarity_at_offset(query, base, offset))
+        for offset in range(0, max_offset + 1, SLIDING_WINDOW_STEP_COARSE)
+    ]
+    coarse.sort(key=lambda x: x[1], reverse=True)
+
+    best_similarity, best_offset = 0.0, 0
+    for candidate_offset, _ in coarse[:TOP_CANDIDATES_FOR_FINE_SEARCH]:
+        search_start = max(0, candidate_offset - SLIDING_WINDOW_STEP_COARSE)
+        search_end = min(max_offset, candidate_offset + SLIDING_WINDOW_STEP_COARSE)
+        for offset in range(search_start, search_end + 1, SLIDING_WINDOW_STEP_FINE):
+            similarity = _legacy_similarity_at_offset(query, base, offset)
+            if similarity > best_similarity:
+                best_similarity, best_offset = similarity, offset
+    return best_similarity, best_offset
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-seconds", type=float, default=7200)
+    parser.add_argument("--query-seconds", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    base = rng.integers(0, 1 << 32, int(args.base_seconds / SECONDS_PER_SAMPLE), dtype=np.uint32)
+    query_len = int(args.query_seconds / SECONDS_PER_SAMPLE)
+    # Random data has no autocorrelation, so keep the true offset on the coarse grid
+    true_offset = int(rng.integers(0, len(base) - query_len)) // SLIDING_WINDOW_STEP_COARSE * SLIDING_WINDOW_STEP_COARSE
+    query = base[true_offset:true_offset + query_len].copy()
+    # Flip a few bits so the match is not perfect
+    query ^= (rng.random(query_len) < 0.2).astype(np.uint32) << rng.integers(0, 32, query_len).astype(np.uint32)
+
+    start = time.perf_counter()
+    fast = find_best_audio_offset(query, base)
+    fast_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    legacy = _legacy_best_offset(query.tolist(), base.tolist())
+    legacy_elapsed = time.perf_counter() - start
+
+    print(f"base={len(base)} samples, query={query_len} samples, true offset={true_offset}")
+    print(f"legacy:     similarity={legacy[0]:.6f} offset={legacy[1]} in {legacy_elapsed:.3f}s")
+    print(f"vectorized: similarity={fast[0]:.6f} offset={fast[1]} in {fast_elapsed:.3f}s")
+    print(f"speedup: {legacy_elapsed / fast_elapsed:.1f}x, identical: {legacy == fast}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Per-chunk fingerprinting latency of the in-process libchromaprint backend
+against the fpcalc subprocess, on the same PCM buffer, and how closely the
+two fingerprints agree.
+
+    python -m benchmarks.audio_fingerprint_backend [--media <file>] [--chunk-seconds 60] [--repeat 5]
+
+Without --media a synthetic tone-and-noise signal is used.
+"""
+import argparse
+import statistics
+import time
+import numpy as np
+from config import CHUNK_DURATION_SECONDS
+from services import chromaprint_native
+from services.audio_fingerprint import generate_audio_fingerprint_fpcalc, compare_audio_fingerprints
+from services.video import AUDIO_SAMPLE_RATE, extract_audio_pcm
+
+
+def _synthetic_pcm(rng: np.random.Generator, seconds: float) -> bytes:
+    t = np.arange(int(seconds * AUDIO_SAMPLE_RATE)) / AUDIO_SAMPLE_RATE
+    # Stepped tones so chromaprint's chroma features change over time
+    freqs = 220 * 2 ** (rng.integers(0, 24, int(seconds) + 1) / 12)
+    signal = np.sin(2 * np.pi * freqs[t.astype(int)] * t) + 0.1 * rng.standard_normal(len(t))
+    return (signal / np.abs(signal).max() * 20000).astype("<i2").tobytes()
+
+
+def _time(fn, repeat: int) -> tuple[float, object]:
+    timings, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--media")
+    parser.add_argument("--chunk-seconds", type=float, default=CHUNK_DURATION_SECONDS)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.media:
+        pcm = extract_audio_pcm(args.media)
+        if not pcm:
+            raise SystemExit(f"No audio stream in {args.media}")
+        pcm = pcm[:int(args.chunk_seconds * AUDIO_SAMPLE_RATE) * 2]
+    else:
+        pcm = _synthetic_pcm(np.random.default_rng(0), args.chunk_seconds)
+
+    print(f"chunk: {len(pcm) / 2 / AUDIO_SAMPLE_RATE:.1f}s of mono s16le at {AUDIO_SAMPLE_RATE} Hz")
+
+    try:
+        fpcalc_elapsed, fpcalc_fp = _time(lambda: generate_audio_fingerprint_fpcalc(pcm, AUDIO_SAMPLE_RATE), args.repeat)
+    except FileNotFoundError:
+        fpcalc_fp = None
+    if fpcalc_fp is None:
+        print("fpcalc:      unavailable")
+    else:
+        print(f"fpcalc:      {fpcalc_elapsed * 1000:8.1f} ms  ({len(fpcalc_fp)} values)")
+
+    if not chromaprint_native.is_available():
+        print("chromaprint: libchromaprint not found")
+        return
+
+    native_elapsed, native_fp = _time(lambda: chromaprint_native.fingerprint_pcm(pcm, AUDIO_SAMPLE_RATE), args.repeat)
+    print(f"chromaprint: {native_elapsed * 1000:8.1f} ms  ({len(native_fp)} values)")
+
+    if fpcalc_fp is not None:
+        print(f"speedup: {fpcalc_elapsed / native_elapsed:.1f}x, identical: {np.array_equal(native_fp, fpcalc_fp)}, "
+              f"bit similarity: {compare_audio_fingerprints(native_fp, fpcalc_fp):.4f}")
+
+
+if __name__ == "__main__":
+    main()
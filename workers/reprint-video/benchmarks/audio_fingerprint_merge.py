@@ -0,0 +1,92 @@
+"""
+Merge and compare of a multi-hour audio fingerprint with the uint32 array
+representation versus the previous bytes/int-list round trips: merge as a
+per-sample int.from_bytes/to_bytes loop, compare converting each side from
+bytes with a copy. Chunk fingerprints arrive as bytes, as they come out of
+the bytea column.
+
+    python -m benchmarks.audio_fingerprint_merge [--hours 4] [--chunk-seconds 60] [--query-seconds 60]
+"""
+import argparse
+import time
+import numpy as np
+from services.audio_fingerprint import (
+    SECONDS_PER_SAMPLE,
+    as_fingerprint,
+    compare_audio_fingerprints,
+    find_best_audio_offset,
+    merge_chromaprint_fingerprints,
+)
+
+
+def _legacy_merge(audio_chunks: list[dict]) -> bytes:
+    merged_ints = []
+    for chunk in sorted(audio_chunks, key=lambda x: x["start_time"]):
+        fp_bytes = chunk["fingerprint"]
+        merged_ints.extend(
+            int.from_bytes(fp_bytes[i:i+4], byteorder="little", signed=False) for i in range(0, len(fp_bytes), 4)
+        )
+    return b"".join((i & 0xFFFFFFFF).to_bytes(4, byteorder="little", signed=False) for i in merged_ints)
+
+
+def _legacy_compare(fp1: bytes, fp2: bytes) -> float:
+    def to_uint32(fp: bytes) -> np.ndarray:
+        usable = len(fp) - len(fp) % 4
+        return np.frombuffer(fp[:usable], dtype="<u4").astype(np.uint32)
+
+    return find_best_audio_offset(to_uint32(fp1), to_uint32(fp2))[0]
+
+
+def _time(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hours", type=float, default=4)
+    parser.add_argument("--chunk-seconds", type=float, default=60)
+    parser.add_argument("--query-seconds", type=float, default=60)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    total = int(args.hours * 3600 / SECONDS_PER_SAMPLE)
+    per_chunk = int(args.chunk_seconds / SECONDS_PER_SAMPLE)
+    full = rng.integers(0, 1 << 32, total, dtype=np.uint32)
+    chunks = [
+        {"start_time": i * args.chunk_seconds, "fingerprint": full[start:start + per_chunk].astype("<u4").tobytes(),
+         "duration": args.chunk_seconds}
+        for i, start in enumerate(range(0, total, per_chunk))
+    ]
+    print(f"{total} samples ({args.hours:g} h) in {len(chunks)} chunks")
+
+    legacy_elapsed, legacy_merged = _time(lambda: _legacy_merge(chunks), 1)
+    merge_elapsed, (merged, _) = _time(lambda: merge_chromaprint_fingerprints(chunks), args.repeat)
+    print(f"merge:   legacy {legacy_elapsed * 1000:9.1f} ms, array {merge_elapsed * 1000:7.2f} ms "
+          f"({legacy_elapsed / merge_elapsed:.0f}x), identical: {merged.tobytes() == legacy_merged}")
+
+    query_len = int(args.query_seconds / SECONDS_PER_SAMPLE)
+    offset = int(rng.integers(0, total - query_len))
+    query = full[offset:offset + query_len].astype("<u4").tobytes()
+    base = legacy_merged
+
+    legacy_elapsed, legacy_similarity = _time(lambda: _legacy_compare(query, base), args.repeat)
+    compare_elapsed, similarity = _time(
+        lambda: compare_audio_fingerprints(as_fingerprint(query), as_fingerprint(base)), args.repeat
+    )
+    print(f"compare: legacy {legacy_elapsed * 1000:9.1f} ms, array {compare_elapsed * 1000:7.2f} ms "
+          f"({legacy_elapsed / compare_elapsed:.2f}x), identical: {similarity == legacy_similarity}")
+
+    view_elapsed, _ = _time(lambda: as_fingerprint(base), args.repeat)
+    copy_elapsed, _ = _time(lambda: np.frombuffer(base, dtype="<u4").astype(np.uint32), args.repeat)
+    print(f"load:    copy {copy_elapsed * 1e6:8.1f} us, view {view_elapsed * 1e6:6.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Recall/accuracy report for compact embeddings against full precision.
+
+For each method the query frames are matched against the base with both the
+full 2048-d cosine and the compact codes, reporting how often the same best
+base frame is chosen, the error in the best-match similarity and chunk score,
+and the storage per frame.
+
+    python -m benchmarks.compact_recall --base-video-id <id> [--query-video-id <id>]
+    python -m benchmarks.compact_recall --synthetic
+
+Without --query-video-id the queries are noisy copies of base frames.
+"""
+import argparse
+import numpy as np
+from config import COMPACT_METHODS, COMPACT_EMBEDDING_DIM
+from services.compact_embedding import fit_projection
+
+
+def _synthetic(rng: np.random.Generator, frames: int, sample: int) -> tuple[np.ndarray, np.ndarray]:
+    # Non-negative, low-rank-ish features similar in shape to pooled ResNet outputs
+    latent = rng.standard_normal((frames + sample, 64)).astype(np.float32)
+    mixing = rng.standard_normal((64, 2048)).astype(np.float32)
+    features = np.maximum(latent @ mixing + 0.5 * rng.standard_normal((frames + sample, 2048)), 0)
+    return features[:frames], features[frames:]
+
+
+def _full_precision(query: np.ndarray, base: np.ndarray) -> np.ndarray:
+    query = query / np.linalg.norm(query, axis=1, keepdims=True)
+    base = base / np.linalg.norm(base, axis=1, keepdims=True)
+    return query @ base.T
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-video-id")
+    parser.add_argument("--query-video-id")
+    parser.add_argument("--synthetic", action="store_true")
+    parser.add_argument("--dim", type=int, default=COMPACT_EMBEDDING_DIM)
+    parser.add_argument("--sample-size", type=int, default=20000)
+    parser.add_argument("--noise", type=float, default=0.3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.synthetic:
+        base, sample = _synthetic(rng, 3600, max(args.sample_size, args.dim))
+        query = None
+    else:
+        from models.database import get_frame_fingerprint_matrix, sample_frame_embeddings
+
+        _, base = get_frame_fingerprint_matrix(args.base_video_id)
+        sample = sample_frame_embeddings(args.sample_size)
+        query = get_frame_fingerprint_matrix(args.query_video_id)[1] if args.query_video_id else None
+
+    if query is None:
+        picks = rng.choice(len(base), size=min(600, len(base)), replace=False)
+        query = base[picks] * (1 + args.noise * rng.standard_normal(base[picks].shape)).astype(np.float32)
+
+    projection = fit_projection(sample, args.dim)
+
+    full = _full_precision(query, base)
+    full_best = full.argmax(axis=1)
+    full_best_sim = full.max(axis=1)
+
+    print(f"base={len(base)} frames, query={len(query)} frames, projection fitted on {len(sample)} frames")
+    print(f"{'method':<10} {'bytes/frame':>11} {'top1 agree':>10} {'best-sim MAE':>12} {'score delta':>11}")
+    print(f"{'full':<10} {base.shape[1] * 4:>11} {1:>10.3f} {0:>12.4f} {0:>+11.4f}")
+
+    for method in COMPACT_METHODS:
+        query_codes = projection.encode(query, method)
+        base_codes = projection.encode(base, method)
+        approx = projection.similarities(query_codes, base_codes, method)
+        approx_best = approx.argmax(axis=1)
+        # Similarity the full-precision metric gives to the compact choice
+        chosen_sim = full[np.arange(len(full)), approx_best]
+
+        agree = (approx_best == full_best).mean()
+        mae = np.abs(approx.max(axis=1) - full_best_sim).mean()
+        score_delta = approx.max(axis=1).mean() - full_best_sim.mean()
+        print(f"{method:<10} {base_codes.shape[1]:>11} {agree:>10.3f} {mae:>12.4f} {score_delta:>+11.4f}"
+              f"  (full-precision sim of chosen frame: {chosen_sim.mean():.4f} vs {full_best_sim.mean():.4f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Equivalence and throughput of the CPU inference backends against eager FP32:
+cosine drift of the embeddings (min/mean over the frames) and frames/sec per
+core at the worker's CPU batch size.
+
+    python -m benchmarks.cpu_backend [--media <file>] [--threads 4] [--batches 5]
+
+Without --media the input is random noise, which is a harsher drift test than
+real frames.
+"""
+import argparse
+import tempfile
+import time
+import torch
+from services.cpu_inference import load_cpu_graph, cosine_drift, eager_forward
+from services.image_fingerprint import ResNet50Extractor
+
+BATCH_SIZE = 32
+CONFIGS = [("torchscript", False), ("onnx", False), ("onnx", True)]
+
+
+def _throughput(forward, batch: torch.Tensor, batches: int, threads: int) -> float:
+    forward(batch)
+    start = time.perf_counter()
+    for _ in range(batches):
+        forward(batch)
+    return batches * len(batch) / (time.perf_counter() - start) / threads
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--media")
+    parser.add_argument("--threads", type=int, default=torch.get_num_threads())
+    parser.add_argument("--batches", type=int, default=5)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    extractor = ResNet50Extractor()
+    if extractor.use_gpu:
+        raise SystemExit("CUDA is available; this benchmark compares CPU backends only")
+
+    if args.media:
+        from services.video import stream_frames
+
+        frame_batches, _, _, _ = stream_frames(args.media, BATCH_SIZE)
+        batch = extractor.preprocess(next(iter(frame_batches)))
+    else:
+        batch = torch.randn((BATCH_SIZE, 3, 224, 224), generator=torch.Generator().manual_seed(0))
+
+    eager = _throughput(lambda b: eager_forward(extractor.model, b), batch, args.batches, args.threads)
+    print(f"{args.threads} threads, batch {len(batch)}")
+    print(f"{'backend':<16} {'frames/s/core':>13} {'speedup':>8} {'min cos':>8} {'mean cos':>9}")
+    print(f"{'eager':<16} {eager:>13.2f} {1:>8.2f} {1:>8.4f} {1:>9.4f}")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for backend, int8 in CONFIGS:
+            label = f"{backend}{' int8' if int8 else ''}"
+            graph = load_cpu_graph(extractor.model, backend, int8, cache_dir, min_cosine=-1.0)
+            if graph is None:
+                print(f"{label:<16} unavailable")
+                continue
+            drift = cosine_drift(extractor.model, graph, batch)
+            fps = _throughput(graph, batch, args.batches, args.threads)
+            print(f"{label:<16} {fps:>13.2f} {fps / eager:>8.2f} {drift['min_cosine']:>8.4f} {drift['mean_cosine']:>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
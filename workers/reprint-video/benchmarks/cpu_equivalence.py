@@ -0,0 +1,116 @@
+"""
+Pass/fail check that the exported CPU graphs compute the eager model's
+embeddings: each backend is run on a fixed, seeded batch (noise plus synthetic
+gradient frames through the worker's preprocessing) and compared with eager
+FP32. Exits nonzero if any backend's min cosine falls below its tolerance or
+its outputs differ by more than --max-abs-diff, so it can gate a torch,
+onnxruntime or model change.
+
+    python -m benchmarks.cpu_equivalence [--backends torchscript onnx onnx-int8] [--min-cosine 0.9999]
+
+FP32 graphs are held to --min-cosine; int8 to --int8-min-cosine (defaults to
+CPU_INFERENCE_MIN_COSINE, the bar the worker itself applies). A backend that
+cannot be loaded counts as a failure. Per-batch latency of eager and each
+graph is printed alongside.
+
+--random-init checks the same architecture with seeded random weights, for
+hosts that cannot download the pretrained ones; it exercises export and the
+runtime but not how the trained weights quantize.
+"""
+import argparse
+import tempfile
+import time
+import numpy as np
+import torch
+import torch.nn as nn
+from torchvision import models
+from config import CPU_INFERENCE_MIN_COSINE
+from services.cpu_inference import load_cpu_graph, cosine_drift, eager_forward
+from services.image_fingerprint import ResNet50Extractor, IMAGENET_MEAN, IMAGENET_STD
+
+SEED = 0
+NOISE_FRAMES = 4
+GRADIENT_FRAMES = 4
+CONFIGS = {"torchscript": ("torchscript", False), "onnx": ("onnx", False), "onnx-int8": ("onnx", True)}
+LATENCY_RUNS = 3
+
+
+def _fixed_batch() -> torch.Tensor:
+    generator = torch.Generator().manual_seed(SEED)
+    noise = torch.randn((NOISE_FRAMES, 3, 224, 224), generator=generator)
+
+    # Smooth colour ramps, normalized like real frames and closer to them than noise
+    y, x = torch.meshgrid(torch.linspace(0, 1, 224), torch.linspace(0, 1, 224), indexing="ij")
+    y, x = y[None], x[None]
+    frames = []
+    for i in range(GRADIENT_FRAMES):
+        phase = i / GRADIENT_FRAMES
+        frames.append(torch.cat([(x + phase) % 1, (y + phase) % 1, ((x + y) / 2 + phase) % 1]))
+    mean = torch.tensor(IMAGENET_MEAN).view(1, 3, 1, 1)
+    std = torch.tensor(IMAGENET_STD).view(1, 3, 1, 1)
+    return torch.cat([noise, (torch.stack(frames) - mean) / std])
+
+
+def _load_model(random_init: bool) -> nn.Module:
+    if random_init:
+        torch.manual_seed(SEED)
+        return nn.Sequential(*list(models.resnet50().children())[:-1]).eval()
+    extractor = ResNet50Extractor()
+    if extractor.use_gpu:
+        raise SystemExit("CUDA is available; this check compares CPU backends only")
+    return extractor.model
+
+
+def _latency_ms(forward, batch: torch.Tensor) -> float:
+    forward(batch)
+    best = float("inf")
+    for _ in range(LATENCY_RUNS):
+        start = time.perf_counter()
+        forward(batch)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", choices=list(CONFIGS), default=list(CONFIGS))
+    parser.add_argument("--min-cosine", type=float, default=0.9999)
+    parser.add_argument("--int8-min-cosine", type=float, default=CPU_INFERENCE_MIN_COSINE)
+    parser.add_argument("--max-abs-diff", type=float, default=1e-2, help="FP32 graphs only")
+    parser.add_argument("--random-init", action="store_true")
+    args = parser.parse_args()
+
+    model = _load_model(args.random_init)
+    batch = _fixed_batch()
+    reference = eager_forward(model, batch)
+    eager_ms = _latency_ms(lambda b: eager_forward(model, b), batch)
+
+    failures = []
+    print(f"{torch.get_num_threads()} threads, batch {len(batch)}")
+    print(f"{'backend':<12} {'min cos':>8} {'mean cos':>9} {'max |diff|':>11} {'ms/batch':>9} {'result':>6}")
+    print(f"{'eager':<12} {1:>8.5f} {1:>9.5f} {0:>11.2e} {eager_ms:>9.1f}")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for name in args.backends:
+            backend, int8 = CONFIGS[name]
+            graph = load_cpu_graph(model, backend, int8, cache_dir, min_cosine=-1.0)
+            if graph is None:
+                print(f"{name:<12} unavailable")
+                failures.append(name)
+                continue
+
+            drift = cosine_drift(model, graph, batch)
+            max_diff = float(np.abs(graph(batch) - reference).max())
+            passed = drift["min_cosine"] >= (args.int8_min_cosine if int8 else args.min_cosine)
+            if not int8:
+                passed = passed and max_diff <= args.max_abs_diff
+            if not passed:
+                failures.append(name)
+            print(f"{name:<12} {drift['min_cosine']:>8.5f} {drift['mean_cosine']:>9.5f} {max_diff:>11.2e} "
+                  f"{_latency_ms(graph, batch):>9.1f} {'ok' if passed else 'FAIL':>6}")
+
+    if failures:
+        raise SystemExit(f"CPU graphs outside tolerance: {', '.join(failures)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Throughput of concurrent callers embedding small decode batches, each calling
+the shared extractor directly versus going through the dynamic batching
+EmbeddingService, plus the service's batch-fill and queue-wait metrics.
+Runs on CPU or GPU.
+
+    python -m benchmarks.embedding_batching [--callers 4] [--frames 96] [--decode-batch 8]
+"""
+import argparse
+import threading
+import time
+import torch
+from services.embedding_service import EmbeddingService
+from services.image_fingerprint import get_extractor
+
+
+def _run(callers: int, frames: int, decode_batch: int, embed) -> float:
+    clips = [torch.randint(0, 256, (frames, 3, 360, 640), dtype=torch.uint8) for _ in range(callers)]
+
+    def work(clip: torch.Tensor) -> None:
+        for start in range(0, len(clip), decode_batch):
+            embed(clip[start:start + decode_batch])
+
+    threads = [threading.Thread(target=work, args=(clip,)) for clip in clips]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return callers * frames / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--callers", type=int, default=4)
+    parser.add_argument("--frames", type=int, default=96)
+    parser.add_argument("--decode-batch", type=int, default=8)
+    parser.add_argument("--max-latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    extractor = get_extractor()
+    extractor.extract(torch.zeros((1, 3, 224, 224), dtype=torch.uint8))
+
+    direct = _run(args.callers, args.frames, args.decode_batch, extractor.extract)
+    print(f"direct:  {direct:8.1f} frames/s")
+
+    service = EmbeddingService(lambda: extractor, max_latency_ms=args.max_latency_ms)
+    batched = _run(args.callers, args.frames, args.decode_batch, service.embed)
+    print(f"batched: {batched:8.1f} frames/s ({batched / direct:.2f}x, max batch {service.max_batch_size})")
+    print(f"service: {service.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark frame fingerprint ingestion: the previous one-INSERT-per-frame text
+path versus the binary COPY path used by save_chunk_frame_fingerprints.
+Needs the worker's database; rows are written under a throwaway base video.
+
+    python -m benchmarks.frame_ingest [--frames 60] [--repeat 5]
+"""
+import argparse
+import time
+import uuid
+import numpy as np
+from sqlalchemy import text
+from models.database import SessionLocal, create_base_video, save_chunk_frame_fingerprints
+
+
+def _legacy_insert(video_id: str, chunk_index: int, embeddings: list[dict]) -> None:
+    with SessionLocal() as session:
+        for emb in embeddings:
+            session.execute(
+                text("""
+                    INSERT INTO frame_fingerprints (video_id, frame_index, timestamp_seconds, embedding, chunk_index)
+                    VALUES (:video_id, :frame_index, :timestamp, :embedding, :chunk_index)
+                """),
+                {
+                    "video_id": video_id,
+                    "frame_index": emb["frame_index"],
+                    "timestamp": float(emb["frame_index"]),
+                    "embedding": str(emb["embedding"].tolist()),
+                    "chunk_index": chunk_index,
+                },
+            )
+        session.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    matrix = rng.random((args.frames, 2048), dtype=np.float32)
+    embeddings = [{"frame_index": i, "embedding": emb} for i, emb in enumerate(matrix)]
+
+    video_id = str(uuid.uuid4())
+    create_base_video(video_id, "benchmark")
+    try:
+        start = time.perf_counter()
+        for chunk_index in range(args.repeat):
+            _legacy_insert(video_id, chunk_index, embeddings)
+        legacy_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for chunk_index in range(args.repeat):
+            save_chunk_frame_fingerprints(video_id, args.repeat + chunk_index, 0.0, matrix, 1.0)
+        copy_elapsed = time.perf_counter() - start
+    finally:
+        with SessionLocal() as session:
+            session.execute(text("DELETE FROM base_videos WHERE id = :id"), {"id": video_id})
+            session.commit()
+
+    rows = args.frames * args.repeat
+    print(f"per-row INSERT: {rows / legacy_elapsed:,.0f} rows/s")
+    print(f"binary COPY:    {rows / copy_elapsed:,.0f} rows/s ({legacy_elapsed / copy_elapsed:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
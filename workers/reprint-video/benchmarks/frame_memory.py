@@ -0,0 +1,56 @@
+"""
+Peak RSS of embedding a chunk with all frames held in memory versus the
+streaming decode -> embed pipeline. Each mode runs in a fresh process because
+ru_maxrss only ever grows.
+
+    python -m benchmarks.frame_memory path/to/chunk.mp4 [--batch-size 32]
+"""
+import argparse
+import resource
+import subprocess
+import sys
+import time
+
+
+def _run(mode: str, video_path: str, batch_size: int) -> None:
+    from services.video import extract_frames, stream_frames
+    from services.image_fingerprint import get_extractor, generate_image_embeddings, embed_frame_batches
+
+    get_extractor()
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    if mode == "list":
+        frames, _, _ = extract_frames(video_path)
+        embeddings = generate_image_embeddings(frames, batch_size)
+    else:
+        batches, _, _, _ = stream_frames(video_path, batch_size)
+        embeddings = embed_frame_batches(batches)
+    elapsed = time.perf_counter() - start
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{mode:>6}: {len(embeddings)} frames in {elapsed:.2f}s, "
+          f"peak RSS {peak / 1024:.0f} MB (+{(peak - baseline) / 1024:.0f} MB over loaded model)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("video_path")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--mode", choices=["list", "stream"])
+    args = parser.parse_args()
+
+    if args.mode:
+        _run(args.mode, args.video_path, args.batch_size)
+        return
+
+    for mode in ("list", "stream"):
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.frame_memory", args.video_path,
+             "--batch-size", str(args.batch_size), "--mode", mode],
+            check=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
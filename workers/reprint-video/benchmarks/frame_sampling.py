@@ -0,0 +1,117 @@
+"""
+Frames embedded versus match accuracy for each FRAME_SAMPLING mode on the
+same corpus. For every video a query clip is cut and re-encoded (scaled down,
+lower quality, as a reprint would be); each mode then embeds the bases and
+the queries, and a query counts as correct when its best base by alignment
+score is the source video and the recovered offset is within --tolerance
+seconds of the true one.
+
+    python -m benchmarks.frame_sampling path/to/corpus/*.mp4 [--clip-seconds 30]
+
+Each mode runs in a fresh process because the sampling settings are read from
+the environment at import.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+MODES = ("fixed", "scene", "keyframe")
+
+
+def _make_queries(videos: list[str], clip_seconds: float, out_dir: str, seed: int) -> list[dict]:
+    from services.video import get_video_duration
+
+    rng = random.Random(seed)
+    queries = []
+    for i, video in enumerate(videos):
+        duration = get_video_duration(video)
+        start = round(rng.uniform(0, max(0.0, duration - clip_seconds)), 1)
+        path = os.path.join(out_dir, f"query_{i}.mp4")
+        subprocess.run(
+            ["ffmpeg", "-v", "error", "-y", "-ss", str(start), "-t", str(clip_seconds), "-i", video,
+             "-vf", "scale=-2:360", "-crf", "32", "-an", path],
+            check=True,
+        )
+        queries.append({"path": path, "source": i, "start": start})
+    return queries
+
+
+def _run(videos: list[str], queries: list[dict], tolerance: float) -> dict:
+    import numpy as np
+    from config import FRAME_SAMPLING
+    from services.video import stream_frames
+    from services.image_fingerprint import embed_frame_batches, compare_image_fingerprints
+    from tasks.verify import _frame_grid_indices
+
+    def embed(path: str):
+        batches, _, fps, frame_times = stream_frames(path)
+        embeddings = embed_frame_batches(batches)
+        indices = _frame_grid_indices(frame_times, fps)
+        return embeddings, (indices if indices is not None else np.arange(len(embeddings))), fps
+
+    bases = [embed(video) for video in videos]
+    base_frames = sum(len(b[0]) for b in bases)
+
+    correct, query_frames = 0, 0
+    for query in queries:
+        embeddings, indices, fps = embed(query["path"])
+        query_frames += len(embeddings)
+        scored = []
+        for base_embeddings, base_indices, _ in bases:
+            _, _, alignment = compare_image_fingerprints(
+                embeddings, base_embeddings, base_indices, query_frame_indices=indices
+            )
+            scored.append(alignment)
+        best = max(range(len(scored)), key=lambda b: scored[b]["alignment_score"])
+        offset = scored[best]["offset_frames"]
+        if best == query["source"] and offset is not None and abs(offset / fps - query["start"]) <= tolerance:
+            correct += 1
+
+    return {
+        "mode": FRAME_SAMPLING,
+        "base_frames": base_frames,
+        "query_frames": query_frames,
+        "accuracy": correct / len(queries) if queries else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--clip-seconds", type=float, default=30)
+    parser.add_argument("--tolerance", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries")
+    args = parser.parse_args()
+
+    if args.queries:
+        with open(args.queries) as f:
+            queries = json.load(f)
+        print(json.dumps(_run(args.videos, queries, args.tolerance)))
+        return
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        queries = _make_queries(args.videos, args.clip_seconds, out_dir, args.seed)
+        queries_file = os.path.join(out_dir, "queries.json")
+        with open(queries_file, "w") as f:
+            json.dump(queries, f)
+
+        print(f"{len(args.videos)} videos, {len(queries)} queries of {args.clip_seconds:.0f}s")
+        print(f"{'mode':<10} {'base frames':>11} {'query frames':>12} {'accuracy':>9}")
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.frame_sampling", *args.videos,
+                 "--tolerance", str(args.tolerance), "--queries", queries_file],
+                env={**os.environ, "FRAME_SAMPLING": mode},
+                capture_output=True, text=True, check=True,
+            ).stdout.strip().splitlines()[-1]
+            row = json.loads(output)
+            print(f"{row['mode']:<10} {row['base_frames']:>11} {row['query_frames']:>12} {row['accuracy']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
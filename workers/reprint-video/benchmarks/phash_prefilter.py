@@ -0,0 +1,99 @@
+"""
+Base frames pruned by the perceptual-hash prefilter versus how much of the
+embedding comparison's result survives, per PHASH_PREFILTER_DISTANCE. Query
+clips are cut from the corpus and re-encoded (scaled down, lower quality) and
+compared with every video: against their source (matching pairs) the
+similarity, alignment score and offset should be unchanged; against the other
+videos (non-matching pairs) most base frames should be pruned.
+
+Also reports the share of query frames that hash-match a base frame within
+--exact-distance bits (PHASH_EXACT_DISTANCE, or 2 while that is off) and so
+may reuse its embedding: re-encoded clips versus re-uploads (the source's own
+frames).
+
+    python -m benchmarks.phash_prefilter path/to/corpus/*.mp4 [--clip-seconds 30] [--exact-distance 2]
+"""
+import argparse
+import tempfile
+import numpy as np
+from config import PHASH_EXACT_DISTANCE
+from services.video import stream_frames
+from services.image_fingerprint import embed_frame_batches, compare_image_fingerprints
+from services.perceptual_hash import nearest_hashes
+from tasks.verify import _frame_grid_indices
+from benchmarks.frame_sampling import _make_queries
+
+DISTANCES = (4, 8, 12, 16, 20, 24, 32)
+
+
+def _embed(path: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    batches, _, fps, frame_times = stream_frames(path)
+    hashes = []
+    embeddings = embed_frame_batches(batches, hashes)
+    indices = _frame_grid_indices(frame_times, fps)
+    return embeddings, np.concatenate(hashes), (indices if indices is not None else np.arange(len(embeddings)))
+
+
+def _compare(query, base, keep=None) -> tuple[float, dict]:
+    base_embeddings, base_indices = base[0], base[2]
+    if keep is not None:
+        base_embeddings, base_indices = base_embeddings[keep], base_indices[keep]
+    similarity, _, alignment = compare_image_fingerprints(
+        query[0], base_embeddings, base_indices, query_frame_indices=query[2]
+    )
+    return similarity, alignment
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--clip-seconds", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--exact-distance", type=int, default=PHASH_EXACT_DISTANCE if PHASH_EXACT_DISTANCE >= 0 else 2)
+    args = parser.parse_args()
+
+    bases = [_embed(video) for video in args.videos]
+    with tempfile.TemporaryDirectory() as out_dir:
+        queries = _make_queries(args.videos, args.clip_seconds, out_dir, args.seed)
+        query_data = [_embed(query["path"]) for query in queries]
+
+    rows = {distance: {True: [], False: []} for distance in DISTANCES}
+    exact_reencoded = []
+    for query, data in zip(queries, query_data):
+        for b, base in enumerate(bases):
+            matching = b == query["source"]
+            query_distance, nearest, base_distance = nearest_hashes(data[1], base[1])
+            if matching:
+                exact_reencoded.append(float((query_distance <= args.exact_distance).mean()))
+
+            full_similarity, full_alignment = _compare(data, base)
+            for distance in DISTANCES:
+                keep = base_distance <= distance
+                keep[nearest] = True
+                similarity, alignment = _compare(data, base, keep)
+                rows[distance][matching].append((
+                    1.0 - keep.mean(),
+                    abs(similarity - full_similarity),
+                    abs(alignment["alignment_score"] - full_alignment["alignment_score"]),
+                    alignment["offset_frames"] == full_alignment["offset_frames"],
+                ))
+
+    exact_reupload = [
+        float((nearest_hashes(base[1], base[1])[0] <= args.exact_distance).mean()) for base in bases
+    ]
+    print(f"{len(bases)} videos, {len(queries)} re-encoded queries of {args.clip_seconds:.0f}s")
+    print(f"hash-matched query frames (<= {args.exact_distance} bits): "
+          f"re-encoded {np.mean(exact_reencoded):.3f}, re-upload {np.mean(exact_reupload):.3f}")
+    print(f"{'distance':>8} {'pairs':<12} {'pruned':>7} {'|d sim|':>8} {'|d align|':>9} {'same offset':>11}")
+    for distance in DISTANCES:
+        for matching in (True, False):
+            results = rows[distance][matching]
+            if not results:
+                continue
+            pruned, d_sim, d_align, same_offset = (np.mean(column) for column in zip(*results))
+            label = "matching" if matching else "non-matching"
+            print(f"{distance:>8} {label:<12} {pruned:>7.3f} {d_sim:>8.4f} {d_align:>9.4f} {same_offset:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
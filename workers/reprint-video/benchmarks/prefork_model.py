@@ -0,0 +1,89 @@
+"""
+Per-child memory and first-task latency of prefork children that load the
+model lazily (previous behaviour) versus inheriting it from a parent that
+preloaded it (preload_extractor + gc.freeze, as celery_app does at boot).
+
+Memory is read from /proc/self/smaps_rollup: Pss splits shared pages between
+the processes mapping them, so it drops when weights are inherited instead of
+copied. Each mode runs in a fresh process.
+
+    python -m benchmarks.prefork_model [--children 4] [--frames 8]
+"""
+import argparse
+import gc
+import os
+import subprocess
+import sys
+import time
+
+
+def _memory_mb() -> dict:
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss", "Private_Dirty"):
+                values[name] = int(rest.split()[0]) / 1024
+    return values
+
+
+def _child(frames: int, write_fd: int) -> None:
+    import torch
+    from services.image_fingerprint import get_extractor
+
+    start = time.perf_counter()
+    get_extractor().extract(torch.randint(0, 256, (frames, 3, 360, 640), dtype=torch.uint8))
+    elapsed = time.perf_counter() - start
+    memory = _memory_mb()
+    os.write(write_fd, f"{elapsed:.3f} {memory['Rss']:.0f} {memory['Pss']:.0f} {memory['Private_Dirty']:.0f}\n".encode())
+
+
+def _run(mode: str, children: int, frames: int) -> None:
+    if mode == "preload":
+        from services.image_fingerprint import preload_extractor
+
+        preload_extractor(share_memory=True)
+        gc.freeze()
+
+    read_fd, write_fd = os.pipe()
+    pids = []
+    for _ in range(children):
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            _child(frames, write_fd)
+            os._exit(0)
+        pids.append(pid)
+    os.close(write_fd)
+    for pid in pids:
+        os.waitpid(pid, 0)
+
+    with os.fdopen(read_fd) as f:
+        rows = [tuple(map(float, line.split())) for line in f]
+    print(f"{mode:>8}: first task {sum(r[0] for r in rows) / len(rows):.2f}s avg, "
+          f"per child RSS {sum(r[1] for r in rows) / len(rows):.0f} MB, "
+          f"PSS {sum(r[2] for r in rows) / len(rows):.0f} MB, "
+          f"private dirty {sum(r[3] for r in rows) / len(rows):.0f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--children", type=int, default=4)
+    parser.add_argument("--frames", type=int, default=8)
+    parser.add_argument("--mode", choices=["lazy", "preload"])
+    args = parser.parse_args()
+
+    if args.mode:
+        _run(args.mode, args.children, args.frames)
+        return
+
+    for mode in ("lazy", "preload"):
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.prefork_model",
+             "--children", str(args.children), "--frames", str(args.frames), "--mode", mode],
+            check=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
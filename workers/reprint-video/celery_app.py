@@ -1,5 +1,10 @@
+import gc
+import logging
 from celery import Celery
-from config import REDIS_URL
+from celery.signals import worker_init
+from config import REDIS_URL, PRELOAD_MODEL
+
+logger = logging.getLogger(__name__)
 
 app = Celery("reprint_video", broker=REDIS_URL, backend=REDIS_URL)
 
@@ -14,3 +19,28 @@ app.conf.update(
     task_acks_late=True,
     task_reject_on_worker_lost=True,
 )
+
+
+@worker_init.connect
+def preload_model(sender=None, **kwargs) -> None:
+    """
+    Load and warm up the model in the main worker process before the pool
+    starts. Prefork children then inherit it: weights live in shared memory
+    and gc.freeze() keeps the collector from touching (and so copying) the
+    inherited objects' pages.
+    """
+    if not PRELOAD_MODEL:
+        return
+
+    import torch
+    from services.image_fingerprint import preload_extractor
+
+    prefork = "prefork" in str(getattr(sender, "pool_cls", "prefork")).lower()
+    if prefork and torch.cuda.is_available():
+        # CUDA cannot be initialized before fork; children load lazily as before
+        logger.info("Skipping model preload: CUDA with the prefork pool")
+        return
+
+    preload_extractor(share_memory=prefork)
+    if prefork:
+        gc.freeze()
@@ -2,9 +2,18 @@ import os
 
 EXTRACT_FPS = float(os.getenv("EXTRACT_FPS", "1"))
 CHUNK_DURATION_SECONDS = int(os.getenv("CHUNK_DURATION_SECONDS", "60"))
+CHUNK_TASK_MAX_RETRIES = int(os.getenv("CHUNK_TASK_MAX_RETRIES", "3"))
+CHUNK_RETRY_BACKOFF_SECONDS = float(os.getenv("CHUNK_RETRY_BACKOFF_SECONDS", "5"))
+CHUNK_RETRY_BACKOFF_MAX_SECONDS = float(os.getenv("CHUNK_RETRY_BACKOFF_MAX_SECONDS", "120"))
 IMAGE_SIMILARITY_THRESHOLD = float(os.getenv("IMAGE_SIMILARITY_THRESHOLD", "0.85"))
 AUDIO_SIMILARITY_THRESHOLD = float(os.getenv("AUDIO_SIMILARITY_THRESHOLD", "0.80"))
 
+# Decide a verify session once VERIFY_EARLY_EXIT_CHUNKS chunks pass the thresholds (reprint),
+# or that many fall VERIFY_EARLY_EXIT_MARGIN below them with none passing; later chunks skip their work
+VERIFY_EARLY_EXIT = os.getenv("VERIFY_EARLY_EXIT", "false").lower() == "true"
+VERIFY_EARLY_EXIT_CHUNKS = int(os.getenv("VERIFY_EARLY_EXIT_CHUNKS", "3"))
+VERIFY_EARLY_EXIT_MARGIN = float(os.getenv("VERIFY_EARLY_EXIT_MARGIN", "0.1"))
+
 POSTGRES_HOST = os.getenv("POSTGRES_HOST", "postgres")
 POSTGRES_DB = os.getenv("POSTGRES_DB", "ip_patrol")
 POSTGRES_USER = os.getenv("POSTGRES_USER", "postgres")
@@ -12,8 +21,67 @@ POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "postgres")
 DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:5432/{POSTGRES_DB}"
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+# >0 coalesces "processing" events per channel and publishes them every N ms
+REDIS_PUBLISH_FLUSH_MS = int(os.getenv("REDIS_PUBLISH_FLUSH_MS", "0"))
 
 MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "minio:9000")
 MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
 MINIO_BUCKET = os.getenv("MINIO_BUCKET", "videos")
+
+# Worker-local cache of downloaded objects; 0 disables it
+OBJECT_CACHE_DIR = os.getenv("OBJECT_CACHE_DIR", "/tmp/reprint-object-cache")
+OBJECT_CACHE_MB = int(os.getenv("OBJECT_CACHE_MB", "4096"))
+# Lifetime of presigned URLs chunk tasks decode large originals from
+OBJECT_URL_EXPIRES_SECONDS = int(os.getenv("OBJECT_URL_EXPIRES_SECONDS", "3600"))
+
+# "chromaprint" fingerprints PCM in-process via libchromaprint, "fpcalc" pipes it to the CLI
+AUDIO_FINGERPRINT_BACKEND = os.getenv("AUDIO_FINGERPRINT_BACKEND", "chromaprint")
+
+AUDIO_INDEX_HASH_BITS = int(os.getenv("AUDIO_INDEX_HASH_BITS", "20"))
+AUDIO_INDEX_CANDIDATES = int(os.getenv("AUDIO_INDEX_CANDIDATES", "5"))
+
+BASE_EMBEDDING_CACHE_MB = int(os.getenv("BASE_EMBEDDING_CACHE_MB", "512"))
+BASE_EMBEDDING_CACHE_FP16 = os.getenv("BASE_EMBEDDING_CACHE_FP16", "false").lower() == "true"
+
+ANN_TOP_K = int(os.getenv("ANN_TOP_K", "10"))
+ANN_EF_SEARCH = int(os.getenv("ANN_EF_SEARCH", "64"))
+IDENTIFY_CANDIDATES = int(os.getenv("IDENTIFY_CANDIDATES", "5"))
+
+FRAME_BATCH_SIZE = int(os.getenv("FRAME_BATCH_SIZE", "32"))
+
+# Frame sampling: "fixed" (EXTRACT_FPS), "scene" (scene changes) or "keyframe" (container keyframes),
+# the latter two bounded to between SAMPLING_MIN_FPS (0 = no floor) and SAMPLING_MAX_FPS
+FRAME_SAMPLING = os.getenv("FRAME_SAMPLING", "fixed")
+SCENE_THRESHOLD = float(os.getenv("SCENE_THRESHOLD", "0.2"))
+SAMPLING_MIN_FPS = float(os.getenv("SAMPLING_MIN_FPS", "0.2"))
+SAMPLING_MAX_FPS = float(os.getenv("SAMPLING_MAX_FPS", "2"))
+
+# Merge frames from concurrent tasks into shared model batches (threads pool)
+EMBEDDING_BATCHING = os.getenv("EMBEDDING_BATCHING", "false").lower() == "true"
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "0"))
+EMBEDDING_BATCH_MAX_LATENCY_MS = float(os.getenv("EMBEDDING_BATCH_MAX_LATENCY_MS", "20"))
+
+# CPU-only model backend: "eager", "torchscript" or "onnx" (int8 needs onnx)
+CPU_INFERENCE_BACKEND = os.getenv("CPU_INFERENCE_BACKEND", "eager")
+CPU_INFERENCE_INT8 = os.getenv("CPU_INFERENCE_INT8", "false").lower() == "true"
+CPU_INFERENCE_MIN_COSINE = float(os.getenv("CPU_INFERENCE_MIN_COSINE", "0.99"))
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "/tmp/reprint-models")
+
+# Load and warm up the model in the worker's main process at boot
+PRELOAD_MODEL = os.getenv("PRELOAD_MODEL", "true").lower() == "true"
+
+# Optional quantized copy of each frame embedding: "", "pca16", "pca_int8" or "binary"
+COMPACT_METHODS = ("pca16", "pca_int8", "binary")
+COMPACT_EMBEDDING = os.getenv("COMPACT_EMBEDDING", "")
+COMPACT_EMBEDDING_DIM = int(os.getenv("COMPACT_EMBEDDING_DIM", "256"))
+
+SIMILARITY_TOP_K = int(os.getenv("SIMILARITY_TOP_K", "5"))
+SIMILARITY_TILE_ROWS = int(os.getenv("SIMILARITY_TILE_ROWS", "4096"))
+
+# Perceptual-hash prefilter: base frames further than PHASH_PREFILTER_DISTANCE bits
+# from every query frame skip the embedding comparison (-1 = off). Query frames
+# within PHASH_EXACT_DISTANCE of a base frame reuse its embedding instead of the
+# model (-1 = off); a chunk skips the model entirely only if all its frames match at 0 bits.
+PHASH_PREFILTER_DISTANCE = int(os.getenv("PHASH_PREFILTER_DISTANCE", "-1"))
+PHASH_EXACT_DISTANCE = int(os.getenv("PHASH_EXACT_DISTANCE", "-1"))
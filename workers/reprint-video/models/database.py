@@ -1,9 +1,14 @@
+import io
 import json
+import struct
+import uuid
+import numpy as np
 from sqlalchemy import create_engine, text
 from sqlalchemy.pool import QueuePool
 from sqlalchemy.orm import sessionmaker
 from pgvector.sqlalchemy import Vector
-from config import DATABASE_URL
+from config import DATABASE_URL, COMPACT_METHODS
+from services.audio_fingerprint import as_fingerprint, fingerprint_buffer
 
 engine = create_engine(
     DATABASE_URL,
@@ -44,55 +49,143 @@ def update_video_status(
         session.commit()
 
 
-def save_frame_fingerprints(video_id: str, embeddings: list[dict], fps: float) -> None:
+def save_audio_fingerprint(video_id: str, fingerprint: np.ndarray, duration: float | None) -> None:
     with SessionLocal() as session:
-        for emb in embeddings:
-            timestamp = emb["frame_index"] / fps if fps > 0 else 0
-            session.execute(
-                text("""
-                    INSERT INTO frame_fingerprints (video_id, frame_index, timestamp_seconds, embedding)
-                    VALUES (:video_id, :frame_index, :timestamp, :embedding)
-                """),
-                {
-                    "video_id": video_id,
-                    "frame_index": emb["frame_index"],
-                    "timestamp": timestamp,
-                    "embedding": str(emb["embedding"]),
-                },
-            )
+        session.execute(
+            text("""
+                INSERT INTO audio_fingerprints (video_id, fingerprint, duration_seconds)
+                VALUES (:video_id, :fingerprint, :duration)
+            """),
+            {"video_id": video_id, "fingerprint": fingerprint_buffer(fingerprint), "duration": duration},
+        )
         session.commit()
 
 
-def save_audio_fingerprint(video_id: str, fingerprint: bytes, duration: float | None) -> None:
+def get_frame_fingerprint_matrix(video_id: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Fetch (frame_indices, embeddings[float32]) for a video through a binary
+    COPY, decoding the rows with np.frombuffer instead of parsing vector text.
+    """
+    data = _copy_out("""
+        SELECT frame_index, embedding FROM frame_fingerprints
+        WHERE video_id = %(video_id)s ORDER BY frame_index, id
+    """, {"video_id": str(video_id)})
+    return _parse_frame_copy(data)
+
+
+def get_frame_phashes(video_id: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Fetch (frame_indices, phashes[int64]) in the same row order as
+    get_frame_fingerprint_matrix. Empty unless every frame of the video has a
+    hash (bases registered before migration 008 have none).
+    """
+    data = _copy_out("""
+        SELECT frame_index, phash FROM frame_fingerprints
+        WHERE video_id = %(video_id)s
+          AND NOT EXISTS (
+              SELECT 1 FROM frame_fingerprints WHERE video_id = %(video_id)s AND phash IS NULL
+          )
+        ORDER BY frame_index, id
+    """, {"video_id": str(video_id)})
+    body = _copy_body(data)
+    if len(body) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    # Row layout: field count, frame_index (len + int4), phash (len + int8)
+    row_dtype = np.dtype([
+        ("field_count", ">i2"),
+        ("frame_index_len", ">i4"), ("frame_index", ">i4"),
+        ("phash_len", ">i4"), ("phash", ">i8"),
+    ])
+    rows = np.frombuffer(body, dtype=row_dtype)
+    return rows["frame_index"].astype(np.int64), rows["phash"].astype(np.int64)
+
+
+def get_compact_fingerprints(video_id: str, projection_id: int, method: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Fetch (frame_indices, codes[uint8, N x code_bytes]) for frames encoded with
+    the given projection version and method. Empty if the base predates it.
+    """
+    if method not in COMPACT_METHODS:
+        raise ValueError(f"Unknown compact embedding method: {method}")
+    data = _copy_out("""
+        SELECT frame_index, compact_embedding FROM frame_fingerprints
+        WHERE video_id = %(video_id)s
+          AND compact_projection_id = %(projection_id)s
+          AND compact_method = %(method)s
+        ORDER BY frame_index, id
+    """, {"video_id": str(video_id), "projection_id": int(projection_id), "method": method})
+    body = _copy_body(data)
+    if len(body) == 0:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.uint8)
+
+    # Row layout: field count, frame_index (len + int4), compact_embedding (len + bytes)
+    (code_size,) = struct.unpack_from(">i", body, 10)
+    row_dtype = np.dtype([
+        ("field_count", ">i2"),
+        ("frame_index_len", ">i4"), ("frame_index", ">i4"),
+        ("code_len", ">i4"), ("code", "u1", (code_size,)),
+    ])
+    rows = np.frombuffer(body, dtype=row_dtype)
+    return rows["frame_index"].astype(np.int64), rows["code"].copy()
+
+
+def sample_frame_embeddings(limit: int) -> np.ndarray:
+    data = _copy_out("""
+        SELECT frame_index, embedding FROM frame_fingerprints
+        ORDER BY random() LIMIT %(limit)s
+    """, {"limit": int(limit)})
+    return _parse_frame_copy(data)[1]
+
+
+def save_embedding_projection(components: bytes, center: bytes, scale: bytes, dim: int, sample_size: int) -> int:
     with SessionLocal() as session:
-        session.execute(
+        result = session.execute(
             text("""
-                INSERT INTO audio_fingerprints (video_id, fingerprint, duration_seconds)
-                VALUES (:video_id, :fingerprint, :duration)
+                INSERT INTO embedding_projections (dim, components, center, scale, sample_size)
+                VALUES (:dim, :components, :center, :scale, :sample_size)
+                RETURNING id
             """),
-            {"video_id": video_id, "fingerprint": fingerprint, "duration": duration},
+            {"dim": dim, "components": components, "center": center, "scale": scale, "sample_size": sample_size},
         )
+        projection_id = result.scalar_one()
         session.commit()
+        return projection_id
 
 
-def get_frame_fingerprints(video_id: str) -> list[dict]:
+def get_latest_projection_id() -> int | None:
+    with SessionLocal() as session:
+        result = session.execute(text("SELECT MAX(id) FROM embedding_projections"))
+        return result.scalar()
+
+
+def get_embedding_projection(projection_id: int) -> dict | None:
     with SessionLocal() as session:
         result = session.execute(
-            text("SELECT frame_index, embedding FROM frame_fingerprints WHERE video_id = :video_id ORDER BY frame_index"),
-            {"video_id": video_id},
+            text("SELECT id, dim, components, center, scale FROM embedding_projections WHERE id = :id"),
+            {"id": projection_id},
         )
-        rows = result.fetchall()
-        return [{"frame_index": row[0], "embedding": _parse_vector(row[1])} for row in rows]
+        row = result.fetchone()
+        if not row:
+            return None
+        return {
+            "id": row[0],
+            "dim": row[1],
+            "components": bytes(row[2]),
+            "center": bytes(row[3]),
+            "scale": bytes(row[4]),
+        }
 
 
-def get_audio_fingerprint(video_id: str) -> bytes | None:
+def get_audio_fingerprint(video_id: str) -> np.ndarray | None:
+    """The merged fingerprint, viewed in place over the fetched bytea."""
     with SessionLocal() as session:
         result = session.execute(
             text("SELECT fingerprint FROM audio_fingerprints WHERE video_id = :video_id LIMIT 1"),
             {"video_id": video_id},
         )
         row = result.fetchone()
-        return bytes(row[0]) if row else None
+        return as_fingerprint(row[0]) if row else None
 
 
 def create_verification_result(result_id: str, base_video_id: str, filename: str) -> None:
@@ -133,13 +226,134 @@ def update_verification_result(
         session.commit()
 
 
-def _parse_vector(value) -> list[float]:
-    if isinstance(value, str):
-        value = value.strip("[]")
-        return [float(x) for x in value.split(",")]
-    if isinstance(value, (list, tuple)):
-        return list(value)
-    return list(value)
+_PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_PGCOPY_TRAILER = struct.pack(">h", -1)
+
+
+def _frame_copy_dtype(
+    dim: int, with_chunk_index: bool, code_size: int = 0, method_size: int = 0, with_phash: bool = False
+) -> np.dtype:
+    # One packed record per row in PostgreSQL's binary COPY tuple layout;
+    # the vector field uses pgvector's binary format (dim, unused, float4[]).
+    fields = [
+        ("field_count", ">i2"),
+        ("video_id_len", ">i4"), ("video_id", "V16"),
+        ("frame_index_len", ">i4"), ("frame_index", ">i4"),
+        ("timestamp_len", ">i4"), ("timestamp", ">f8"),
+        ("embedding_len", ">i4"), ("dim", ">i2"), ("unused", ">i2"), ("embedding", ">f4", (dim,)),
+    ]
+    if with_chunk_index:
+        fields += [("chunk_index_len", ">i4"), ("chunk_index", ">i4")]
+    if with_phash:
+        fields += [("phash_len", ">i4"), ("phash", ">i8")]
+    if code_size:
+        fields += [
+            ("code_len", ">i4"), ("code", "u1", (code_size,)),
+            ("projection_id_len", ">i4"), ("projection_id", ">i4"),
+            ("method_len", ">i4"), ("method", f"S{method_size}"),
+        ]
+    return np.dtype(fields)
+
+
+def _copy_frame_fingerprints(
+    session,
+    video_id: str,
+    frame_indices: np.ndarray,
+    timestamps: np.ndarray,
+    embeddings: np.ndarray,
+    chunk_index: int | None = None,
+    compact: tuple[np.ndarray, int, str] | None = None,
+    phashes: np.ndarray | None = None,
+) -> None:
+    """
+    Write all frames in one COPY ... FROM STDIN (FORMAT BINARY) round trip.
+    compact optionally carries (codes, projection_id, method) for the
+    quantized copy of each embedding; phashes the int64 dHash of each frame.
+    """
+    if len(frame_indices) == 0:
+        return
+
+    dim = embeddings.shape[1]
+    with_chunk_index = chunk_index is not None
+    with_phash = phashes is not None
+    codes, projection_id, method = compact if compact else (None, None, "")
+    code_size = codes.shape[1] if codes is not None else 0
+    method_bytes = method.encode()
+
+    records = np.empty(
+        len(frame_indices), dtype=_frame_copy_dtype(dim, with_chunk_index, code_size, len(method_bytes), with_phash)
+    )
+    records["field_count"] = 4 + with_chunk_index + with_phash + (3 if code_size else 0)
+    records["video_id_len"] = 16
+    records["video_id"] = np.void(uuid.UUID(str(video_id)).bytes)
+    records["frame_index_len"] = 4
+    records["frame_index"] = frame_indices
+    records["timestamp_len"] = 8
+    records["timestamp"] = timestamps
+    records["embedding_len"] = 4 + 4 * dim
+    records["dim"] = dim
+    records["unused"] = 0
+    records["embedding"] = embeddings
+    if with_chunk_index:
+        records["chunk_index_len"] = 4
+        records["chunk_index"] = chunk_index
+    if with_phash:
+        records["phash_len"] = 8
+        records["phash"] = phashes
+    if code_size:
+        records["code_len"] = code_size
+        records["code"] = codes
+        records["projection_id_len"] = 4
+        records["projection_id"] = projection_id
+        records["method_len"] = len(method_bytes)
+        records["method"] = method_bytes
+
+    columns = "video_id, frame_index, timestamp_seconds, embedding"
+    if with_chunk_index:
+        columns += ", chunk_index"
+    if with_phash:
+        columns += ", phash"
+    if code_size:
+        columns += ", compact_embedding, compact_projection_id, compact_method"
+
+    buffer = io.BytesIO(_PGCOPY_HEADER + records.tobytes() + _PGCOPY_TRAILER)
+    cursor = session.connection().connection.cursor()
+    cursor.copy_expert(f"COPY frame_fingerprints ({columns}) FROM STDIN WITH (FORMAT BINARY)", buffer)
+
+
+def _copy_out(query: str, params: dict | None = None) -> bytes:
+    """
+    Binary COPY of a SELECT. COPY takes no bind parameters, so params
+    (%(name)s placeholders) are quoted into the statement by psycopg2's
+    mogrify, the same escaping it applies to execute() parameters.
+    """
+    buffer = io.BytesIO()
+    with SessionLocal() as session:
+        cursor = session.connection().connection.cursor()
+        statement = cursor.mogrify(f"COPY ({query}) TO STDOUT WITH (FORMAT BINARY)", params)
+        cursor.copy_expert(statement.decode(), buffer)
+    return buffer.getvalue()
+
+
+def _copy_body(data: bytes) -> memoryview:
+    (extension_len,) = struct.unpack_from(">i", data, len(_PGCOPY_HEADER) - 4)
+    return memoryview(data)[len(_PGCOPY_HEADER) + extension_len:-len(_PGCOPY_TRAILER)]
+
+
+def _parse_frame_copy(data: bytes) -> tuple[np.ndarray, np.ndarray]:
+    body = _copy_body(data)
+    if len(body) == 0:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+
+    # Row layout: field count, frame_index (len + int4), embedding (len + dim + unused + float4[])
+    (dim,) = struct.unpack_from(">h", body, 14)
+    row_dtype = np.dtype([
+        ("field_count", ">i2"),
+        ("frame_index_len", ">i4"), ("frame_index", ">i4"),
+        ("embedding_len", ">i4"), ("dim", ">i2"), ("unused", ">i2"), ("embedding", ">f4", (dim,)),
+    ])
+    rows = np.frombuffer(body, dtype=row_dtype)
+    return rows["frame_index"].astype(np.int64), rows["embedding"].astype(np.float32)
 
 
 def create_base_video_chunked(
@@ -171,32 +385,59 @@ def create_register_chunk(
 
 
 def save_chunk_frame_fingerprints(
-    video_id: str, chunk_index: int, start_time: float, embeddings: list[dict], fps: float
+    video_id: str,
+    chunk_index: int,
+    start_time: float,
+    embeddings: np.ndarray,
+    fps: float,
+    compact: tuple[np.ndarray, int, str] | None = None,
+    frame_times: list[float] | None = None,
+    phashes: np.ndarray | None = None,
 ) -> None:
+    """
+    Save a chunk's embedding matrix; row i is the chunk's i-th sampled frame.
+    compact optionally adds (codes, projection_id, method) and phashes the
+    perceptual hash per row. Rows a previous attempt wrote for this chunk are
+    replaced in the same transaction.
+
+    frame_times (seconds into the chunk) are stored as-is for scene/keyframe
+    sampling; frame_index is then the nearest position on the fps grid, so
+    offsets stay comparable with fixed-rate videos. Without them frame i is
+    at i / fps.
+    """
+    if frame_times is not None:
+        timestamps = start_time + np.asarray(frame_times, dtype=np.float64)
+        global_frame_indices = np.rint(timestamps * fps).astype(np.int64)
+    else:
+        local_indices = np.arange(len(embeddings), dtype=np.int64)
+        timestamps = start_time + (local_indices / fps if fps > 0 else np.zeros(len(local_indices)))
+        global_frame_indices = int(start_time * fps) + local_indices
     with SessionLocal() as session:
-        for emb in embeddings:
-            timestamp = start_time + (emb["frame_index"] / fps if fps > 0 else 0)
-            global_frame_index = int(start_time * fps) + emb["frame_index"]
-            session.execute(
-                text("""
-                    INSERT INTO frame_fingerprints (video_id, frame_index, timestamp_seconds, embedding, chunk_index)
-                    VALUES (:video_id, :frame_index, :timestamp, :embedding, :chunk_index)
-                """),
-                {
-                    "video_id": video_id,
-                    "frame_index": global_frame_index,
-                    "timestamp": timestamp,
-                    "embedding": str(emb["embedding"]),
-                    "chunk_index": chunk_index,
-                },
-            )
+        session.execute(
+            text("DELETE FROM frame_fingerprints WHERE video_id = :video_id AND chunk_index = :chunk_index"),
+            {"video_id": video_id, "chunk_index": chunk_index},
+        )
+        _copy_frame_fingerprints(
+            session,
+            video_id,
+            global_frame_indices,
+            timestamps,
+            np.asarray(embeddings, dtype=np.float32),
+            chunk_index,
+            compact,
+            phashes,
+        )
         session.commit()
 
 
 def save_chunk_audio_fingerprint(
-    video_id: str, chunk_index: int, start_time: float, fingerprint: bytes, duration: float | None
+    video_id: str, chunk_index: int, start_time: float, fingerprint: np.ndarray, duration: float | None
 ) -> None:
     with SessionLocal() as session:
+        session.execute(
+            text("DELETE FROM audio_fingerprints WHERE video_id = :video_id AND chunk_index = :chunk_index"),
+            {"video_id": video_id, "chunk_index": chunk_index},
+        )
         session.execute(
             text("""
                 INSERT INTO audio_fingerprints (video_id, fingerprint, duration_seconds, chunk_index, start_time)
@@ -204,7 +445,7 @@ def save_chunk_audio_fingerprint(
             """),
             {
                 "video_id": video_id,
-                "fingerprint": fingerprint,
+                "fingerprint": fingerprint_buffer(fingerprint),
                 "duration": duration,
                 "chunk_index": chunk_index,
                 "start_time": start_time,
@@ -214,36 +455,72 @@ def save_chunk_audio_fingerprint(
 
 
 def complete_register_chunk(video_id: str, chunk_index: int, frame_count: int) -> dict:
+    """
+    Mark the chunk completed and bump the video's counter in one statement.
+    The counter only moves if the chunk was not already completed (a retried
+    task), and the row lock on base_videos serializes concurrent chunks, so
+    exactly one first attempt sees is_last=True. A retried chunk also sees
+    is_last=True while every chunk is done but the video is not finalized, so
+    a finalize enqueue that failed after the counter moved is sent again.
+    """
     with SessionLocal() as session:
-        session.execute(
+        result = session.execute(
             text("""
-                UPDATE register_chunks
-                SET status = 'completed', frame_count = :frame_count, completed_at = NOW()
-                WHERE video_id = :video_id AND chunk_index = :chunk_index
+                WITH chunk AS (
+                    UPDATE register_chunks
+                    SET status = 'completed', frame_count = :frame_count, completed_at = NOW()
+                    WHERE video_id = :video_id AND chunk_index = :chunk_index
+                      AND status IS DISTINCT FROM 'completed'
+                    RETURNING video_id
+                ),
+                bumped AS (
+                    UPDATE base_videos
+                    SET completed_chunks = completed_chunks + 1
+                    FROM chunk
+                    WHERE base_videos.id = chunk.video_id
+                    RETURNING total_chunks, completed_chunks
+                )
+                SELECT total_chunks, completed_chunks, TRUE FROM bumped
+                UNION ALL
+                SELECT total_chunks, completed_chunks, COALESCE(status, '') NOT IN ('completed', 'failed')
+                FROM base_videos
+                WHERE id = :video_id AND NOT EXISTS (SELECT 1 FROM bumped)
             """),
             {"video_id": video_id, "chunk_index": chunk_index, "frame_count": frame_count},
         )
-
-        session.execute(
-            text("""
-                UPDATE base_videos
-                SET completed_chunks = completed_chunks + 1
-                WHERE id = :video_id
-            """),
-            {"video_id": video_id},
-        )
+        row = result.fetchone()
         session.commit()
+        return {"total_chunks": row[0], "completed_chunks": row[1], "is_last": row[2] and row[1] == row[0]}
 
-        result = session.execute(
-            text("SELECT total_chunks, completed_chunks FROM base_videos WHERE id = :video_id"),
+
+def finalize_base_video(
+    video_id: str,
+    merged_fingerprint: np.ndarray | None = None,
+    audio_duration: float | None = None,
+    index_hashes: np.ndarray | None = None,
+    index_offsets: np.ndarray | None = None,
+) -> dict | None:
+    """
+    Mark the video completed and, when given, replace its chunk audio
+    fingerprints with the merged one and its audio index postings, all in one
+    transaction. The base_videos row is locked first, so of two finalizes
+    enqueued for the same video (a retried chunk re-sends it) one does the
+    work and the other gets None once the first has committed.
+    """
+    with SessionLocal() as session:
+        status = session.execute(
+            text("SELECT status FROM base_videos WHERE id = :video_id FOR UPDATE"),
             {"video_id": video_id},
-        )
-        row = result.fetchone()
-        return {"total_chunks": row[0], "completed_chunks": row[1]}
+        ).scalar()
+        if status == "completed":
+            session.rollback()
+            return None
 
+        if merged_fingerprint is not None:
+            _replace_audio_fingerprints(session, video_id, merged_fingerprint, audio_duration)
+            if index_hashes is not None:
+                _replace_audio_index(session, video_id, index_hashes.tolist(), index_offsets.tolist())
 
-def finalize_base_video(video_id: str) -> dict:
-    with SessionLocal() as session:
         result = session.execute(
             text("""
                 SELECT SUM(frame_count), SUM(duration)
@@ -300,43 +577,42 @@ def get_all_audio_fingerprints(video_id: str) -> list[dict]:
             {
                 "chunk_index": row[0],
                 "start_time": row[1],
-                "fingerprint": bytes(row[2]),
+                "fingerprint": as_fingerprint(row[2]),
                 "duration": row[3],
             }
             for row in rows
         ]
 
 
-def merge_audio_fingerprints(video_id: str, merged_fingerprint: bytes, total_duration: float) -> None:
-    with SessionLocal() as session:
-        session.execute(
-            text("DELETE FROM audio_fingerprints WHERE video_id = :video_id"),
-            {"video_id": video_id},
-        )
-        session.execute(
-            text("""
-                INSERT INTO audio_fingerprints (video_id, fingerprint, duration_seconds)
-                VALUES (:video_id, :fingerprint, :duration)
-            """),
-            {"video_id": video_id, "fingerprint": merged_fingerprint, "duration": total_duration},
-        )
-        session.commit()
+def _replace_audio_fingerprints(session, video_id: str, merged_fingerprint: np.ndarray, total_duration: float) -> None:
+    session.execute(
+        text("DELETE FROM audio_fingerprints WHERE video_id = :video_id"),
+        {"video_id": video_id},
+    )
+    session.execute(
+        text("""
+            INSERT INTO audio_fingerprints (video_id, fingerprint, duration_seconds)
+            VALUES (:video_id, :fingerprint, :duration)
+        """),
+        {"video_id": video_id, "fingerprint": fingerprint_buffer(merged_fingerprint), "duration": total_duration},
+    )
 
 
 def create_verify_session(
-    session_id: str, base_video_id: str, query_filename: str, total_chunks: int
+    session_id: str, base_video_id: str, query_filename: str, total_chunks: int, group_id: str | None = None
 ) -> None:
     with SessionLocal() as session:
         session.execute(
             text("""
-                INSERT INTO verify_sessions (id, base_video_id, query_filename, total_chunks, completed_chunks, status)
-                VALUES (:id, :base_video_id, :query_filename, :total_chunks, 0, 'processing')
+                INSERT INTO verify_sessions (id, base_video_id, query_filename, total_chunks, completed_chunks, status, group_id)
+                VALUES (:id, :base_video_id, :query_filename, :total_chunks, 0, 'processing', :group_id)
             """),
             {
                 "id": session_id,
                 "base_video_id": base_video_id,
                 "query_filename": query_filename,
                 "total_chunks": total_chunks,
+                "group_id": group_id,
             },
         )
         session.commit()
@@ -359,46 +635,151 @@ def complete_verify_chunk(
     chunk_index: int,
     image_similarity: float | None,
     audio_similarity: float | None,
+    alignment_score: float | None = None,
+    alignment_offset: float | None = None,
+    worker_seconds: float | None = None,
+    status: str = "completed",
 ) -> dict:
+    """
+    Single-statement counterpart of complete_register_chunk for verify
+    sessions. status "skipped" closes a chunk of a decided session without
+    results; it still counts towards completed_chunks so the last chunk
+    finalizes the session. is_last is re-reported to retries the same way.
+    """
     with SessionLocal() as session:
-        session.execute(
+        result = session.execute(
             text("""
-                UPDATE verify_chunks
-                SET status = 'completed', image_similarity = :image_sim,
-                    audio_similarity = :audio_sim, completed_at = NOW()
-                WHERE session_id = :session_id AND chunk_index = :chunk_index
+                WITH chunk AS (
+                    UPDATE verify_chunks
+                    SET status = :status, image_similarity = :image_sim,
+                        audio_similarity = :audio_sim, alignment_score = :alignment_score,
+                        alignment_offset_seconds = :alignment_offset, worker_seconds = :worker_seconds,
+                        completed_at = NOW()
+                    WHERE session_id = :session_id AND chunk_index = :chunk_index
+                      AND COALESCE(status, 'pending') NOT IN ('completed', 'skipped')
+                    RETURNING session_id
+                ),
+                bumped AS (
+                    UPDATE verify_sessions
+                    SET completed_chunks = completed_chunks + 1
+                    FROM chunk
+                    WHERE verify_sessions.id = chunk.session_id
+                    RETURNING total_chunks, completed_chunks
+                )
+                SELECT total_chunks, completed_chunks, TRUE FROM bumped
+                UNION ALL
+                SELECT total_chunks, completed_chunks, COALESCE(status, '') NOT IN ('completed', 'failed')
+                FROM verify_sessions
+                WHERE id = :session_id AND NOT EXISTS (SELECT 1 FROM bumped)
             """),
             {
                 "session_id": session_id,
                 "chunk_index": chunk_index,
                 "image_sim": image_similarity,
                 "audio_sim": audio_similarity,
+                "alignment_score": alignment_score,
+                "alignment_offset": alignment_offset,
+                "worker_seconds": worker_seconds,
+                "status": status,
             },
         )
+        row = result.fetchone()
+        session.commit()
+        return {"total_chunks": row[0], "completed_chunks": row[1], "is_last": row[2] and row[1] == row[0]}
 
-        session.execute(
+
+def decide_verify_session(
+    session_id: str,
+    min_chunks: int,
+    image_threshold: float,
+    audio_threshold: float,
+    margin: float,
+) -> dict | None:
+    """
+    Mark a session decided once min_chunks completed chunks pass either
+    threshold ("reprint"), or min_chunks fall margin below both with none
+    passing ("not_reprint"). Only the call that makes the decision gets a
+    result; it carries the chunks left and their estimated worker-seconds.
+    """
+    with SessionLocal() as session:
+        result = session.execute(
             text("""
+                WITH counts AS (
+                    SELECT
+                        COUNT(*) FILTER (
+                            WHERE image_similarity >= :image_threshold OR audio_similarity >= :audio_threshold
+                        ) AS matched,
+                        COUNT(*) FILTER (
+                            WHERE image_similarity < :image_threshold - :margin
+                              AND (audio_similarity IS NULL OR audio_similarity < :audio_threshold - :margin)
+                        ) AS unmatched,
+                        AVG(worker_seconds) AS avg_worker_seconds
+                    FROM verify_chunks
+                    WHERE session_id = :session_id AND status = 'completed'
+                )
                 UPDATE verify_sessions
-                SET completed_chunks = completed_chunks + 1
-                WHERE id = :session_id
+                SET status = 'decided', decided_at = NOW(),
+                    decision = CASE WHEN counts.matched >= :min_chunks THEN 'reprint' ELSE 'not_reprint' END
+                FROM counts
+                WHERE verify_sessions.id = :session_id
+                  AND verify_sessions.decision IS NULL
+                  AND verify_sessions.completed_chunks < verify_sessions.total_chunks
+                  AND (counts.matched >= :min_chunks OR (counts.unmatched >= :min_chunks AND counts.matched = 0))
+                RETURNING decision, total_chunks, completed_chunks, counts.avg_worker_seconds
             """),
-            {"session_id": session_id},
+            {
+                "session_id": session_id,
+                "min_chunks": min_chunks,
+                "image_threshold": image_threshold,
+                "audio_threshold": audio_threshold,
+                "margin": margin,
+            },
         )
+        row = result.fetchone()
         session.commit()
+        if row is None:
+            return None
+        remaining_chunks = row[1] - row[2]
+        return {
+            "decision": row[0],
+            "total_chunks": row[1],
+            "completed_chunks": row[2],
+            "remaining_chunks": remaining_chunks,
+            "estimated_worker_seconds_saved": remaining_chunks * (row[3] or 0.0),
+        }
+
 
+def get_verify_session_decision(session_id: str) -> str | None:
+    with SessionLocal() as session:
         result = session.execute(
-            text("SELECT total_chunks, completed_chunks FROM verify_sessions WHERE id = :session_id"),
+            text("SELECT decision FROM verify_sessions WHERE id = :session_id"),
             {"session_id": session_id},
         )
         row = result.fetchone()
-        return {"total_chunks": row[0], "completed_chunks": row[1]}
+        return row[0] if row else None
 
 
-def finalize_verify_session(session_id: str) -> dict:
+def finalize_verify_session(session_id: str) -> dict | None:
+    """
+    Averages over the chunks that ran. For an early-decided session,
+    worker_seconds_saved is the skipped chunks times the average
+    worker_seconds of the completed ones. Returns None if the session was
+    already finalized (a finalize enqueued twice by a retried chunk).
+    """
     with SessionLocal() as session:
+        status = session.execute(
+            text("SELECT status FROM verify_sessions WHERE id = :session_id FOR UPDATE"),
+            {"session_id": session_id},
+        ).scalar()
+        if status == "completed":
+            session.rollback()
+            return None
+
         result = session.execute(
             text("""
-                SELECT AVG(image_similarity), AVG(audio_similarity)
+                SELECT AVG(image_similarity), AVG(audio_similarity),
+                       COUNT(*) FILTER (WHERE status = 'skipped'),
+                       AVG(worker_seconds) FILTER (WHERE status = 'completed')
                 FROM verify_chunks WHERE session_id = :session_id
             """),
             {"session_id": session_id},
@@ -406,23 +787,154 @@ def finalize_verify_session(session_id: str) -> dict:
         row = result.fetchone()
         avg_image_sim = row[0]
         avg_audio_sim = row[1]
+        skipped_chunks = row[2]
+        worker_seconds_saved = skipped_chunks * (row[3] or 0.0)
 
-        session.execute(
-            text("UPDATE verify_sessions SET status = 'completed' WHERE id = :session_id"),
+        result = session.execute(
+            text("UPDATE verify_sessions SET status = 'completed' WHERE id = :session_id RETURNING decision"),
             {"session_id": session_id},
         )
+        decision_row = result.fetchone()
         session.commit()
 
-        return {"avg_image_similarity": avg_image_sim, "avg_audio_similarity": avg_audio_sim}
+        return {
+            "avg_image_similarity": avg_image_sim,
+            "avg_audio_similarity": avg_audio_sim,
+            "decision": decision_row[0] if decision_row else None,
+            "skipped_chunks": skipped_chunks,
+            "worker_seconds_saved": worker_seconds_saved,
+        }
 
 
 def get_base_video_status(video_id: str) -> dict | None:
     with SessionLocal() as session:
         result = session.execute(
-            text("SELECT status, completed_chunks, total_chunks FROM base_videos WHERE id = :video_id"),
+            text("""
+                SELECT status, completed_chunks, total_chunks, frame_count, created_at
+                FROM base_videos WHERE id = :video_id
+            """),
             {"video_id": video_id},
         )
         row = result.fetchone()
         if not row:
             return None
-        return {"status": row[0], "completed_chunks": row[1] or 0, "total_chunks": row[2] or 1}
+        return {
+            "status": row[0],
+            "completed_chunks": row[1] or 0,
+            "total_chunks": row[2] or 1,
+            "frame_count": row[3],
+            "created_at": row[4],
+        }
+
+
+def _replace_audio_index(session, video_id: str, hashes: list[int], offsets: list[int]) -> None:
+    session.execute(
+        text("DELETE FROM audio_index WHERE video_id = :video_id"),
+        {"video_id": video_id},
+    )
+    session.execute(
+        text("""
+            INSERT INTO audio_index (video_id, hash, sample_offset)
+            SELECT :video_id, h, o
+            FROM unnest(CAST(:hashes AS integer[]), CAST(:offsets AS integer[])) AS t(h, o)
+        """),
+        {"video_id": video_id, "hashes": hashes, "offsets": offsets},
+    )
+
+
+def search_audio_index(hashes: list[int], offsets: list[int], limit: int) -> list[dict]:
+    """
+    Offset-histogram voting: every posting that shares a hash with the query
+    votes for (video, base_offset - query_offset). Returns the best-voted
+    alignment per video, strongest first.
+    """
+    with SessionLocal() as session:
+        result = session.execute(
+            text("""
+                WITH votes AS (
+                    SELECT p.video_id, p.sample_offset - q.o AS offset_delta, COUNT(*) AS votes
+                    FROM unnest(CAST(:hashes AS integer[]), CAST(:offsets AS integer[])) AS q(h, o)
+                    JOIN audio_index p ON p.hash = q.h
+                    GROUP BY p.video_id, offset_delta
+                ),
+                best AS (
+                    SELECT DISTINCT ON (v.video_id) v.video_id, v.offset_delta, v.votes
+                    FROM votes v
+                    JOIN base_videos b ON b.id = v.video_id AND b.status = 'completed'
+                    ORDER BY v.video_id, v.votes DESC
+                )
+                SELECT video_id, offset_delta, votes FROM best
+                ORDER BY votes DESC
+                LIMIT :limit
+            """),
+            {"hashes": hashes, "offsets": offsets, "limit": limit},
+        )
+        rows = result.fetchall()
+        return [{"video_id": str(row[0]), "offset": row[1], "votes": row[2]} for row in rows]
+
+
+def _copy_query_embeddings(session, embeddings: np.ndarray) -> None:
+    """
+    Load query rows into a transaction-scoped temp table (ord, embedding)
+    through a binary COPY, so the vectors travel as float4 bytes instead of
+    being formatted and parsed as text.
+    """
+    dim = embeddings.shape[1]
+    records = np.empty(len(embeddings), dtype=np.dtype([
+        ("field_count", ">i2"),
+        ("ord_len", ">i4"), ("ord", ">i4"),
+        ("embedding_len", ">i4"), ("dim", ">i2"), ("unused", ">i2"), ("embedding", ">f4", (dim,)),
+    ]))
+    records["field_count"] = 2
+    records["ord_len"] = 4
+    records["ord"] = np.arange(len(embeddings))
+    records["embedding_len"] = 4 + 4 * dim
+    records["dim"] = dim
+    records["unused"] = 0
+    records["embedding"] = embeddings
+
+    session.execute(text("CREATE TEMP TABLE search_query_frames (ord integer, embedding vector) ON COMMIT DROP"))
+    buffer = io.BytesIO(_PGCOPY_HEADER + records.tobytes() + _PGCOPY_TRAILER)
+    cursor = session.connection().connection.cursor()
+    cursor.copy_expert("COPY search_query_frames (ord, embedding) FROM STDIN WITH (FORMAT BINARY)", buffer)
+
+
+def search_similar_frames(embeddings: np.ndarray, top_k: int, ef_search: int) -> list[dict]:
+    """
+    Top-k approximate nearest base frames for every query row, answered by the
+    HNSW index on embedding::halfvec(2048) in a single LATERAL query over the
+    query rows loaded by _copy_query_embeddings.
+    """
+    if len(embeddings) == 0:
+        return []
+
+    with SessionLocal() as session:
+        session.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+        _copy_query_embeddings(session, embeddings)
+        result = session.execute(
+            text("""
+                SELECT q.ord, f.video_id, f.frame_index, f.timestamp_seconds, 1 - f.distance
+                FROM search_query_frames q
+                CROSS JOIN LATERAL (
+                    SELECT video_id, frame_index, timestamp_seconds,
+                           embedding::halfvec(2048) <=> q.embedding::halfvec(2048) AS distance
+                    FROM frame_fingerprints
+                    ORDER BY embedding::halfvec(2048) <=> q.embedding::halfvec(2048)
+                    LIMIT :top_k
+                ) f
+                JOIN base_videos b ON b.id = f.video_id AND b.status = 'completed'
+            """),
+            {"top_k": top_k},
+        )
+        rows = result.fetchall()
+        session.commit()
+        return [
+            {
+                "query_frame": row[0],
+                "video_id": str(row[1]),
+                "base_frame": row[2],
+                "base_timestamp": row[3],
+                "similarity": float(row[4]),
+            }
+            for row in rows
+        ]
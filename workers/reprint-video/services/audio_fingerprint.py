@@ -1,6 +1,9 @@
 import subprocess
-import os
 import logging
+import numpy as np
+from config import AUDIO_INDEX_HASH_BITS, AUDIO_FINGERPRINT_BACKEND
+from services import chromaprint_native
+from utils.bits import popcount
 
 logger = logging.getLogger(__name__)
 
@@ -8,69 +11,115 @@ SECONDS_PER_SAMPLE = 0.1238
 SLIDING_WINDOW_STEP_COARSE = 8
 SLIDING_WINDOW_STEP_FINE = 1
 TOP_CANDIDATES_FOR_FINE_SEARCH = 10
+HAMMING_BLOCK_ELEMENTS = 1 << 20
+
+# Fingerprints are 1-D arrays of little-endian uint32 samples everywhere in the
+# pipeline; they only become bytes at the bytea boundary, and from bytes they
+# are viewed, not copied.
+FINGERPRINT_DTYPE = np.dtype("<u4")
+
+
+def as_fingerprint(data: np.ndarray | bytes | memoryview | None) -> np.ndarray:
+    """
+    Fingerprint array for data without copying: arrays pass through and
+    buffers (bytes, a bytea memoryview) are viewed with np.frombuffer. A
+    trailing partial sample is ignored.
+    """
+    if data is None:
+        return np.empty(0, dtype=FINGERPRINT_DTYPE)
+    if isinstance(data, np.ndarray):
+        return data.astype(FINGERPRINT_DTYPE, copy=False)
+    return np.frombuffer(data, dtype=FINGERPRINT_DTYPE, count=len(data) // FINGERPRINT_DTYPE.itemsize)
+
+
+def fingerprint_buffer(fp: np.ndarray) -> memoryview:
+    """Byte view of a fingerprint to bind as a bytea parameter."""
+    return memoryview(np.ascontiguousarray(fp, dtype=FINGERPRINT_DTYPE)).cast("B")
+
+
+def generate_audio_fingerprint_pcm(pcm: bytes, sample_rate: int) -> np.ndarray | None:
+    """
+    Fingerprint mono s16le PCM. Uses libchromaprint in-process when configured
+    and available, otherwise pipes the PCM into fpcalc's stdin.
+    """
+    if not pcm:
+        return None
 
+    if AUDIO_FINGERPRINT_BACKEND == "chromaprint" and chromaprint_native.is_available():
+        fingerprint = chromaprint_native.fingerprint_pcm(pcm, sample_rate)
+        return as_fingerprint(fingerprint) if fingerprint is not None else None
+
+    return generate_audio_fingerprint_fpcalc(pcm, sample_rate)
 
-def generate_audio_fingerprint(audio_path: str) -> bytes | None:
-    if not audio_path or not os.path.exists(audio_path):
-        return None
 
-    cmd = ["fpcalc", "-raw", "-length", "0", audio_path]
-    result = subprocess.run(cmd, capture_output=True, text=True)
+def generate_audio_fingerprint_fpcalc(pcm: bytes, sample_rate: int) -> np.ndarray | None:
+    cmd = [
+        "fpcalc", "-raw", "-length", "0",
+        "-format", "s16le", "-rate", str(sample_rate), "-channels", "1",
+        "-",
+    ]
+    result = subprocess.run(cmd, input=pcm, capture_output=True)
 
     if result.returncode != 0:
-        logger.warning(f"fpcalc failed: {result.stderr}")
+        logger.warning(f"fpcalc failed: {result.stderr.decode(errors='replace')}")
         return None
 
-    for line in result.stdout.strip().split("\n"):
-        if line.startswith("FINGERPRINT="):
-            fp_str = line.replace("FINGERPRINT=", "")
-            fp_ints = [int(x) for x in fp_str.split(",") if x]
-            return b"".join((i & 0xFFFFFFFF).to_bytes(4, byteorder="little", signed=False) for i in fp_ints)
+    return _parse_fpcalc_output(result.stdout.decode())
 
-    return None
 
+def _parse_fpcalc_output(output: str) -> np.ndarray | None:
+    for line in output.strip().split("\n"):
+        if line.startswith("FINGERPRINT="):
+            fp_str = line[len("FINGERPRINT="):]
+            fp_ints = np.array(fp_str.split(",") if fp_str else [], dtype=np.int64)
+            return (fp_ints & 0xFFFFFFFF).astype(FINGERPRINT_DTYPE)
 
-def _calculate_similarity_at_offset(query: list[int], base: list[int], offset: int) -> float:
-    if offset < 0 or offset >= len(base):
-        return 0.0
+    return None
 
-    compare_len = min(len(query), len(base) - offset)
-    if compare_len <= 0:
-        return 0.0
 
-    matching_bits = 0
-    total_bits = compare_len * 32
+def _similarities_at_offsets(query: np.ndarray, base: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """
+    Bit-level similarity of query against base at each offset, scored in blocks
+    so the (offsets x query) XOR buffer stays around HAMMING_BLOCK_ELEMENTS.
+    Matches the old per-offset loop exactly: only the overlapping part is compared.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    similarities = np.zeros(len(offsets), dtype=np.float64)
+    if len(offsets) == 0 or len(query) == 0:
+        return similarities
 
-    for i in range(compare_len):
-        xor = query[i] ^ base[offset + i]
-        differing_bits = bin(xor & 0xFFFFFFFF).count("1")
-        matching_bits += 32 - differing_bits
+    query_len = len(query)
+    padded_base = np.concatenate([base, np.zeros(query_len, dtype=base.dtype)])
+    windows = np.lib.stride_tricks.sliding_window_view(padded_base, query_len)
+    positions = np.arange(query_len)
 
-    return matching_bits / total_bits
+    valid = (offsets >= 0) & (offsets < len(base))
+    valid_idx = np.nonzero(valid)[0]
+    block_size = max(1, HAMMING_BLOCK_ELEMENTS // query_len)
 
+    for start in range(0, len(valid_idx), block_size):
+        idx = valid_idx[start:start + block_size]
+        block_offsets = offsets[idx]
+        compare_len = np.minimum(query_len, len(base) - block_offsets)
 
-def compare_audio_fingerprints(fp1: bytes, fp2: bytes) -> float:
-    if not fp1 or not fp2:
-        return 0.0
+        differing = popcount(windows[block_offsets] ^ query).astype(np.int64)
+        differing[positions[None, :] >= compare_len[:, None]] = 0
 
-    query = [int.from_bytes(fp1[i:i+4], byteorder="little", signed=False) for i in range(0, len(fp1), 4)]
-    base = [int.from_bytes(fp2[i:i+4], byteorder="little", signed=False) for i in range(0, len(fp2), 4)]
+        total_bits = compare_len * 32
+        matching_bits = total_bits - differing.sum(axis=1)
+        similarities[idx] = matching_bits / total_bits
 
-    if len(query) == 0 or len(base) == 0:
-        return 0.0
+    return similarities
 
-    logger.info(f"Audio FP compare: query_len={len(query)}, base_len={len(base)}")
-    logger.info(f"Query duration: {len(query) * SECONDS_PER_SAMPLE:.1f}s, Base duration: {len(base) * SECONDS_PER_SAMPLE:.1f}s")
 
+def find_best_audio_offset(query: np.ndarray, base: np.ndarray) -> tuple[float, int]:
     max_offset = len(base) - 1
-    coarse_results = []
 
-    for offset in range(0, max_offset + 1, SLIDING_WINDOW_STEP_COARSE):
-        similarity = _calculate_similarity_at_offset(query, base, offset)
-        coarse_results.append((offset, similarity))
+    coarse_offsets = np.arange(0, max_offset + 1, SLIDING_WINDOW_STEP_COARSE)
+    coarse_similarities = _similarities_at_offsets(query, base, coarse_offsets)
 
-    coarse_results.sort(key=lambda x: x[1], reverse=True)
-    top_candidates = coarse_results[:TOP_CANDIDATES_FOR_FINE_SEARCH]
+    order = np.argsort(-coarse_similarities, kind="stable")[:TOP_CANDIDATES_FOR_FINE_SEARCH]
+    top_candidates = [(int(coarse_offsets[i]), float(coarse_similarities[i])) for i in order]
     logger.info(f"Coarse search top {TOP_CANDIDATES_FOR_FINE_SEARCH}: {[(o, f'{s:.3f}') for o, s in top_candidates]}")
 
     best_similarity = 0.0
@@ -80,43 +129,80 @@ def compare_audio_fingerprints(fp1: bytes, fp2: bytes) -> float:
         search_start = max(0, candidate_offset - SLIDING_WINDOW_STEP_COARSE)
         search_end = min(max_offset, candidate_offset + SLIDING_WINDOW_STEP_COARSE)
 
-        for offset in range(search_start, search_end + 1, SLIDING_WINDOW_STEP_FINE):
-            similarity = _calculate_similarity_at_offset(query, base, offset)
-            if similarity > best_similarity:
-                best_similarity = similarity
-                best_offset = offset
+        fine_offsets = np.arange(search_start, search_end + 1, SLIDING_WINDOW_STEP_FINE)
+        fine_similarities = _similarities_at_offsets(query, base, fine_offsets)
+        i = int(np.argmax(fine_similarities))
+        if fine_similarities[i] > best_similarity:
+            best_similarity = float(fine_similarities[i])
+            best_offset = int(fine_offsets[i])
+
+    return best_similarity, best_offset
+
+
+def compare_audio_fingerprints(fp1: np.ndarray | None, fp2: np.ndarray | None) -> float:
+    query = as_fingerprint(fp1)
+    base = as_fingerprint(fp2)
+
+    if len(query) == 0 or len(base) == 0:
+        return 0.0
+
+    logger.info(f"Audio FP compare: query_len={len(query)}, base_len={len(base)}")
+    logger.info(f"Query duration: {len(query) * SECONDS_PER_SAMPLE:.1f}s, Base duration: {len(base) * SECONDS_PER_SAMPLE:.1f}s")
+
+    best_similarity, best_offset = find_best_audio_offset(query, base)
 
     logger.info(f"Best match: offset={best_offset} ({best_offset * SECONDS_PER_SAMPLE:.1f}s), similarity={best_similarity:.3f}")
 
     return best_similarity
 
 
-def merge_chromaprint_fingerprints(audio_chunks: list[dict]) -> tuple[bytes | None, float]:
-    if not audio_chunks:
-        return None, 0.0
+def audio_index_hashes(fp: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Quantize a fingerprint to its high AUDIO_INDEX_HASH_BITS bits for the
+    inverted index. Runs of the same hash (silence, sustained notes) keep only
+    their first sample so they do not flood the postings.
+    """
+    values = as_fingerprint(fp)
+    if len(values) == 0:
+        return np.array([], dtype=np.int32), np.array([], dtype=np.int32)
 
-    sorted_chunks = sorted(audio_chunks, key=lambda x: x["start_time"])
+    hashes = (values >> (32 - AUDIO_INDEX_HASH_BITS)).astype(np.int32)
+    keep = np.ones(len(hashes), dtype=bool)
+    keep[1:] = hashes[1:] != hashes[:-1]
+    offsets = np.nonzero(keep)[0].astype(np.int32)
+    return hashes[keep], offsets
 
-    merged_ints = []
-    total_duration = 0.0
 
-    for chunk in sorted_chunks:
-        fp_bytes = chunk["fingerprint"]
-        chunk_ints = [
-            int.from_bytes(fp_bytes[i:i+4], byteorder="little", signed=False)
-            for i in range(0, len(fp_bytes), 4)
-        ]
-        merged_ints.extend(chunk_ints)
-        total_duration += chunk.get("duration", 0) or 0
+def verify_audio_candidate(query_fp: np.ndarray, base_fp: np.ndarray, offset: int) -> tuple[float, int]:
+    """Exact Hamming check around an offset proposed by the inverted index."""
+    query = as_fingerprint(query_fp)
+    base = as_fingerprint(base_fp)
+    if len(query) == 0 or len(base) == 0:
+        return 0.0, 0
+
+    search_start = max(0, offset - SLIDING_WINDOW_STEP_COARSE)
+    search_end = min(len(base) - 1, offset + SLIDING_WINDOW_STEP_COARSE)
+    if search_start > search_end:
+        return 0.0, 0
+
+    offsets = np.arange(search_start, search_end + 1, SLIDING_WINDOW_STEP_FINE)
+    similarities = _similarities_at_offsets(query, base, offsets)
+    i = int(np.argmax(similarities))
+    return float(similarities[i]), int(offsets[i])
+
 
-    if not merged_ints:
+def merge_chromaprint_fingerprints(audio_chunks: list[dict]) -> tuple[np.ndarray | None, float]:
+    """Concatenate chunk fingerprints in start_time order: one copy of the sample buffers."""
+    if not audio_chunks:
         return None, 0.0
 
-    merged_bytes = b"".join(
-        (i & 0xFFFFFFFF).to_bytes(4, byteorder="little", signed=False)
-        for i in merged_ints
-    )
+    sorted_chunks = sorted(audio_chunks, key=lambda x: x["start_time"])
+    merged = np.concatenate([as_fingerprint(chunk["fingerprint"]) for chunk in sorted_chunks])
+    total_duration = float(sum(chunk.get("duration", 0) or 0 for chunk in sorted_chunks))
+
+    if len(merged) == 0:
+        return None, 0.0
 
-    logger.info(f"Merged {len(sorted_chunks)} audio chunks into {len(merged_ints)} samples ({total_duration:.1f}s)")
+    logger.info(f"Merged {len(sorted_chunks)} audio chunks into {len(merged)} samples ({total_duration:.1f}s)")
 
-    return merged_bytes, total_duration
+    return merged, total_duration
@@ -0,0 +1,106 @@
+import ctypes
+import ctypes.util
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# fpcalc's default -algorithm 2 maps to CHROMAPRINT_ALGORITHM_TEST2 (enum value 1)
+CHROMAPRINT_ALGORITHM_DEFAULT = 1
+_LIBRARY_NAMES = ("libchromaprint.so.1", "libchromaprint.so", "libchromaprint.dylib")
+
+_lib = None
+_lib_loaded = False
+_lib_lock = threading.Lock()
+
+
+def _load_library():
+    candidates = [ctypes.util.find_library("chromaprint"), *_LIBRARY_NAMES]
+    for name in candidates:
+        if not name:
+            continue
+        try:
+            lib = ctypes.CDLL(name)
+        except OSError:
+            continue
+
+        lib.chromaprint_new.argtypes = [ctypes.c_int]
+        lib.chromaprint_new.restype = ctypes.c_void_p
+        lib.chromaprint_free.argtypes = [ctypes.c_void_p]
+        lib.chromaprint_free.restype = None
+        lib.chromaprint_start.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int]
+        lib.chromaprint_start.restype = ctypes.c_int
+        lib.chromaprint_feed.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int]
+        lib.chromaprint_feed.restype = ctypes.c_int
+        lib.chromaprint_finish.argtypes = [ctypes.c_void_p]
+        lib.chromaprint_finish.restype = ctypes.c_int
+        lib.chromaprint_get_raw_fingerprint.argtypes = [
+            ctypes.c_void_p,
+            ctypes.POINTER(ctypes.POINTER(ctypes.c_uint32)),
+            ctypes.POINTER(ctypes.c_int),
+        ]
+        lib.chromaprint_get_raw_fingerprint.restype = ctypes.c_int
+        lib.chromaprint_dealloc.argtypes = [ctypes.c_void_p]
+        lib.chromaprint_dealloc.restype = None
+        return lib
+    return None
+
+
+def get_library():
+    """libchromaprint handle, or None if the shared library is not installed."""
+    global _lib, _lib_loaded
+    with _lib_lock:
+        if not _lib_loaded:
+            _lib = _load_library()
+            _lib_loaded = True
+            if _lib is None:
+                logger.warning("libchromaprint not found, in-process fingerprinting unavailable")
+        return _lib
+
+
+def is_available() -> bool:
+    return get_library() is not None
+
+
+def fingerprint_pcm(pcm: bytes | bytearray, sample_rate: int, channels: int = 1) -> np.ndarray | None:
+    """
+    Raw chromaprint fingerprint of s16le PCM, computed in-process. The PCM buffer
+    is fed to the library as-is and the result is copied once out of the
+    library-owned array into a uint32 ndarray.
+    """
+    lib = get_library()
+    if lib is None or not pcm:
+        return None
+
+    ctx = lib.chromaprint_new(CHROMAPRINT_ALGORITHM_DEFAULT)
+    if not ctx:
+        return None
+
+    try:
+        # bytes are passed by pointer; writable buffers (bytearray) are wrapped without a copy
+        buffer = pcm if isinstance(pcm, bytes) else (ctypes.c_char * len(pcm)).from_buffer(pcm)
+        num_samples = len(pcm) // 2
+        if not lib.chromaprint_start(ctx, sample_rate, channels):
+            logger.warning("chromaprint_start failed")
+            return None
+        if not lib.chromaprint_feed(ctx, buffer, num_samples):
+            logger.warning("chromaprint_feed failed")
+            return None
+        if not lib.chromaprint_finish(ctx):
+            logger.warning("chromaprint_finish failed")
+            return None
+
+        raw = ctypes.POINTER(ctypes.c_uint32)()
+        size = ctypes.c_int(0)
+        if not lib.chromaprint_get_raw_fingerprint(ctx, ctypes.byref(raw), ctypes.byref(size)):
+            logger.warning("chromaprint_get_raw_fingerprint failed")
+            return None
+        try:
+            if size.value == 0:
+                return np.empty(0, dtype=np.uint32)
+            return np.ctypeslib.as_array(raw, shape=(size.value,)).copy()
+        finally:
+            lib.chromaprint_dealloc(raw)
+    finally:
+        lib.chromaprint_free(ctx)
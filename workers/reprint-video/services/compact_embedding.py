@@ -0,0 +1,135 @@
+import logging
+import threading
+import numpy as np
+from models.database import (
+    save_embedding_projection,
+    get_embedding_projection,
+    get_latest_projection_id,
+)
+from utils.bits import popcount
+
+logger = logging.getLogger(__name__)
+
+SIMILARITY_BLOCK_ROWS = 4096
+
+
+class EmbeddingProjection:
+    """
+    A versioned linear projection of L2-normalized ResNet embeddings onto their
+    top principal directions, plus the statistics each compact code needs:
+
+    - pca16: projected, re-normalized vector as float16. The projection is
+      uncentered, so the dot product of two codes approximates the
+      full-precision cosine.
+    - pca_int8: projected vector scaled per dimension into int8.
+    - binary: one bit per dimension (above/below the fitted center), compared
+      by Hamming distance and mapped back to a cosine estimate.
+    """
+
+    def __init__(self, projection_id: int | None, components: np.ndarray, center: np.ndarray, scale: np.ndarray):
+        self.id = projection_id
+        self.components = components.astype(np.float32)
+        self.center = center.astype(np.float32)
+        self.scale = scale.astype(np.float32)
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[0]
+
+    def project(self, embeddings: np.ndarray) -> np.ndarray:
+        return _project(embeddings, self.components)
+
+    def encode(self, embeddings: np.ndarray, method: str) -> np.ndarray:
+        """Encode embeddings as a uint8 code matrix, one row per frame."""
+        projected = self.project(embeddings)
+        if method == "pca16":
+            codes = projected.astype("<f2")
+        elif method == "pca_int8":
+            codes = np.clip(np.rint(projected / self.scale), -127, 127).astype(np.int8)
+        elif method == "binary":
+            return np.packbits(projected > self.center, axis=1)
+        else:
+            raise ValueError(f"Unknown compact embedding method: {method}")
+        return np.ascontiguousarray(codes).view(np.uint8).reshape(len(codes), -1)
+
+    def decode(self, codes: np.ndarray, method: str) -> np.ndarray:
+        if method == "pca16":
+            return codes.view("<f2").astype(np.float32)
+        if method == "pca_int8":
+            return codes.view(np.int8).astype(np.float32) * self.scale
+        raise ValueError(f"{method} codes cannot be decoded to vectors")
+
+    def similarities(self, query_codes: np.ndarray, base_codes: np.ndarray, method: str) -> np.ndarray:
+        """Approximate cosine similarity matrix (query x base) between codes."""
+        if method != "binary":
+            return self.decode(query_codes, method) @ self.decode(base_codes, method).T
+
+        result = np.empty((len(query_codes), len(base_codes)), dtype=np.float32)
+        for start in range(0, len(base_codes), SIMILARITY_BLOCK_ROWS):
+            block = base_codes[start:start + SIMILARITY_BLOCK_ROWS]
+            hamming = popcount(query_codes[:, None, :] ^ block[None, :, :]).sum(axis=2)
+            # SimHash: the fraction of differing bits estimates angle / pi
+            result[:, start:start + len(block)] = np.cos(np.pi * hamming / self.dim)
+        return result
+
+    def to_db(self) -> dict:
+        return {
+            "components": self.components.astype("<f4").tobytes(),
+            "center": self.center.astype("<f4").tobytes(),
+            "scale": self.scale.astype("<f4").tobytes(),
+            "dim": self.dim,
+        }
+
+    @classmethod
+    def from_db(cls, row: dict) -> "EmbeddingProjection":
+        components = np.frombuffer(row["components"], dtype="<f4").reshape(row["dim"], -1)
+        center = np.frombuffer(row["center"], dtype="<f4")
+        scale = np.frombuffer(row["scale"], dtype="<f4")
+        return cls(row["id"], components, center, scale)
+
+
+def fit_projection(embeddings: np.ndarray, dim: int) -> EmbeddingProjection:
+    """Fit the top-dim right singular vectors of the L2-normalized sample."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    _, _, vt = np.linalg.svd(normalized, full_matrices=False)
+    components = vt[:dim]
+
+    projected = _project(embeddings, components)
+    center = np.median(projected, axis=0)
+    scale = np.maximum(np.abs(projected).max(axis=0), 1e-6) / 127.0
+    return EmbeddingProjection(None, components, center, scale)
+
+
+def _project(embeddings: np.ndarray, components: np.ndarray) -> np.ndarray:
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    projected = (embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)) @ components.T
+    return projected / np.maximum(np.linalg.norm(projected, axis=1, keepdims=True), 1e-12)
+
+
+def fit_and_save_projection(embeddings: np.ndarray, dim: int) -> EmbeddingProjection:
+    projection = fit_projection(embeddings, dim)
+    projection.id = save_embedding_projection(sample_size=len(embeddings), **projection.to_db())
+    logger.info(f"Saved embedding projection v{projection.id} ({dim}-d, fitted on {len(embeddings)} frames)")
+    return projection
+
+
+_projections: dict[int, EmbeddingProjection] = {}
+_projections_lock = threading.Lock()
+
+
+def get_active_projection() -> EmbeddingProjection | None:
+    """Latest fitted projection; loaded once per version and kept in-process."""
+    projection_id = get_latest_projection_id()
+    if projection_id is None:
+        return None
+
+    with _projections_lock:
+        projection = _projections.get(projection_id)
+        if projection is None:
+            row = get_embedding_projection(projection_id)
+            if row is None:
+                return None
+            projection = EmbeddingProjection.from_db(row)
+            _projections[projection_id] = projection
+        return projection
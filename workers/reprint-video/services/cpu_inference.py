@@ -0,0 +1,151 @@
+import logging
+import os
+import uuid
+from typing import Callable
+import numpy as np
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+CPU_BACKENDS = ("eager", "torchscript", "onnx")
+INPUT_SHAPE = (1, 3, 224, 224)
+# Fixed probe batch used to measure drift against eager when a graph is loaded
+PROBE_BATCH = 4
+PROBE_SEED = 0
+
+
+def load_cpu_graph(
+    model: nn.Module, backend: str, int8: bool, cache_dir: str, min_cosine: float
+) -> Callable[[torch.Tensor], np.ndarray] | None:
+    """
+    Compiled CPU replacement for the eager model, or None to keep eager.
+
+    torchscript: traced, frozen and optimized for inference.
+    onnx: exported graph run by ONNX Runtime; with int8, weights of the conv
+    and matmul layers are dynamically quantized to uint8 by
+    onnxruntime.quantization (signed int8 weights become ConvInteger nodes,
+    which the CPU provider cannot run).
+
+    Exported artifacts are cached under cache_dir (written to a temp name and
+    renamed, so concurrent prefork children can race safely). The graph is
+    rejected if its embeddings drift below min_cosine from eager on a probe
+    batch.
+    """
+    if backend == "eager":
+        return None
+    if backend not in CPU_BACKENDS:
+        logger.warning(f"Unknown CPU inference backend {backend}, using eager")
+        return None
+
+    label = f"{backend}{' int8' if int8 and backend == 'onnx' else ''}"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        if backend == "torchscript":
+            if int8:
+                # Dynamic quantization only covers Linear/LSTM layers, which the
+                # pooled ResNet body does not have
+                logger.warning("int8 is only supported with the onnx backend, using FP32 TorchScript")
+            graph = _load_torchscript(model, cache_dir)
+        else:
+            graph = _load_onnx(model, int8, cache_dir)
+    except Exception as e:
+        logger.warning(f"Loading {label} CPU backend failed, falling back to eager: {e}")
+        return None
+
+    drift = cosine_drift(model, graph)
+    if drift["min_cosine"] < min_cosine:
+        logger.warning(f"{label} backend drifts from eager (min cosine {drift['min_cosine']:.4f}), using eager")
+        return None
+
+    logger.info(f"Using {label} CPU backend (cosine vs eager: min {drift['min_cosine']:.4f}, mean {drift['mean_cosine']:.4f})")
+    return graph
+
+
+def eager_forward(model: nn.Module, batch: torch.Tensor) -> np.ndarray:
+    with torch.no_grad():
+        return model(batch).squeeze(-1).squeeze(-1).float().numpy()
+
+
+def cosine_drift(model: nn.Module, graph: Callable[[torch.Tensor], np.ndarray], batch: torch.Tensor | None = None) -> dict:
+    """Per-frame cosine similarity between eager and graph embeddings of the same batch."""
+    if batch is None:
+        generator = torch.Generator().manual_seed(PROBE_SEED)
+        batch = torch.randn((PROBE_BATCH, *INPUT_SHAPE[1:]), generator=generator)
+    reference = eager_forward(model, batch)
+    candidate = graph(batch)
+    cosine = (reference * candidate).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+    return {"min_cosine": float(cosine.min()), "mean_cosine": float(cosine.mean())}
+
+
+def _load_torchscript(model: nn.Module, cache_dir: str) -> Callable[[torch.Tensor], np.ndarray]:
+    path = os.path.join(cache_dir, f"resnet50_torch{torch.__version__.split('+')[0]}.pt")
+    if not os.path.exists(path):
+        with torch.no_grad():
+            traced = torch.jit.trace(model, torch.zeros(INPUT_SHAPE))
+        _atomic_save(path, lambda temp_path: torch.jit.save(traced, temp_path))
+        logger.info(f"Exported TorchScript model to {path}")
+
+    scripted = torch.jit.optimize_for_inference(torch.jit.freeze(torch.jit.load(path).eval()))
+
+    def forward(batch: torch.Tensor) -> np.ndarray:
+        with torch.no_grad():
+            return scripted(batch).squeeze(-1).squeeze(-1).float().numpy()
+
+    return forward
+
+
+def _load_onnx(model: nn.Module, int8: bool, cache_dir: str) -> Callable[[torch.Tensor], np.ndarray]:
+    import onnxruntime as ort
+
+    path = os.path.join(cache_dir, f"resnet50_torch{torch.__version__.split('+')[0]}.onnx")
+    if not os.path.exists(path):
+        _atomic_save(path, lambda temp_path: torch.onnx.export(
+            model,
+            torch.zeros(INPUT_SHAPE),
+            temp_path,
+            input_names=["input"],
+            output_names=["features"],
+            dynamic_axes={"input": {0: "batch"}, "features": {0: "batch"}},
+            opset_version=17,
+        ))
+        logger.info(f"Exported ONNX model to {path}")
+
+    if int8:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        fp32_path, path = path, path.replace(".onnx", ".uint8.onnx")
+        if not os.path.exists(path):
+            _atomic_save(path, lambda temp_path: quantize_dynamic(fp32_path, temp_path, weight_type=QuantType.QUInt8))
+            logger.info(f"Quantized ONNX model to {path}")
+
+    def new_session():
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = torch.get_num_threads()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    # ONNX Runtime's thread pool does not survive fork, so a session created
+    # in the prefork parent is rebuilt once in each child
+    sessions = {os.getpid(): new_session()}
+
+    def forward(batch: torch.Tensor) -> np.ndarray:
+        session = sessions.get(os.getpid())
+        if session is None:
+            session = sessions[os.getpid()] = new_session()
+        features = session.run(None, {"input": batch.float().numpy()})[0]
+        return features.reshape(len(features), -1).astype(np.float32, copy=False)
+
+    return forward
+
+
+def _atomic_save(path: str, save: Callable[[str], None]) -> None:
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        save(temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
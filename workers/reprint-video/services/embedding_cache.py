@@ -0,0 +1,113 @@
+import threading
+import logging
+from collections import OrderedDict
+from typing import Callable, Hashable
+import numpy as np
+from config import BASE_EMBEDDING_CACHE_MB, BASE_EMBEDDING_CACHE_FP16
+
+logger = logging.getLogger(__name__)
+
+
+class BaseEmbeddingCache:
+    """
+    Per-worker LRU cache of L2-normalized base embedding matrices keyed by
+    base_video_id. Each entry remembers the token it was loaded under
+    (status/frame_count/created_at of the base); a different token on lookup
+    means the base was re-registered or changed state, so it is reloaded.
+    """
+
+    def __init__(self, max_bytes: int, use_fp16: bool = False):
+        self.max_bytes = max_bytes
+        self.use_fp16 = use_fp16
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, tuple[Hashable, np.ndarray, np.ndarray]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        video_id: str,
+        token: Hashable,
+        loader: Callable[[str], tuple[np.ndarray, np.ndarray]],
+        normalize: bool = True,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return read-only (frame_indices, matrix) for video_id, calling loader
+        on a miss.
+        Keys may carry a suffix ("<video_id>:<variant>") to cache other
+        per-base matrices such as compact codes; pass normalize=False for those.
+        """
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is not None and entry[0] == token:
+                self._entries.move_to_end(video_id)
+                self.hits += 1
+                return entry[1], entry[2]
+            self.misses += 1
+            if entry is not None:
+                self._remove(video_id)
+
+        frame_indices, embeddings = loader(video_id)
+        if normalize:
+            normalized = _normalize(embeddings, np.float16 if self.use_fp16 else np.float32)
+        else:
+            normalized = embeddings
+        # Entries are shared by every task on the worker; in-place writes would corrupt them
+        frame_indices.setflags(write=False)
+        normalized.setflags(write=False)
+
+        with self._lock:
+            self._put(video_id, token, frame_indices, normalized)
+        return frame_indices, normalized
+
+    def invalidate(self, video_id: str) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k == video_id or k.startswith(f"{video_id}:")]:
+                self._remove(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def _put(self, video_id: str, token: Hashable, frame_indices: np.ndarray, normalized: np.ndarray) -> None:
+        size = frame_indices.nbytes + normalized.nbytes
+        if size > self.max_bytes:
+            return
+        if video_id in self._entries:
+            self._remove(video_id)
+        while self._entries and self._bytes + size > self.max_bytes:
+            evicted_id = next(iter(self._entries))
+            self._remove(evicted_id)
+            self.evictions += 1
+            logger.info(f"Evicted base embeddings for {evicted_id} from cache")
+        self._entries[video_id] = (token, frame_indices, normalized)
+        self._bytes += size
+
+    def _remove(self, video_id: str) -> None:
+        _, frame_indices, normalized = self._entries.pop(video_id)
+        self._bytes -= frame_indices.nbytes + normalized.nbytes
+
+
+def _normalize(embeddings: np.ndarray, dtype) -> np.ndarray:
+    if len(embeddings) == 0:
+        return embeddings.astype(dtype)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return (embeddings / norms).astype(dtype)
+
+
+_base_cache = None
+
+
+def get_base_embedding_cache() -> BaseEmbeddingCache:
+    global _base_cache
+    if _base_cache is None:
+        _base_cache = BaseEmbeddingCache(BASE_EMBEDDING_CACHE_MB * 1024 * 1024, BASE_EMBEDDING_CACHE_FP16)
+    return _base_cache
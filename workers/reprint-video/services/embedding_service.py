@@ -0,0 +1,175 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+STATS_LOG_EVERY_BATCHES = 200
+
+
+class _Request:
+    def __init__(self, num_frames: int):
+        self.future: Future = Future()
+        self.parts: dict[int, np.ndarray] = {}
+        self.remaining = num_frames
+
+    def complete_part(self, start: int, embeddings: np.ndarray) -> None:
+        self.parts[start] = embeddings
+        self.remaining -= len(embeddings)
+        if self.remaining == 0:
+            ordered = [self.parts[k] for k in sorted(self.parts)]
+            self.future.set_result(np.concatenate(ordered).astype(np.float32, copy=False))
+
+
+class EmbeddingService:
+    """
+    In-process dynamic batching in front of one model. Callers (Celery
+    threads) preprocess their frames on their own thread and enqueue the model
+    input; a single consumer thread owns the model, merges inputs from all
+    pending requests into batches of up to max_batch_size frames, and waits at
+    most max_latency for a batch to fill before running it. Each caller gets a
+    Future resolving to its embeddings in submission order.
+
+    Works the same on CPU; with one caller it degenerates to a per-batch
+    forward pass plus at most max_latency of extra wait.
+    """
+
+    def __init__(self, extractor_factory: Callable, max_batch_size: int | None = None, max_latency_ms: float = 20.0):
+        self.max_latency = max_latency_ms / 1000
+        self._extractor_factory = extractor_factory
+        self._extractor = None
+        self._max_batch_size = max_batch_size
+        self._ready = threading.Event()
+        self._queue: queue.Queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._frames = 0
+        self._capacity = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._waited_items = 0
+        self._thread = threading.Thread(target=self._run, name="embedding-service", daemon=True)
+        self._thread.start()
+
+    @property
+    def max_batch_size(self) -> int:
+        self._ready.wait()
+        return self._max_batch_size
+
+    def submit(self, frames) -> Future:
+        """Queue frames (PIL images or a uint8 tensor) and return a Future of their embeddings."""
+        self._ready.wait()
+        if self._extractor is None:
+            raise RuntimeError("Embedding service failed to load the model")
+
+        request = _Request(len(frames))
+        if len(frames) == 0:
+            request.future.set_result(np.empty((0, 0), dtype=np.float32))
+            return request.future
+
+        # Preprocess per model batch so a long request never holds a huge input tensor
+        for start in range(0, len(frames), self._max_batch_size):
+            batch = self._extractor.preprocess(frames[start:start + self._max_batch_size])
+            self._queue.put((request, start, batch, time.perf_counter()))
+        return request.future
+
+    def embed(self, frames) -> np.ndarray:
+        return self.submit(frames).result()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "batches": self._batches,
+                "frames": self._frames,
+                "batch_fill": self._frames / self._capacity if self._capacity else 0.0,
+                "avg_queue_wait_ms": 1000 * self._wait_total / self._waited_items if self._waited_items else 0.0,
+                "max_queue_wait_ms": 1000 * self._wait_max,
+            }
+
+    def _run(self) -> None:
+        try:
+            self._extractor = self._extractor_factory()
+            if self._max_batch_size is None:
+                self._max_batch_size = 64 if self._extractor.use_gpu else 32
+        except Exception as e:
+            logger.error(f"Embedding service could not load the model: {e}")
+            return
+        finally:
+            self._ready.set()
+
+        carry: deque = deque()
+        while True:
+            items, pending, size = [], [], 0
+            try:
+                first = carry.popleft() if carry else self._queue.get()
+                deadline = first[3] + self.max_latency
+                pending = [first]
+
+                while pending:
+                    # Stays in pending until it is in items, so a failure here still fails its request
+                    item = pending[-1]
+                    request, start, batch, enqueued = item
+                    room = self._max_batch_size - size
+                    if len(batch) > room:
+                        # Split: the head fills this batch, the tail leads the next one
+                        carry.appendleft((request, start + room, batch[room:], enqueued))
+                        item = (request, start, batch[:room], enqueued)
+                    pending.pop()
+                    items.append(item)
+                    size += len(item[2])
+                    if size >= self._max_batch_size:
+                        break
+                    if carry:
+                        pending.append(carry.popleft())
+                        continue
+                    timeout = deadline - time.perf_counter()
+                    try:
+                        pending.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                self._run_batch(items, size)
+            except Exception as e:
+                # Never let one bad batch take down the only consumer thread
+                logger.error(f"Embedding batch of {size} frames failed: {e}")
+                _fail_requests(items + pending, e)
+
+    def _run_batch(self, items: list, size: int) -> None:
+        started = time.perf_counter()
+        try:
+            embeddings = self._extractor.forward(torch.cat([item[2] for item in items]))
+            offset = 0
+            for request, start, batch, _ in items:
+                if not request.future.done():
+                    request.complete_part(start, embeddings[offset:offset + len(batch)])
+                offset += len(batch)
+        except Exception as e:
+            logger.error(f"Embedding batch of {size} frames failed: {e}")
+            _fail_requests(items, e)
+            return
+
+        with self._stats_lock:
+            self._batches += 1
+            self._frames += size
+            self._capacity += self._max_batch_size
+            for *_, enqueued in items:
+                wait = started - enqueued
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+                self._waited_items += 1
+            log_stats = self._batches % STATS_LOG_EVERY_BATCHES == 0
+
+        if log_stats:
+            logger.info(f"Embedding service: {self.stats()}")
+
+
+def _fail_requests(items: list, error: Exception) -> None:
+    for request, *_ in items:
+        if not request.future.done():
+            request.future.set_exception(error)
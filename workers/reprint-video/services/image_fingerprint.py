@@ -1,14 +1,36 @@
 import torch
 import torch.nn as nn
 from torchvision import models, transforms
+from torchvision.transforms import functional as TF
 from torchvision.models._api import WeightsEnum
 from torch.hub import load_state_dict_from_url
 from PIL import Image
 import numpy as np
 import logging
+import threading
+import time
+from typing import Callable, Iterable
+from config import (
+    SIMILARITY_TOP_K,
+    SIMILARITY_TILE_ROWS,
+    EMBEDDING_BATCHING,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_BATCH_MAX_LATENCY_MS,
+    CPU_INFERENCE_BACKEND,
+    CPU_INFERENCE_INT8,
+    CPU_INFERENCE_MIN_COSINE,
+    MODEL_CACHE_DIR,
+)
+from services.embedding_service import EmbeddingService
+from services.cpu_inference import load_cpu_graph
+from services.perceptual_hash import frame_hashes
 
 logger = logging.getLogger(__name__)
 
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+WARMUP_FRAMES = 2
+
 
 def _patched_load_state_dict(self, *args, **kwargs):
     kwargs["progress"] = False
@@ -45,22 +67,52 @@ class ResNet50Extractor:
             self.use_fp16 = False
             logger.info("Using CPU for inference")
 
+        self.cpu_graph = None
+        if not self.use_gpu:
+            self.cpu_graph = load_cpu_graph(
+                self.model, CPU_INFERENCE_BACKEND, CPU_INFERENCE_INT8, MODEL_CACHE_DIR, CPU_INFERENCE_MIN_COSINE
+            )
+
         self.transform = transforms.Compose([
             transforms.Resize(256),
             transforms.CenterCrop(224),
             transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+            transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD),
         ])
-
-    def extract(self, images: list[Image.Image]) -> np.ndarray:
-        if not images:
+        self.mean = torch.tensor(IMAGENET_MEAN, device=self.device).view(1, 3, 1, 1)
+        self.std = torch.tensor(IMAGENET_STD, device=self.device).view(1, 3, 1, 1)
+
+    def extract(self, images: list[Image.Image] | torch.Tensor) -> np.ndarray:
+        """
+        Embed a batch of frames. uint8 [N, C, H, W] tensors (straight from
+        TorchCodec) are preprocessed as one batched op on the model's device;
+        PIL images go through the per-image transform (ffmpeg fallback).
+        """
+        if len(images) == 0:
             return np.array([])
 
-        batch = torch.stack([self.transform(img) for img in images])
-        batch = batch.to(self.device)
+        result = self.forward(self.preprocess(images))
+
+        if self.use_gpu:
+            torch.cuda.empty_cache()
+
+        return result
+
+    def preprocess(self, images: list[Image.Image] | torch.Tensor) -> torch.Tensor:
+        """Normalized [N, 3, 224, 224] model input on the model's device."""
+        if isinstance(images, torch.Tensor):
+            batch = self._preprocess_tensor(images)
+        else:
+            batch = torch.stack([self.transform(img) for img in images])
+            batch = batch.to(self.device)
 
         if self.use_fp16:
             batch = batch.half()
+        return batch
+
+    def forward(self, batch: torch.Tensor) -> np.ndarray:
+        if self.cpu_graph is not None:
+            return self.cpu_graph(batch)
 
         with torch.no_grad():
             if self.use_gpu:
@@ -71,12 +123,14 @@ class ResNet50Extractor:
 
             features = features.squeeze(-1).squeeze(-1)
 
-        result = features.float().cpu().numpy()
+        return features.float().cpu().numpy()
 
-        if self.use_gpu:
-            torch.cuda.empty_cache()
-
-        return result
+    def _preprocess_tensor(self, frames: torch.Tensor) -> torch.Tensor:
+        # Same steps as self.transform: Resize(256), CenterCrop(224), scale to [0, 1], Normalize
+        batch = frames.to(self.device, non_blocking=True).float().div_(255.0)
+        batch = TF.resize(batch, 256, antialias=True)
+        batch = TF.center_crop(batch, 224)
+        return batch.sub_(self.mean).div_(self.std)
 
 
 _extractor = None
@@ -89,56 +143,254 @@ def get_extractor() -> ResNet50Extractor:
     return _extractor
 
 
-def generate_image_fingerprints(frames: list[Image.Image], batch_size: int = None) -> list[dict]:
-    if not frames:
-        return []
+def preload_extractor(share_memory: bool) -> ResNet50Extractor:
+    """
+    Build the extractor and run one warm-up forward pass at worker boot. With
+    share_memory (prefork parent, CPU only) the weights are moved into shared
+    memory so every forked child maps the same pages instead of its own copy.
+    """
+    started = time.perf_counter()
+    extractor = get_extractor()
+    if share_memory:
+        extractor.model.share_memory()
+    extractor.extract(torch.zeros((WARMUP_FRAMES, 3, 224, 224), dtype=torch.uint8))
+    logger.info(f"Preloaded ResNet50Extractor in {time.perf_counter() - started:.1f}s (shared memory: {share_memory})")
+    return extractor
+
+
+_embedding_service = None
+_embedding_service_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    global _embedding_service
+    with _embedding_service_lock:
+        if _embedding_service is None:
+            _embedding_service = EmbeddingService(
+                get_extractor,
+                max_batch_size=EMBEDDING_BATCH_SIZE or None,
+                max_latency_ms=EMBEDDING_BATCH_MAX_LATENCY_MS,
+            )
+        return _embedding_service
+
+
+def generate_image_embeddings(frames: list[Image.Image] | torch.Tensor, batch_size: int = None) -> np.ndarray:
+    if len(frames) == 0:
+        return np.empty((0, 0), dtype=np.float32)
+
+    if EMBEDDING_BATCHING:
+        # Frames from concurrent tasks are merged into shared batches by one model thread
+        return get_embedding_service().embed(frames)
 
     extractor = get_extractor()
 
     if batch_size is None:
         batch_size = 64 if extractor.use_gpu else 32
 
-    embeddings = []
+    batches = [extractor.extract(frames[i:i + batch_size]) for i in range(0, len(frames), batch_size)]
+    return np.concatenate(batches).astype(np.float32, copy=False)
 
-    for i in range(0, len(frames), batch_size):
-        batch = frames[i:i + batch_size]
-        batch_embeddings = extractor.extract(batch)
-        for j, emb in enumerate(batch_embeddings):
-            embeddings.append({
-                "frame_index": i + j,
-                "embedding": emb.tolist(),
-            })
 
-    return embeddings
+def embed_frame_batches(
+    frame_batches: Iterable[list[Image.Image] | torch.Tensor], hashes: list[np.ndarray] | None = None
+) -> np.ndarray:
+    """
+    Embed frames batch by batch as they are decoded, keeping only the
+    embeddings. With a hashes list, each batch's perceptual hashes are
+    appended to it on the way.
+    """
+    embeddings = []
+    for batch in frame_batches:
+        if len(batch) == 0:
+            continue
+        if hashes is not None:
+            hashes.append(frame_hashes(batch))
+        embeddings.append(generate_image_embeddings(batch))
+    if not embeddings:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.concatenate(embeddings)
 
 
 def compare_image_fingerprints(
-    query_embeddings: list[dict],
-    base_embeddings: list[dict],
-) -> tuple[float, list[dict]]:
-    if not query_embeddings or not base_embeddings:
-        return 0.0, []
-
-    query_matrix = np.array([e["embedding"] for e in query_embeddings])
-    base_matrix = np.array([e["embedding"] for e in base_embeddings])
-
-    query_norm = query_matrix / np.linalg.norm(query_matrix, axis=1, keepdims=True)
-    base_norm = base_matrix / np.linalg.norm(base_matrix, axis=1, keepdims=True)
-
-    similarities = np.dot(query_norm, base_norm.T)
-
-    matched_frames = []
-    total_similarity = 0.0
-
-    for i, row in enumerate(similarities):
-        best_match_idx = np.argmax(row)
-        best_similarity = row[best_match_idx]
-        total_similarity += best_similarity
-        matched_frames.append({
-            "query_frame": query_embeddings[i]["frame_index"],
-            "base_frame": base_embeddings[best_match_idx]["frame_index"],
-            "similarity": float(best_similarity),
-        })
-
-    avg_similarity = total_similarity / len(query_embeddings)
-    return float(avg_similarity), matched_frames
+    query_embeddings: np.ndarray,
+    base_embeddings: np.ndarray,
+    base_frame_indices: np.ndarray,
+    base_normalized: bool = False,
+    query_frame_indices: np.ndarray | None = None,
+) -> tuple[float, list[dict], dict]:
+    """
+    Score each query frame against its best base frame. Query frames are
+    numbered by row unless query_frame_indices places them on the fps grid
+    (scene/keyframe sampling).
+    Takes embedding matrices directly so no per-frame Python lists are built.
+    Pass base_normalized=True when the base rows are already L2-normalized.
+
+    Returns the average best-match similarity, the per-frame matches and the
+    temporal alignment of the top-k matches (see _temporal_alignment).
+    """
+    if len(query_embeddings) == 0 or len(base_embeddings) == 0:
+        return 0.0, [], _NO_ALIGNMENT
+
+    query_norm = _l2_normalize(query_embeddings)
+    base_norm = base_embeddings if base_normalized else base_embeddings.astype(np.float32)
+
+    def score_tile(start: int, end: int) -> np.ndarray:
+        tile = base_norm[start:end].astype(np.float32, copy=False)
+        if not base_normalized:
+            tile = _l2_normalize(tile)
+        return query_norm @ tile.T
+
+    top_idx, top_sim = _blocked_top_k(score_tile, len(query_norm), len(base_norm))
+    return _summarize_matches(top_idx, top_sim, base_frame_indices, query_frame_indices)
+
+
+def compare_compact_fingerprints(
+    projection,
+    method: str,
+    query_embeddings: np.ndarray,
+    base_codes: np.ndarray,
+    base_frame_indices: np.ndarray,
+    query_frame_indices: np.ndarray | None = None,
+) -> tuple[float, list[dict], dict]:
+    """Same as compare_image_fingerprints, scored on compact codes of the base."""
+    if len(query_embeddings) == 0 or len(base_codes) == 0:
+        return 0.0, [], _NO_ALIGNMENT
+
+    query_codes = projection.encode(query_embeddings, method)
+
+    def score_tile(start: int, end: int) -> np.ndarray:
+        return projection.similarities(query_codes, base_codes[start:end], method)
+
+    top_idx, top_sim = _blocked_top_k(score_tile, len(query_codes), len(base_codes))
+    return _summarize_matches(top_idx, top_sim, base_frame_indices, query_frame_indices)
+
+
+_NO_ALIGNMENT = {"offset_frames": None, "alignment_score": 0.0, "aligned_frames": 0}
+
+
+def _l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def _blocked_top_k(
+    score_tile: Callable[[int, int], np.ndarray],
+    num_query: int,
+    num_base: int,
+    k: int = SIMILARITY_TOP_K,
+    tile_rows: int = SIMILARITY_TILE_ROWS,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Stream over base tiles keeping the running top-k base rows per query row,
+    so memory is bounded by query x tile_rows instead of query x base.
+    Returns (indices, similarities), both [num_query, k], best first.
+    """
+    k = max(1, min(k, num_base))
+    top_idx = np.empty((num_query, 0), dtype=np.int64)
+    top_sim = np.empty((num_query, 0), dtype=np.float32)
+
+    for start in range(0, num_base, tile_rows):
+        end = min(start + tile_rows, num_base)
+        tile_sim = score_tile(start, end).astype(np.float32, copy=False)
+        tile_idx = np.broadcast_to(np.arange(start, end), tile_sim.shape)
+
+        candidate_sim = np.concatenate([top_sim, tile_sim], axis=1)
+        candidate_idx = np.concatenate([top_idx, tile_idx], axis=1)
+        if candidate_sim.shape[1] > k:
+            keep = np.argpartition(-candidate_sim, k - 1, axis=1)[:, :k]
+            candidate_sim = np.take_along_axis(candidate_sim, keep, axis=1)
+            candidate_idx = np.take_along_axis(candidate_idx, keep, axis=1)
+        top_sim, top_idx = candidate_sim, candidate_idx
+
+    # Best first; ties go to the earlier base frame like a plain argmax
+    order = np.lexsort((top_idx, -top_sim), axis=1)
+    return np.take_along_axis(top_idx, order, axis=1), np.take_along_axis(top_sim, order, axis=1)
+
+
+def _temporal_alignment(
+    top_idx: np.ndarray,
+    top_sim: np.ndarray,
+    base_frame_indices: np.ndarray,
+    query_frame_indices: np.ndarray,
+    tolerance: int = 1,
+) -> dict:
+    """
+    Diagonal voting over the top-k matches: every match votes, weighted by its
+    similarity, for the offset base_frame - query_frame. A reprint lines up on
+    one offset; coincidental matches scatter. alignment_score is the average
+    over query frames of the best similarity consistent with the winning
+    offset (within tolerance frames), counting 0 for frames with none.
+    """
+    num_query = len(top_idx)
+    offsets = base_frame_indices[top_idx] - query_frame_indices[:, None]
+
+    unique_offsets, inverse = np.unique(offsets, return_inverse=True)
+    weights = np.bincount(inverse.ravel(), weights=np.maximum(top_sim, 0).ravel(), minlength=len(unique_offsets))
+    cumulative = np.concatenate([[0.0], np.cumsum(weights)])
+    lo = np.searchsorted(unique_offsets, unique_offsets - tolerance, side="left")
+    hi = np.searchsorted(unique_offsets, unique_offsets + tolerance, side="right")
+    best_offset = int(unique_offsets[np.argmax(cumulative[hi] - cumulative[lo])])
+
+    consistent = np.abs(offsets - best_offset) <= tolerance
+    aligned = consistent.any(axis=1)
+    aligned_sim = np.where(consistent, top_sim, -np.inf).max(axis=1)
+
+    return {
+        "offset_frames": best_offset,
+        "alignment_score": float(np.where(aligned, aligned_sim, 0.0).sum() / num_query),
+        "aligned_frames": int(aligned.sum()),
+    }
+
+
+def _summarize_matches(
+    top_idx: np.ndarray,
+    top_sim: np.ndarray,
+    base_frame_indices: np.ndarray,
+    query_frame_indices: np.ndarray | None = None,
+) -> tuple[float, list[dict], dict]:
+    if query_frame_indices is None:
+        query_frame_indices = np.arange(len(top_idx))
+    best_similarity = top_sim[:, 0]
+    best_base_frames = base_frame_indices[top_idx[:, 0]]
+
+    matched_frames = [
+        {"query_frame": int(query_frame), "base_frame": int(base_frame), "similarity": float(similarity)}
+        for query_frame, base_frame, similarity in zip(query_frame_indices, best_base_frames, best_similarity)
+    ]
+
+    alignment = _temporal_alignment(top_idx, top_sim, base_frame_indices, query_frame_indices)
+    return float(best_similarity.mean()), matched_frames, alignment
+
+
+def vote_frame_matches(matches: list[dict], fps: float, limit: int) -> list[dict]:
+    """
+    Rank candidate base videos from per-frame ANN matches. Each match votes,
+    weighted by similarity, for (video, base_time - query_time) rounded to one
+    sampled frame; a real reprint piles its votes onto a single offset.
+    """
+    frame_step = 1.0 / fps if fps > 0 else 1.0
+    bins: dict[tuple[str, int], dict] = {}
+
+    for match in matches:
+        query_time = match["query_frame"] * frame_step
+        offset_bin = round((match["base_timestamp"] - query_time) / frame_step)
+        key = (match["video_id"], offset_bin)
+        entry = bins.setdefault(key, {"score": 0.0, "query_frames": set(), "votes": 0})
+        entry["score"] += match["similarity"]
+        entry["votes"] += 1
+        entry["query_frames"].add(match["query_frame"])
+
+    best_per_video: dict[str, dict] = {}
+    for (video_id, offset_bin), entry in bins.items():
+        best = best_per_video.get(video_id)
+        if best is None or entry["score"] > best["score"]:
+            best_per_video[video_id] = {
+                "video_id": video_id,
+                "base_start_time": offset_bin * frame_step,
+                "score": entry["score"],
+                "matched_frames": len(entry["query_frames"]),
+                "avg_similarity": entry["score"] / entry["votes"],
+            }
+
+    ranked = sorted(best_per_video.values(), key=lambda c: c["score"], reverse=True)
+    return ranked[:limit]
@@ -0,0 +1,265 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+STALE_TEMP_SECONDS = 3600
+
+
+class ObjectCache:
+    """
+    Worker-local, content-addressed disk cache for MinIO objects, shared by all
+    threads and prefork processes on the host.
+
+    Entries are named by sha256(bucket/key:etag), so a re-uploaded object gets
+    a new entry and the stale one ages out. Files are written to a temp name
+    and renamed into place, then made read-only. A per-entry lock file
+    (flock) ensures one download per object when several tasks miss at once.
+
+    Callers pin an entry with a shared flock on the data file for as long as
+    they use the path; eviction (oldest mtime first, mtime bumped on every hit)
+    only removes entries it can lock exclusively, so a path handed to a task
+    stays valid until it is released.
+
+    Hit/miss counters are kept in a stats file under the cache root so the
+    ratio covers every process using the cache, not just this one.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock_dir = os.path.join(root, ".locks")
+        self._pins: dict[str, list[int]] = {}
+        self._pins_lock = threading.Lock()
+        os.makedirs(self._lock_dir, exist_ok=True)
+
+    def fetch(self, bucket: str, key: str, etag: str, size: int, download: Callable[[str], None], suffix: str = "") -> str:
+        """
+        Return a read-only, pinned local path for the object, calling
+        download(temp_path) on a miss. Release it with release(path).
+        """
+        digest = hashlib.sha256(f"{bucket}/{key}:{etag}".encode()).hexdigest()
+        path = os.path.join(self.root, digest + suffix)
+
+        fd = self._pin(path)
+        if fd is not None:
+            os.utime(path)
+            self._record(hits=1, bytes_saved=size)
+            logger.info(f"Object cache hit for {key} ({self._summary()})")
+            return self._register_pin(path, fd)
+
+        with self._entry_lock(digest):
+            # Another thread or process may have filled it while we waited
+            fd = self._pin(path)
+            if fd is None:
+                temp_path = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}{suffix}")
+                try:
+                    download(temp_path)
+                    os.chmod(temp_path, 0o444)
+                    # Pin before the rename so eviction can never see it unpinned
+                    fd = os.open(temp_path, os.O_RDONLY)
+                    fcntl.flock(fd, fcntl.LOCK_SH)
+                    os.replace(temp_path, path)
+                finally:
+                    _unlink_quietly(temp_path)
+                self._record(misses=1, bytes_downloaded=size)
+                logger.info(f"Object cache miss for {key} ({self._summary()})")
+            else:
+                os.utime(path)
+                self._record(hits=1, bytes_saved=size)
+
+        self._evict()
+        return self._register_pin(path, fd)
+
+    def release(self, path: str) -> bool:
+        """Drop one pin on path. Returns False if path is not a pinned cache entry."""
+        with self._pins_lock:
+            fds = self._pins.get(path)
+            if not fds:
+                return False
+            fd = fds.pop()
+            if not fds:
+                del self._pins[path]
+        os.close(fd)
+        return True
+
+    def stats(self) -> dict:
+        with self._stats_file() as stats:
+            counters = dict(stats)
+        requests = counters.get("hits", 0) + counters.get("misses", 0)
+        counters["hit_ratio"] = counters.get("hits", 0) / requests if requests else 0.0
+        counters["entries"], counters["bytes"] = self._usage()
+        return counters
+
+    def _pin(self, path: str) -> int | None:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        # Evicted between open and lock: the fd points at an unlinked inode
+        try:
+            if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+        return None
+
+    def _register_pin(self, path: str, fd: int) -> str:
+        with self._pins_lock:
+            self._pins.setdefault(path, []).append(fd)
+        return path
+
+    def _entry_lock(self, digest: str) -> "_FileLock":
+        return _FileLock(os.path.join(self._lock_dir, digest + ".lock"), remove=True)
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        entries = []
+        now = time.time()
+        for entry in os.scandir(self.root):
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.startswith(".tmp-"):
+                # Left behind by a process killed mid-download
+                if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                    _unlink_quietly(entry.path)
+                continue
+            if entry.name.startswith("."):
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _usage(self) -> tuple[int, int]:
+        entries = self._entries()
+        return len(entries), sum(size for _, size, _ in entries)
+
+    def _evict(self) -> None:
+        with _FileLock(os.path.join(self._lock_dir, "evict.lock"), blocking=False) as acquired:
+            if not acquired:
+                return  # another process is already evicting
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            evicted = 0
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if _remove_unpinned(path):
+                    total -= size
+                    evicted += 1
+        if evicted:
+            self._record(evictions=evicted)
+            logger.info(f"Evicted {evicted} objects from cache ({total} bytes in use)")
+
+    def _stats_file(self) -> "_StatsFile":
+        return _StatsFile(os.path.join(self.root, ".stats.json"))
+
+    def _record(self, **increments: int) -> None:
+        with self._stats_file() as stats:
+            for name, value in increments.items():
+                stats[name] = stats.get(name, 0) + value
+
+    def _summary(self) -> str:
+        with self._stats_file() as stats:
+            hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+            saved = stats.get("bytes_saved", 0)
+        ratio = hits / (hits + misses) if hits + misses else 0.0
+        return f"hit ratio {ratio:.2f}, {saved / (1024 * 1024):.0f} MB saved"
+
+
+class _FileLock:
+    """
+    Exclusive flock on a lock file. With remove=True the file is unlinked while
+    still held; acquirers check the inode they locked is still the one on disk.
+    """
+
+    def __init__(self, path: str, blocking: bool = True, remove: bool = False):
+        self.path = path
+        self.blocking = blocking
+        self.remove = remove
+        self._fd = None
+
+    def __enter__(self) -> bool:
+        flags = fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, flags)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+            try:
+                if os.fstat(fd).st_ino == os.stat(self.path).st_ino:
+                    self._fd = fd
+                    return True
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    def __exit__(self, *exc) -> None:
+        if self._fd is None:
+            return
+        if self.remove:
+            _unlink_quietly(self.path)
+        os.close(self._fd)
+        self._fd = None
+
+
+class _StatsFile:
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        self.data: dict = {}
+
+    def __enter__(self) -> dict:
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        raw = os.pread(self._fd, 4096, 0)
+        try:
+            self.data = json.loads(raw) if raw else {}
+        except ValueError:
+            self.data = {}
+        return self.data
+
+    def __exit__(self, *exc) -> None:
+        payload = json.dumps(self.data).encode()
+        os.ftruncate(self._fd, 0)
+        os.pwrite(self._fd, payload, 0)
+        os.close(self._fd)
+
+
+def _remove_unpinned(path: str) -> bool:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return False
+    try:
+        os.unlink(path)
+        return True
+    except FileNotFoundError:
+        return False
+    finally:
+        os.close(fd)
+
+
+def _unlink_quietly(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
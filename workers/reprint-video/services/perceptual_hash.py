@@ -0,0 +1,68 @@
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+from utils.bits import popcount
+
+HASH_BITS = 64
+# dHash grid: 8 rows of 9 luma samples give 8 left/right gradient bits per row
+HASH_ROWS, HASH_COLS = 8, 9
+# Pairwise XOR/popcount blocks are capped at this many query x base pairs
+HAMMING_BLOCK_PAIRS = 1 << 20
+
+_LUMA = torch.tensor([0.299, 0.587, 0.114]).view(1, 3, 1, 1)
+
+
+def frame_hashes(frames: list[Image.Image] | torch.Tensor) -> np.ndarray:
+    """
+    64-bit difference hash (dHash) of each frame as int64, the bigint the
+    phash column stores. Frames are reduced to a 9x8 luma grid and each bit
+    records whether a sample is brighter than its left neighbour, which
+    survives re-encoding and rescaling but not crops or overlays.
+    """
+    if len(frames) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    if isinstance(frames, torch.Tensor):
+        # uint8 [N, C, H, W] from TorchCodec, reduced on the frames' device
+        luma = (frames.float() * _LUMA.to(frames.device)).sum(dim=1, keepdim=True)
+        grid = F.interpolate(luma, size=(HASH_ROWS, HASH_COLS), mode="area")[:, 0].cpu().numpy()
+    else:
+        grid = np.stack([
+            np.asarray(img.convert("L").resize((HASH_COLS, HASH_ROWS), Image.BOX), dtype=np.float32)
+            for img in frames
+        ])
+
+    bits = grid[:, :, 1:] > grid[:, :, :-1]
+    packed = np.packbits(bits.reshape(len(bits), HASH_BITS), axis=1)
+    return packed.view(">u8").ravel().astype(np.uint64).view(np.int64)
+
+
+def hamming_distances(query: np.ndarray, base: np.ndarray) -> np.ndarray:
+    """[len(query), len(base)] bit distances between two int64 hash arrays."""
+    xor = np.bitwise_xor(query.astype(np.uint64)[:, None], base.astype(np.uint64)[None, :])
+    return popcount(xor)
+
+
+def nearest_hashes(query: np.ndarray, base: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Blocked over base so memory stays near HAMMING_BLOCK_PAIRS. Returns the
+    distance and row of each query hash's nearest base hash, and the distance
+    of each base hash to its nearest query hash.
+    """
+    query_distance = np.full(len(query), HASH_BITS + 1, dtype=np.int64)
+    query_nearest = np.zeros(len(query), dtype=np.int64)
+    base_distance = np.full(len(base), HASH_BITS + 1, dtype=np.int64)
+    if len(query) == 0 or len(base) == 0:
+        return query_distance, query_nearest, base_distance
+
+    block = max(1, HAMMING_BLOCK_PAIRS // len(query))
+    for start in range(0, len(base), block):
+        distances = hamming_distances(query, base[start:start + block])
+        block_nearest = distances.argmin(axis=1)
+        block_distance = distances[np.arange(len(query)), block_nearest]
+        closer = block_distance < query_distance
+        query_distance[closer] = block_distance[closer]
+        query_nearest[closer] = start + block_nearest[closer]
+        base_distance[start:start + block] = distances.min(axis=0)
+    return query_distance, query_nearest, base_distance
@@ -1,20 +1,53 @@
 import tempfile
 import os
+from datetime import timedelta
 from minio import Minio
-from config import MINIO_ENDPOINT, MINIO_ACCESS_KEY, MINIO_SECRET_KEY, MINIO_BUCKET
+from config import (
+    MINIO_ENDPOINT,
+    MINIO_ACCESS_KEY,
+    MINIO_SECRET_KEY,
+    MINIO_BUCKET,
+    OBJECT_CACHE_DIR,
+    OBJECT_CACHE_MB,
+    OBJECT_URL_EXPIRES_SECONDS,
+)
+from services.object_cache import ObjectCache
+
+_client = None
+_object_cache = None
 
 
 def get_minio_client() -> Minio:
-    return Minio(
-        MINIO_ENDPOINT,
-        access_key=MINIO_ACCESS_KEY,
-        secret_key=MINIO_SECRET_KEY,
-        secure=False,
-    )
+    global _client
+    if _client is None:
+        _client = Minio(
+            MINIO_ENDPOINT,
+            access_key=MINIO_ACCESS_KEY,
+            secret_key=MINIO_SECRET_KEY,
+            secure=False,
+        )
+    return _client
+
+
+def get_object_cache() -> ObjectCache | None:
+    global _object_cache
+    if _object_cache is None and OBJECT_CACHE_MB > 0:
+        _object_cache = ObjectCache(OBJECT_CACHE_DIR, OBJECT_CACHE_MB * 1024 * 1024)
+    return _object_cache
 
 
 def download_video(object_key: str) -> str:
+    """
+    Local path of the object. With the object cache enabled this is a shared,
+    read-only cache entry; either way hand it back with release_video.
+    """
     client = get_minio_client()
+    cache = get_object_cache()
+    if cache is not None:
+        stat = client.stat_object(MINIO_BUCKET, object_key)
+        if stat.size <= cache.max_bytes:
+            return _fetch_cached(cache, object_key, stat)
+
     temp_file = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
     temp_file.close()
 
@@ -22,6 +55,49 @@ def download_video(object_key: str) -> str:
     return temp_file.name
 
 
+def get_video_source(object_key: str) -> str:
+    """
+    Path or URL to seek-decode a time range of a whole original from. The
+    shared cache entry when the object fits the object cache (downloaded once
+    per host for all of its chunks), otherwise a presigned URL that ffmpeg and
+    TorchCodec read with HTTP range requests. Hand it back with release_video.
+    """
+    cache = get_object_cache()
+    if cache is not None:
+        stat = get_minio_client().stat_object(MINIO_BUCKET, object_key)
+        if stat.size <= cache.max_bytes:
+            return _fetch_cached(cache, object_key, stat)
+    return get_object_url(object_key)
+
+
+def _fetch_cached(cache: ObjectCache, object_key: str, stat) -> str:
+    client = get_minio_client()
+    return cache.fetch(
+        MINIO_BUCKET,
+        object_key,
+        stat.etag,
+        stat.size,
+        lambda path: client.fget_object(MINIO_BUCKET, object_key, path),
+        suffix=".mp4",
+    )
+
+
+def get_object_url(object_key: str) -> str:
+    return get_minio_client().presigned_get_object(
+        MINIO_BUCKET, object_key, expires=timedelta(seconds=OBJECT_URL_EXPIRES_SECONDS)
+    )
+
+
+def release_video(path: str | None) -> None:
+    """Unpin a cache entry returned by download_video, or delete a temp download."""
+    if not path:
+        return
+    cache = get_object_cache()
+    if cache is not None and cache.release(path):
+        return
+    cleanup_temp_files(path)
+
+
 def cleanup_temp_files(*paths: str | None) -> None:
     for path in paths:
         if path and os.path.exists(path):
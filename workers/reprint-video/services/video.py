@@ -1,15 +1,29 @@
 import subprocess
 import tempfile
 import os
+import shutil
+import re
 import logging
 from pathlib import Path
+from typing import Iterator
 from PIL import Image
 import torch
 import numpy as np
-from config import EXTRACT_FPS
+from config import (
+    EXTRACT_FPS,
+    CHUNK_DURATION_SECONDS,
+    FRAME_BATCH_SIZE,
+    FRAME_SAMPLING,
+    SCENE_THRESHOLD,
+    SAMPLING_MIN_FPS,
+    SAMPLING_MAX_FPS,
+)
 
 logger = logging.getLogger(__name__)
 
+# Chromaprint's native rate; audio decoded at this rate needs no resampling in the fingerprinter
+AUDIO_SAMPLE_RATE = 11025
+
 
 def _check_gpu_available() -> bool:
     try:
@@ -20,130 +34,403 @@ def _check_gpu_available() -> bool:
 
 def extract_frames(video_path: str) -> tuple[list[Image.Image], float, float]:
     """
-    Extract frames using TorchCodec with GPU acceleration.
-    Falls back to ffmpeg if TorchCodec fails.
+    Extract all sampled frames into memory. Prefer stream_frames for anything
+    long: this holds every decoded frame at once.
     """
-    try:
-        from torchcodec.decoders import VideoDecoder, set_cuda_backend
-
-        # Use GPU if available, otherwise CPU
-        device = "cuda" if _check_gpu_available() else "cpu"
-        logger.info(f"Extracting frames with TorchCodec (device: {device})")
-
-        # Use Beta CUDA backend for faster GPU decoding
-        if device == "cuda":
-            set_cuda_backend("beta")
-            logger.info("Using Beta CUDA backend for TorchCodec")
-
-        decoder = VideoDecoder(video_path, device=device)
-
-        # Get video metadata (TorchCodec 0.9+ API)
-        metadata = decoder.metadata
-        video_fps = metadata.average_fps
-        num_frames = metadata.num_frames
-        duration = metadata.duration_seconds
-
-        logger.info(f"Video metadata - fps: {video_fps:.2f}, frames: {num_frames}, duration: {duration:.2f}s")
+    batches, duration, fps, _ = stream_frames(video_path)
+    frames = []
+    for batch in batches:
+        frames.extend(_tensor_to_pil(batch) if isinstance(batch, torch.Tensor) else batch)
+    logger.info(f"Extracted {len(frames)} frames from video (duration: {duration:.2f}s)")
+    return frames, duration, fps
 
-        # Calculate frame indices to extract based on EXTRACT_FPS
-        frame_interval = int(video_fps / EXTRACT_FPS)
-        indices = list(range(0, num_frames, frame_interval))
 
-        logger.info(f"Extracting {len(indices)} frames at interval {frame_interval}")
-
-        # Extract frames using get_frames_at (GPU-accelerated batch extraction)
-        frame_batch = decoder.get_frames_at(indices=indices)
-
-        # Convert FrameBatch to PIL Images
-        frames = []
-        # frame_batch.data is tensor of shape [N, C, H, W]
-        for i in range(frame_batch.data.shape[0]):
-            # Move to CPU and convert to numpy [H, W, C] format
-            frame_np = frame_batch.data[i].cpu().permute(1, 2, 0).numpy()
-            pil_image = Image.fromarray(frame_np.astype('uint8'), mode='RGB')
-            frames.append(pil_image)
-
-        logger.info(f"Extracted {len(frames)} frames from video (duration: {duration:.2f}s, fps: {video_fps:.2f})")
+def stream_frames(
+    video_path: str, batch_size: int = FRAME_BATCH_SIZE, start: float = 0.0, duration: float | None = None
+) -> tuple[Iterator[torch.Tensor | list[Image.Image]], float, float, list[float] | None]:
+    """
+    Decode sampled frames lazily in batches of at most batch_size, so callers
+    can embed and drop each batch and peak memory no longer grows with the
+    chunk length. Uses TorchCodec with GPU acceleration, yielding uint8
+    [N, C, H, W] tensors, and falls back to ffmpeg (PIL images) if the
+    decoder cannot be opened.
+
+    With FRAME_SAMPLING "scene" or "keyframe" the last element is the list of
+    real frame timestamps (seconds into the file), complete once the batches
+    are exhausted; with "fixed" it is None and frame i is at i / fps.
+
+    With a duration only the [start, start + duration) range of the file is
+    decoded, seeking to it instead of reading from the beginning; the
+    returned duration and timestamps are then relative to start.
+    """
+    try:
+        batches, duration, timestamps = _open_torchcodec(video_path, batch_size, start, duration)
+        return batches, duration, EXTRACT_FPS, timestamps
+    except Exception as e:
+        logger.warning(f"TorchCodec failed: {e}, falling back to ffmpeg")
+        batches, duration, _, timestamps = _decode_ffmpeg(video_path, batch_size, False, start, duration)
+        return batches, duration, EXTRACT_FPS, timestamps
 
-        return frames, duration, EXTRACT_FPS
 
+def decode_media(
+    video_path: str, batch_size: int = FRAME_BATCH_SIZE, start: float = 0.0, duration: float | None = None
+) -> tuple[Iterator[torch.Tensor | list[Image.Image]], float, float, bytes | None, list[float] | None]:
+    """
+    Frames and audio for one chunk without a second ffmpeg process: returns
+    (frame batches, duration, fps, mono s16le PCM at AUDIO_SAMPLE_RATE or None,
+    frame timestamps as in stream_frames).
+    Audio is decoded at chromaprint's native rate, so there is no WAV temp
+    file, no resampling in fpcalc and no ffprobe. With TorchCodec the audio
+    comes from its AudioDecoder on the same source (ffmpeg only if that
+    fails); on the ffmpeg fallback one process decodes both streams. start
+    and duration select a time range of the file as in stream_frames.
+    """
+    try:
+        batches, range_duration, timestamps = _open_torchcodec(video_path, batch_size, start, duration)
     except Exception as e:
         logger.warning(f"TorchCodec failed: {e}, falling back to ffmpeg")
-        return _extract_frames_ffmpeg(video_path)
+        batches, range_duration, pcm, timestamps = _decode_ffmpeg(video_path, batch_size, True, start, duration)
+        return batches, range_duration, EXTRACT_FPS, pcm, timestamps
+
+    try:
+        pcm = _decode_audio_torchcodec(video_path, start, duration)
+    except Exception as e:
+        logger.warning(f"TorchCodec audio decode failed: {e}, falling back to ffmpeg")
+        pcm = extract_audio_pcm(video_path, start, duration)
+    return batches, range_duration, EXTRACT_FPS, pcm, timestamps
+
+
+def _decode_audio_torchcodec(video_path: str, start: float = 0.0, duration: float | None = None) -> bytes | None:
+    """Mono s16le PCM at AUDIO_SAMPLE_RATE from TorchCodec's AudioDecoder, optionally of a time range."""
+    from torchcodec.decoders import AudioDecoder
+
+    decoder = AudioDecoder(video_path, sample_rate=AUDIO_SAMPLE_RATE, num_channels=1)
+    samples = decoder.get_samples_played_in_range(start, None if duration is None else start + duration)
+    # Float samples in [-1, 1] to s16le, scaled and clipped the way ffmpeg converts them
+    pcm = (samples.data[0] * 32768.0).round().clamp(-32768, 32767).to(torch.int16)
+    return pcm.cpu().numpy().astype("<i2", copy=False).tobytes() or None
+
+
+def _range_options(start: float, duration: float | None) -> list[str]:
+    """ffmpeg input options that seek to start and stop after duration."""
+    if duration is None:
+        return ["-ss", str(start)] if start > 0 else []
+    return ["-ss", str(start), "-t", str(duration)]
+
+
+def _open_torchcodec(
+    video_path: str, batch_size: int, start: float = 0.0, range_duration: float | None = None
+) -> tuple[Iterator[torch.Tensor], float, list[float] | None]:
+    from torchcodec.decoders import VideoDecoder, set_cuda_backend
+
+    # Use GPU if available, otherwise CPU
+    device = "cuda" if _check_gpu_available() else "cpu"
+    logger.info(f"Extracting frames with TorchCodec (device: {device})")
+
+    # Use Beta CUDA backend for faster GPU decoding
+    if device == "cuda":
+        set_cuda_backend("beta")
+        logger.info("Using Beta CUDA backend for TorchCodec")
+
+    # A range decode uses the container header's metadata and seeks to it;
+    # exact mode would first scan every packet of the (possibly remote) file
+    ranged = start > 0 or range_duration is not None
+    decoder = VideoDecoder(video_path, device=device, seek_mode="approximate" if ranged else "exact")
+
+    # Get video metadata (TorchCodec 0.9+ API)
+    metadata = decoder.metadata
+    video_fps = metadata.average_fps
+    duration = metadata.duration_seconds
+    num_frames = metadata.num_frames
+    if num_frames is None:
+        num_frames = int(duration * video_fps)
+
+    logger.info(f"Video metadata - fps: {video_fps:.2f}, frames: {num_frames}, duration: {duration:.2f}s")
+
+    # Time range to decode; frame indices and times below are limited to it and,
+    # since the decoder seeks, frames before it are never decoded
+    end = duration if range_duration is None else min(duration, start + range_duration)
+    first_frame, end_frame = int(round(start * video_fps)), min(num_frames, int(round(end * video_fps)))
+    if ranged:
+        logger.info(f"Decoding range {start:.2f}s-{end:.2f}s")
+    duration = max(0.0, end - start)
+
+    if FRAME_SAMPLING == "keyframe":
+        # Keyframe times from the container's packet index (no decode), bounded to the rate limits
+        keyframes = [t - start for t in _keyframe_times(video_path, start, range_duration) if start <= t < end]
+        times = _bounded_times(keyframes, duration)
+        logger.info(f"Extracting {len(times)} keyframe-sampled frames in batches of {batch_size}")
+        timestamps = []
+        return _torchcodec_batches_at(decoder, times, batch_size, timestamps, start), duration, timestamps
+
+    if FRAME_SAMPLING == "scene":
+        # Candidates on the max-rate grid; only scene changes (or min-rate fills) are yielded
+        frame_interval = max(1, int(video_fps / SAMPLING_MAX_FPS))
+        indices = list(range(first_frame, end_frame, frame_interval))
+        logger.info(f"Scene-sampling {len(indices)} candidate frames at interval {frame_interval}")
+        timestamps = []
+        return _scene_select(decoder, indices, batch_size, timestamps, start), duration, timestamps
+
+    # Calculate frame indices to extract based on EXTRACT_FPS
+    frame_interval = max(1, int(video_fps / EXTRACT_FPS))
+    indices = list(range(first_frame, end_frame, frame_interval))
+
+    logger.info(f"Extracting {len(indices)} frames at interval {frame_interval} in batches of {batch_size}")
+
+    return _torchcodec_batches(decoder, indices, batch_size), duration, None
+
+
+def _torchcodec_batches(decoder, indices: list[int], batch_size: int) -> Iterator[torch.Tensor]:
+    for start in range(0, len(indices), batch_size):
+        # Extract frames using get_frames_at (GPU-accelerated batch extraction).
+        # frame_batch.data is a uint8 tensor of shape [N, C, H, W] on the decode
+        # device; the extractor preprocesses it there without a PIL round trip.
+        frame_batch = decoder.get_frames_at(indices=indices[start:start + batch_size])
+        yield frame_batch.data
+
+
+def _torchcodec_batches_at(
+    decoder, times: list[float], batch_size: int, timestamps: list[float], origin: float = 0.0
+) -> Iterator[torch.Tensor]:
+    """Frames played at origin + each of times; timestamps are recorded relative to origin."""
+    for start in range(0, len(times), batch_size):
+        frame_batch = decoder.get_frames_played_at(seconds=[origin + t for t in times[start:start + batch_size]])
+        timestamps.extend(max(0.0, float(t) - origin) for t in frame_batch.pts_seconds)
+        yield frame_batch.data
+
+
+def _scene_select(
+    decoder, indices: list[int], batch_size: int, timestamps: list[float], origin: float = 0.0
+) -> Iterator[torch.Tensor]:
+    """
+    Keep candidate frames whose scene score passes SCENE_THRESHOLD, subject to
+    the sampling rate bounds. The score mirrors ffmpeg's select filter: mean
+    absolute luma difference to the previous candidate on a small thumbnail,
+    less its change from the previous difference, divided by 100. Timestamps
+    are recorded relative to origin.
+    """
+    previous_luma, previous_mafd, last_time = None, 0.0, None
+    for start in range(0, len(indices), batch_size):
+        frame_batch = decoder.get_frames_at(indices=indices[start:start + batch_size])
+        frames = frame_batch.data
+        luma = _luma_thumbnails(frames)
+        if previous_luma is not None:
+            luma_pairs = torch.cat([previous_luma[None], luma])
+        else:
+            luma_pairs = torch.cat([luma[:1], luma])
+        mafd = (luma_pairs[1:] - luma_pairs[:-1]).abs().mean(dim=(1, 2)).tolist()
+        previous_luma = luma[-1]
+
+        keep = []
+        for i, t in enumerate(frame_batch.pts_seconds.tolist()):
+            score = min(mafd[i], abs(mafd[i] - previous_mafd)) / 100
+            previous_mafd = mafd[i]
+            if _admit(t, last_time, score > SCENE_THRESHOLD):
+                keep.append(i)
+                last_time = t
+                timestamps.append(max(0.0, float(t) - origin))
+        if keep:
+            yield frames[keep]
+
+
+def _luma_thumbnails(frames: torch.Tensor) -> torch.Tensor:
+    weights = torch.tensor([0.299, 0.587, 0.114], device=frames.device).view(1, 3, 1, 1)
+    luma = (frames.float() * weights).sum(dim=1, keepdim=True)
+    return torch.nn.functional.interpolate(luma, size=(36, 64), mode="area")[:, 0]
+
+
+def _admit(t: float, last_time: float | None, triggered: bool) -> bool:
+    """Rate bounds shared by the sampling modes: always keep the first frame,
+    force one every 1/SAMPLING_MIN_FPS, and never exceed SAMPLING_MAX_FPS."""
+    if last_time is None:
+        return True
+    gap = t - last_time
+    if SAMPLING_MIN_FPS > 0 and gap >= 1 / SAMPLING_MIN_FPS:
+        return True
+    return triggered and gap >= 1 / SAMPLING_MAX_FPS
+
+
+def _bounded_times(candidates: list[float], duration: float) -> list[float]:
+    """Thin candidate times to SAMPLING_MAX_FPS and fill gaps to SAMPLING_MIN_FPS."""
+    max_gap = 1 / SAMPLING_MIN_FPS if SAMPLING_MIN_FPS > 0 else None
+    end = duration if duration > 0 else (max(candidates, default=0.0) + 1e-6)
+    times: list[float] = []
+    for t in [c for c in sorted(candidates) if c < end] or [0.0]:
+        if max_gap is not None and times:
+            while t - times[-1] > max_gap:
+                times.append(times[-1] + max_gap)
+        if _admit(t, times[-1] if times else None, True):
+            times.append(t)
+    if max_gap is not None:
+        while end - times[-1] > max_gap:
+            times.append(times[-1] + max_gap)
+    return times
+
+
+def _keyframe_times(video_path: str, start: float = 0.0, duration: float | None = None) -> list[float]:
+    # read_intervals seeks to the range so only its packets are listed
+    interval = ["-read_intervals", f"{start}%{'+' + str(duration) if duration is not None else ''}"]
+    cmd = [
+        "ffprobe", "-v", "error",
+        *(interval if start > 0 or duration is not None else []),
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=p=0",
+        video_path,
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    times = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            times.append(max(0.0, float(pts_time)))
+    return times
+
+
+def _sampling_filter() -> str:
+    """ffmpeg video filter for the configured sampling mode."""
+    if FRAME_SAMPLING == "fixed":
+        return f"fps={EXTRACT_FPS}"
+
+    trigger = f"gt(scene,{SCENE_THRESHOLD})" if FRAME_SAMPLING == "scene" else "eq(pict_type,I)"
+    terms = ["isnan(prev_selected_t)", f"{trigger}*gte(t-prev_selected_t,{1 / SAMPLING_MAX_FPS})"]
+    if SAMPLING_MIN_FPS > 0:
+        terms.append(f"gte(t-prev_selected_t,{1 / SAMPLING_MIN_FPS})")
+    # showinfo logs each selected frame's pts_time, which become the stored timestamps
+    return f"select='{'+'.join(terms)}',showinfo"
+
+
+def _tensor_to_pil(frames: torch.Tensor) -> list[Image.Image]:
+    # Move to CPU and convert to numpy [H, W, C] format
+    return [
+        Image.fromarray(frame.cpu().permute(1, 2, 0).numpy().astype('uint8'), mode='RGB')
+        for frame in frames
+    ]
 
 
-def _extract_frames_ffmpeg(video_path: str) -> tuple[list[Image.Image], float, float]:
+def _decode_ffmpeg(
+    video_path: str, batch_size: int, with_audio: bool, start: float = 0.0, range_duration: float | None = None
+) -> tuple[Iterator[list[Image.Image]], float, bytes | None, list[float] | None]:
     """
     Fallback method using ffmpeg for frame extraction.
-    Used when torchvision.io.VideoReader is not available or fails.
+    Frames are written as JPEGs to a temp dir and decoded one batch at a time.
+    With with_audio, the same process also pipes mono PCM to stdout. The
+    duration comes from the container header ffmpeg prints, not from ffprobe.
+    A time range is decoded with input seeking, so output timestamps start
+    at 0 at the range start.
     """
     temp_dir = tempfile.mkdtemp()
     output_pattern = os.path.join(temp_dir, "frame_%06d.jpg")
 
-    cmd = [
-        "ffmpeg",
-        "-i", video_path,
-        "-vf", f"fps={EXTRACT_FPS}",
+    video_output = [
+        "-map", "0:v:0",
+        "-vf", _sampling_filter(),
+        *(["-fps_mode", "vfr"] if FRAME_SAMPLING != "fixed" else []),
         "-q:v", "2",
         "-threads", "1",
         output_pattern,
-        "-y"
+    ]
+    audio_output = [
+        "-map", "0:a:0",
+        "-ac", "1",
+        "-ar", str(AUDIO_SAMPLE_RATE),
+        "-f", "s16le",
+        "pipe:1",
     ]
 
-    logger.info(f"Extracting frames with ffmpeg (CPU mode, threads=1)")
-    subprocess.run(cmd, capture_output=True, check=True)
-
-    duration = get_video_duration(video_path)
+    # Keyframes only with no minimum rate: the decoder can skip everything else
+    input_options = ["-skip_frame", "nokey"] if FRAME_SAMPLING == "keyframe" and SAMPLING_MIN_FPS <= 0 else []
+    input_options += _range_options(start, range_duration)
 
+    logger.info(f"Extracting frames with ffmpeg (CPU mode, threads=1, audio={with_audio}, sampling={FRAME_SAMPLING})")
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-y", *input_options, "-i", video_path, *video_output, *(audio_output if with_audio else [])],
+            capture_output=True,
+        )
+        if result.returncode != 0 and with_audio and b"0:a:0" in result.stderr:
+            # No audio stream: the audio output cannot be mapped
+            logger.info("No audio stream, extracting frames only")
+            with_audio = False
+            result = subprocess.run(
+                ["ffmpeg", "-y", *input_options, "-i", video_path, *video_output],
+                capture_output=True,
+            )
+        result.check_returncode()
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+
+    duration = max(0.0, _parse_ffmpeg_duration(result.stderr) - start)
+    if range_duration is not None:
+        duration = min(duration, range_duration)
+    pcm = result.stdout if with_audio and result.stdout else None
     frame_files = sorted(Path(temp_dir).glob("frame_*.jpg"))
-    frames = [Image.open(f).convert("RGB") for f in frame_files]
-
-    for f in frame_files:
-        f.unlink()
-    Path(temp_dir).rmdir()
-
-    return frames, duration, EXTRACT_FPS
-
-
-def extract_audio(video_path: str) -> tuple[str | None, float | None]:
-    temp_audio = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
-    temp_audio.close()
-
+    timestamps = None
+    if FRAME_SAMPLING != "fixed":
+        timestamps = [max(0.0, float(t)) for t in re.findall(rb"pts_time:\s*(-?[\d.]+)", result.stderr)]
+        if len(timestamps) < len(frame_files):
+            logger.warning(f"Got {len(timestamps)} frame timestamps for {len(frame_files)} frames, assuming fixed spacing")
+            timestamps = None
+        else:
+            timestamps = timestamps[:len(frame_files)]
+
+    def batches() -> Iterator[list[Image.Image]]:
+        try:
+            for start in range(0, len(frame_files), batch_size):
+                yield [Image.open(f).convert("RGB") for f in frame_files[start:start + batch_size]]
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return batches(), duration, pcm, timestamps
+
+
+def _parse_ffmpeg_duration(stderr: bytes) -> float:
+    match = re.search(rb"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", stderr)
+    if not match:
+        return 0.0
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def extract_audio_pcm(video_path: str, start: float = 0.0, duration: float | None = None) -> bytes | None:
+    """Mono s16le PCM at AUDIO_SAMPLE_RATE streamed from ffmpeg's stdout, optionally of a time range."""
     cmd = [
-        "ffmpeg", "-i", video_path,
-        "-vn", "-acodec", "pcm_s16le",
-        "-ar", "44100", "-ac", "1",
-        temp_audio.name,
-        "-y"
+        "ffmpeg", "-v", "error",
+        *_range_options(start, duration),
+        "-i", video_path,
+        "-vn", "-ac", "1",
+        "-ar", str(AUDIO_SAMPLE_RATE),
+        "-f", "s16le",
+        "pipe:1",
     ]
     result = subprocess.run(cmd, capture_output=True)
 
-    if result.returncode != 0:
-        if os.path.exists(temp_audio.name):
-            os.unlink(temp_audio.name)
-        return None, None
+    if result.returncode != 0 or not result.stdout:
+        return None
+    return result.stdout
 
-    duration = get_audio_duration(temp_audio.name)
-    return temp_audio.name, duration
 
+def pcm_duration(pcm: bytes | None) -> float | None:
+    return len(pcm) / (2 * AUDIO_SAMPLE_RATE) if pcm else None
 
-def get_video_duration(video_path: str) -> float:
-    cmd = [
-        "ffprobe", "-v", "error",
-        "-show_entries", "format=duration",
-        "-of", "default=noprint_wrappers=1:nokey=1",
-        video_path
-    ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    return float(result.stdout.strip()) if result.stdout.strip() else 0.0
 
+def chunk_ranges(duration: float, chunk_seconds: float = CHUNK_DURATION_SECONDS) -> list[tuple[float, float]]:
+    """(start, duration) of each chunk, split the same way the web app splits uploads."""
+    ranges = []
+    start = 0.0
+    while start < duration:
+        ranges.append((start, min(chunk_seconds, duration - start)))
+        start += chunk_seconds
+    return ranges
 
-def get_audio_duration(audio_path: str) -> float:
+
+def get_video_duration(video_path: str) -> float:
     cmd = [
         "ffprobe", "-v", "error",
         "-show_entries", "format=duration",
         "-of", "default=noprint_wrappers=1:nokey=1",
-        audio_path
+        video_path
     ]
     result = subprocess.run(cmd, capture_output=True, text=True)
     return float(result.stdout.strip()) if result.stdout.strip() else 0.0
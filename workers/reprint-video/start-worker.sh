@@ -8,6 +8,8 @@ echo "Worker concurrency: ${CONCURRENCY}"
 
 if [ "${GPU_AVAILABLE}" = "True" ]; then
     echo "GPU Device: $(python -c 'import torch; print(torch.cuda.get_device_name(0))')"
+    # Threads share one model; merge their frames into full batches
+    export EMBEDDING_BATCHING=${EMBEDDING_BATCHING:-true}
     echo "Starting Celery worker with pool=threads --concurrency=${CONCURRENCY} (GPU mode)"
     exec celery -A celery_app worker --loglevel=info --pool=threads --concurrency=${CONCURRENCY}
 else
@@ -1,2 +1,10 @@
-from .register import register_chunk, finalize_register
-from .verify import verify_video, finalize_verify
+from .register import register_chunk, register_video, finalize_register, fit_embedding_projection
+from .verify import (
+    verify_video,
+    verify_session,
+    verify_video_multi,
+    verify_session_multi,
+    finalize_verify,
+    identify_audio,
+    identify_video,
+)
@@ -1,26 +1,47 @@
 import logging
+import numpy as np
 from celery_app import app
-from services.video import extract_frames, extract_audio
-from services.image_fingerprint import generate_image_fingerprints
-from services.audio_fingerprint import generate_audio_fingerprint, merge_chromaprint_fingerprints
-from services.storage import download_video, cleanup_temp_files
+from services.video import decode_media, pcm_duration, chunk_ranges, get_video_duration, AUDIO_SAMPLE_RATE
+from services.image_fingerprint import embed_frame_batches
+from services.audio_fingerprint import (
+    generate_audio_fingerprint_pcm,
+    merge_chromaprint_fingerprints,
+    audio_index_hashes,
+)
+from services.embedding_cache import get_base_embedding_cache
+from services.compact_embedding import get_active_projection, fit_and_save_projection
+from services.storage import download_video, get_video_source, release_video
 from models.database import (
+    create_base_video_chunked,
+    create_register_chunk,
     save_chunk_frame_fingerprints,
     save_chunk_audio_fingerprint,
     complete_register_chunk,
     finalize_base_video,
     update_base_video_fps,
     get_all_audio_fingerprints,
-    merge_audio_fingerprints,
     update_video_status,
+    sample_frame_embeddings,
 )
-from utils.redis_pubsub import publish_status, publish_video_status
+from utils.redis_pubsub import publish_status, publish_task_and_video_status
 from utils.gpu_monitor import log_gpu_memory
+from utils.retry import should_retry, retry_countdown
+from config import COMPACT_EMBEDDING, COMPACT_EMBEDDING_DIM, CHUNK_TASK_MAX_RETRIES
 
 logger = logging.getLogger(__name__)
 
 
-@app.task(bind=True)
+def _compact_codes(embeddings) -> tuple | None:
+    if not COMPACT_EMBEDDING or len(embeddings) == 0:
+        return None
+    projection = get_active_projection()
+    if projection is None:
+        logger.warning(f"COMPACT_EMBEDDING={COMPACT_EMBEDDING} but no embedding projection is fitted yet")
+        return None
+    return projection.encode(embeddings, COMPACT_EMBEDDING), projection.id, COMPACT_EMBEDDING
+
+
+@app.task(bind=True, max_retries=CHUNK_TASK_MAX_RETRIES)
 def register_chunk(
     self,
     object_key: str,
@@ -28,7 +49,13 @@ def register_chunk(
     chunk_index: int,
     start_time: float,
     total_chunks: int,
+    chunk_duration: float | None = None,
 ) -> dict:
+    """
+    Register one chunk. Without chunk_duration object_key is the chunk's own
+    object; with it object_key is the whole original and the chunk is its
+    [start_time, start_time + chunk_duration) range (see register_video).
+    """
     task_id = self.request.id
     temp_video_path = None
 
@@ -41,44 +68,60 @@ def register_chunk(
             "status": "processing",
         })
 
-        temp_video_path = download_video(object_key)
-        frames, duration, fps = extract_frames(temp_video_path)
+        if chunk_duration is None:
+            temp_video_path = download_video(object_key)
+            frame_batches, duration, fps, audio_pcm, frame_times = decode_media(temp_video_path)
+        else:
+            temp_video_path = get_video_source(object_key)
+            frame_batches, duration, fps, audio_pcm, frame_times = decode_media(
+                temp_video_path, start=start_time, duration=chunk_duration
+            )
 
         update_base_video_fps(video_id, fps)
 
-        logger.info(f"Generating embeddings for {len(frames)} frames (chunk {chunk_index})")
+        logger.info(f"Generating embeddings (chunk {chunk_index})")
         log_gpu_memory()
 
-        frame_embeddings = generate_image_fingerprints(frames)
-        save_chunk_frame_fingerprints(video_id, chunk_index, start_time, frame_embeddings, fps)
+        phashes = []
+        frame_embeddings = embed_frame_batches(frame_batches, phashes)
+        frame_count = len(frame_embeddings)
+        save_chunk_frame_fingerprints(
+            video_id, chunk_index, start_time, frame_embeddings, fps, _compact_codes(frame_embeddings), frame_times,
+            np.concatenate(phashes) if phashes else None,
+        )
 
         log_gpu_memory()
 
-        audio_path, audio_duration = extract_audio(temp_video_path)
-        if audio_path:
-            fp_data = generate_audio_fingerprint(audio_path)
-            if fp_data:
-                save_chunk_audio_fingerprint(video_id, chunk_index, start_time, fp_data, audio_duration)
+        if audio_pcm:
+            fp_data = generate_audio_fingerprint_pcm(audio_pcm, AUDIO_SAMPLE_RATE)
+            if fp_data is not None and len(fp_data) > 0:
+                save_chunk_audio_fingerprint(video_id, chunk_index, start_time, fp_data, pcm_duration(audio_pcm))
 
-        progress = complete_register_chunk(video_id, chunk_index, len(frames))
+        progress = complete_register_chunk(video_id, chunk_index, frame_count)
+
+        # Enqueue before publishing; if either fails the retry sees is_last again
+        # until the video is finalized, so the finalize is not lost
+        if progress["is_last"]:
+            finalize_register.delay(video_id)
 
         result = {
             "type": "register_chunk_complete",
             "video_id": video_id,
             "chunk_index": chunk_index,
-            "frame_count": len(frames),
+            "frame_count": frame_count,
             "completed_chunks": progress["completed_chunks"],
             "total_chunks": progress["total_chunks"],
             "status": "completed",
         }
         publish_status(task_id, result)
-
-        if progress["completed_chunks"] == progress["total_chunks"]:
-            finalize_register.delay(video_id)
-
         return result
 
     except Exception as e:
+        if should_retry(self, e):
+            countdown = retry_countdown(self.request.retries)
+            logger.warning(f"Register chunk {chunk_index} failed: {e}, retrying in {countdown:.0f}s")
+            raise self.retry(exc=e, countdown=countdown)
+
         logger.error(f"Register chunk {chunk_index} failed: {e}")
         error_result = {
             "type": "register_chunk_error",
@@ -91,7 +134,67 @@ def register_chunk(
         return error_result
 
     finally:
-        cleanup_temp_files(temp_video_path)
+        release_video(temp_video_path)
+
+
+@app.task(bind=True)
+def register_video(self, object_key: str, video_id: str, filename: str) -> dict:
+    """
+    Register a whole uploaded original without pre-split chunk objects: probe
+    its duration, create the chunk rows and fan out one register_chunk per
+    CHUNK_DURATION_SECONDS range of the same object. The last chunk to
+    complete enqueues finalize_register, as with pre-split chunks.
+    """
+    task_id = self.request.id
+    source = None
+
+    try:
+        publish_status(task_id, {
+            "type": "register_video_processing",
+            "video_id": video_id,
+            "object_key": object_key,
+            "status": "processing",
+        })
+
+        source = get_video_source(object_key)
+        ranges = chunk_ranges(get_video_duration(source))
+        if not ranges:
+            raise ValueError(f"Could not read a duration for {object_key}")
+
+        create_base_video_chunked(video_id, filename, object_key, len(ranges))
+        task_ids = []
+        for chunk_index, (start_time, chunk_duration) in enumerate(ranges):
+            create_register_chunk(video_id, chunk_index, start_time, chunk_duration)
+            task = register_chunk.delay(object_key, video_id, chunk_index, start_time, len(ranges), chunk_duration)
+            task_ids.append(task.id)
+
+        logger.info(f"Dispatched {len(ranges)} register chunks for {video_id}")
+
+        result = {
+            "type": "register_video_dispatched",
+            "video_id": video_id,
+            "object_key": object_key,
+            "total_chunks": len(ranges),
+            "task_ids": task_ids,
+            "status": "completed",
+        }
+        publish_status(task_id, result)
+        return result
+
+    except Exception as e:
+        logger.error(f"Register video failed for {video_id}: {e}")
+        error_result = {
+            "type": "register_video_error",
+            "video_id": video_id,
+            "object_key": object_key,
+            "message": str(e),
+            "status": "failed",
+        }
+        publish_task_and_video_status(task_id, video_id, error_result)
+        return error_result
+
+    finally:
+        release_video(source)
 
 
 @app.task(bind=True)
@@ -101,14 +204,22 @@ def finalize_register(self, video_id: str) -> dict:
     try:
         logger.info(f"Finalizing registration for video {video_id}")
 
+        merged_fp = total_duration = hashes = offsets = None
         audio_chunks = get_all_audio_fingerprints(video_id)
         if audio_chunks:
             merged_fp, total_duration = merge_chromaprint_fingerprints(audio_chunks)
-            if merged_fp:
-                merge_audio_fingerprints(video_id, merged_fp, total_duration)
-                logger.info(f"Merged {len(audio_chunks)} audio chunks")
+            if merged_fp is not None:
+                hashes, offsets = audio_index_hashes(merged_fp)
+
+        stats = finalize_base_video(video_id, merged_fp, total_duration, hashes, offsets)
+        if stats is None:
+            # Enqueued again by a retried chunk; the other finalize did the work
+            logger.info(f"Registration for video {video_id} is already finalized")
+            return {"type": "register_complete", "video_id": video_id, "status": "completed"}
+        if merged_fp is not None:
+            logger.info(f"Merged {len(audio_chunks)} audio chunks, indexed {len(hashes)} audio postings")
 
-        stats = finalize_base_video(video_id)
+        get_base_embedding_cache().invalidate(video_id)
 
         result = {
             "type": "register_complete",
@@ -117,8 +228,7 @@ def finalize_register(self, video_id: str) -> dict:
             "duration": stats["duration"],
             "status": "completed",
         }
-        publish_status(task_id, result)
-        publish_video_status(video_id, result)
+        publish_task_and_video_status(task_id, video_id, result)
         return result
 
     except Exception as e:
@@ -130,6 +240,42 @@ def finalize_register(self, video_id: str) -> dict:
             "message": str(e),
             "status": "failed",
         }
+        publish_task_and_video_status(task_id, video_id, error_result)
+        return error_result
+
+
+@app.task(bind=True)
+def fit_embedding_projection(self, sample_size: int = 20000, dim: int = COMPACT_EMBEDDING_DIM) -> dict:
+    """
+    Fit a new projection version for compact embeddings from a random sample
+    of registered frames. Videos registered afterwards are encoded with it;
+    bases encoded with an older version fall back to full precision.
+    """
+    task_id = self.request.id
+
+    try:
+        embeddings = sample_frame_embeddings(sample_size)
+        if len(embeddings) < dim:
+            raise ValueError(f"Need at least {dim} registered frames to fit, found {len(embeddings)}")
+
+        projection = fit_and_save_projection(embeddings, dim)
+
+        result = {
+            "type": "projection_fitted",
+            "projection_id": projection.id,
+            "dim": dim,
+            "sample_size": len(embeddings),
+            "status": "completed",
+        }
+        publish_status(task_id, result)
+        return result
+
+    except Exception as e:
+        logger.error(f"Fitting embedding projection failed: {e}")
+        error_result = {
+            "type": "projection_error",
+            "message": str(e),
+            "status": "failed",
+        }
         publish_status(task_id, error_result)
-        publish_video_status(video_id, error_result)
         return error_result
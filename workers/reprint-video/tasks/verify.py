@@ -1,23 +1,228 @@
 import logging
+import time
+import uuid
+import numpy as np
 from celery_app import app
-from services.video import extract_frames, extract_audio
-from services.image_fingerprint import generate_image_fingerprints, compare_image_fingerprints
-from services.audio_fingerprint import generate_audio_fingerprint, compare_audio_fingerprints
-from services.storage import download_video, cleanup_temp_files
+from services.video import (
+    stream_frames,
+    decode_media,
+    extract_audio_pcm,
+    chunk_ranges,
+    get_video_duration,
+    AUDIO_SAMPLE_RATE,
+)
+from services.image_fingerprint import (
+    embed_frame_batches,
+    compare_image_fingerprints,
+    compare_compact_fingerprints,
+    generate_image_embeddings,
+    vote_frame_matches,
+)
+from services.perceptual_hash import frame_hashes, nearest_hashes
+from services.audio_fingerprint import (
+    generate_audio_fingerprint_pcm,
+    compare_audio_fingerprints,
+    audio_index_hashes,
+    verify_audio_candidate,
+    SECONDS_PER_SAMPLE,
+)
+from services.embedding_cache import get_base_embedding_cache
+from services.compact_embedding import get_active_projection
+from services.storage import download_video, get_video_source, release_video
 from models.database import (
-    get_frame_fingerprints,
+    create_verify_session,
+    create_verify_chunk,
+    get_frame_fingerprint_matrix,
+    get_frame_phashes,
+    get_compact_fingerprints,
     get_audio_fingerprint,
     complete_verify_chunk,
+    decide_verify_session,
+    get_verify_session_decision,
     finalize_verify_session,
     get_base_video_status,
+    search_audio_index,
+    search_similar_frames,
 )
-from utils.redis_pubsub import publish_status, publish_video_status
+from utils.redis_pubsub import publish_status, publish_video_status, publish_task_and_video_status
 from utils.gpu_monitor import log_gpu_memory
+from utils.retry import should_retry, retry_countdown
+from config import (
+    AUDIO_INDEX_CANDIDATES,
+    ANN_TOP_K,
+    ANN_EF_SEARCH,
+    IDENTIFY_CANDIDATES,
+    COMPACT_EMBEDDING,
+    CHUNK_TASK_MAX_RETRIES,
+    PHASH_PREFILTER_DISTANCE,
+    PHASH_EXACT_DISTANCE,
+    IMAGE_SIMILARITY_THRESHOLD,
+    AUDIO_SIMILARITY_THRESHOLD,
+    VERIFY_EARLY_EXIT,
+    VERIFY_EARLY_EXIT_CHUNKS,
+    VERIFY_EARLY_EXIT_MARGIN,
+)
 
 logger = logging.getLogger(__name__)
 
 
-@app.task(bind=True)
+def _base_cache_token(base_status: dict | None) -> tuple | None:
+    if not base_status:
+        return None
+    return (
+        base_status["status"],
+        base_status["completed_chunks"],
+        base_status["frame_count"],
+        base_status["created_at"],
+    )
+
+
+def _compare_with_base(
+    query_embeddings, base_video_id: str, base_status: dict | None, query_frame_indices=None, base_keep=None
+) -> tuple[float, list[dict], dict]:
+    """base_keep optionally masks the base rows (in get_frame_phashes order) worth comparing against."""
+    base_cache = get_base_embedding_cache()
+    token = _base_cache_token(base_status)
+
+    projection = get_active_projection() if COMPACT_EMBEDDING else None
+    if projection is not None:
+        base_frame_indices, base_codes = base_cache.get(
+            f"{base_video_id}:{COMPACT_EMBEDDING}:v{projection.id}",
+            token,
+            lambda _: get_compact_fingerprints(base_video_id, projection.id, COMPACT_EMBEDDING),
+            normalize=False,
+        )
+        if len(base_codes) > 0:
+            if base_keep is not None and len(base_keep) == len(base_codes):
+                base_frame_indices, base_codes = base_frame_indices[base_keep], base_codes[base_keep]
+            logger.info(f"Base embedding cache: {base_cache.stats()}")
+            return compare_compact_fingerprints(
+                projection, COMPACT_EMBEDDING, query_embeddings, base_codes, base_frame_indices, query_frame_indices
+            )
+        logger.info(f"Base {base_video_id} has no {COMPACT_EMBEDDING} v{projection.id} codes, using full precision")
+
+    base_frame_indices, base_embeddings = base_cache.get(base_video_id, token, get_frame_fingerprint_matrix)
+    if base_keep is not None and len(base_keep) == len(base_embeddings):
+        base_frame_indices, base_embeddings = base_frame_indices[base_keep], base_embeddings[base_keep]
+    logger.info(f"Base embedding cache: {base_cache.stats()}")
+    return compare_image_fingerprints(
+        query_embeddings, base_embeddings, base_frame_indices, base_normalized=True,
+        query_frame_indices=query_frame_indices,
+    )
+
+
+def _verify_frames(
+    frame_batches, frame_times: list[float] | None, fps: float, base_video_id: str, base_status: dict | None
+) -> tuple[float, list[dict], dict]:
+    """
+    Embed a query chunk and compare it with the base. When the base has
+    perceptual hashes, query frames that hash-match a base frame reuse its
+    embedding instead of running the model (see _embed_query), and with
+    PHASH_PREFILTER_DISTANCE set only base frames near some query frame are
+    compared. Reused rows are still scored by the embedding comparison.
+    """
+    base_phashes = np.empty(0, dtype=np.int64)
+    if PHASH_EXACT_DISTANCE >= 0 or PHASH_PREFILTER_DISTANCE >= 0:
+        base_phashes = _base_phashes(base_video_id, base_status)
+
+    if len(base_phashes) == 0:
+        query_embeddings = embed_frame_batches(frame_batches)
+        return _compare_with_base(query_embeddings, base_video_id, base_status, _frame_grid_indices(frame_times, fps))
+
+    embedded, query_phashes, nearest, reused = _embed_query(frame_batches, base_phashes)
+    query_frame_indices = _frame_grid_indices(frame_times, fps)
+    logger.info(f"{int(reused.sum())}/{len(reused)} query frames reuse base {base_video_id} embeddings")
+
+    if not reused.any():
+        query_embeddings = embedded if embedded is not None else np.empty((0, 0), dtype=np.float32)
+    else:
+        _, base_embeddings = get_base_embedding_cache().get(
+            base_video_id, _base_cache_token(base_status), get_frame_fingerprint_matrix
+        )
+        query_embeddings = np.empty((len(reused), base_embeddings.shape[1]), dtype=np.float32)
+        query_embeddings[reused] = base_embeddings[nearest[reused]]
+        if embedded is not None:
+            query_embeddings[~reused] = embedded
+
+    base_keep = _prefilter_base(query_phashes, base_phashes)
+    return _compare_with_base(query_embeddings, base_video_id, base_status, query_frame_indices, base_keep)
+
+
+def _base_phashes(base_video_id: str, base_status: dict | None) -> np.ndarray:
+    """The base's frame hashes in get_frame_fingerprint_matrix row order, empty if it has none."""
+    _, phashes = get_base_embedding_cache().get(
+        f"{base_video_id}:phash",
+        _base_cache_token(base_status),
+        lambda _: get_frame_phashes(base_video_id),
+        normalize=False,
+    )
+    return phashes
+
+
+def _prefilter_base(query_phashes: np.ndarray, base_phashes: np.ndarray) -> np.ndarray | None:
+    """base_keep mask for _compare_with_base, or None with PHASH_PREFILTER_DISTANCE off or no hashes."""
+    if PHASH_PREFILTER_DISTANCE < 0 or len(query_phashes) == 0 or len(base_phashes) == 0:
+        return None
+    _, nearest, base_distance = nearest_hashes(query_phashes, base_phashes)
+    base_keep = base_distance <= PHASH_PREFILTER_DISTANCE
+    # Each query frame keeps at least its nearest base frame
+    base_keep[nearest] = True
+    logger.info(f"Hash prefilter kept {int(base_keep.sum())}/{len(base_keep)} base frames")
+    return base_keep
+
+
+def _embed_query(frame_batches, base_phashes: np.ndarray) -> tuple[np.ndarray | None, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Hash each decoded batch before embedding it. In a batch that runs the
+    model for some frame anyway, frames within PHASH_EXACT_DISTANCE bits of a
+    base frame are left out of it; a batch skips the model only when all of
+    its frames are exact (0-bit) matches. So a chunk is only embedded without
+    the model at all when it is a bit-identical re-upload. Reused frames take
+    their nearest base frame's embedding later. Returns (embeddings of the
+    remaining frames or None, query hashes, nearest base row per frame,
+    reuse mask).
+    """
+    embedded, hashes, nearest, reused = [], [], [], []
+    for batch in frame_batches:
+        if len(batch) == 0:
+            continue
+        batch_hashes = frame_hashes(batch)
+        distance, batch_nearest, _ = nearest_hashes(batch_hashes, base_phashes)
+        if PHASH_EXACT_DISTANCE < 0:
+            batch_reused = np.zeros(len(distance), dtype=bool)
+        elif (distance > PHASH_EXACT_DISTANCE).any():
+            batch_reused = distance <= PHASH_EXACT_DISTANCE
+        else:
+            batch_reused = distance == 0
+        hashes.append(batch_hashes)
+        nearest.append(batch_nearest)
+        reused.append(batch_reused)
+
+        if batch_reused.all():
+            continue
+        if batch_reused.any():
+            keep = np.flatnonzero(~batch_reused)
+            batch = [batch[i] for i in keep] if isinstance(batch, list) else batch[keep.tolist()]
+        embedded.append(generate_image_embeddings(batch))
+
+    if not hashes:
+        return None, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=bool)
+    return (
+        np.concatenate(embedded) if embedded else None,
+        np.concatenate(hashes),
+        np.concatenate(nearest),
+        np.concatenate(reused),
+    )
+
+
+def _frame_grid_indices(frame_times: list[float] | None, fps: float) -> np.ndarray | None:
+    """Scene/keyframe-sampled frames placed on the fps grid the base frame indices use."""
+    if frame_times is None:
+        return None
+    return np.rint(np.asarray(frame_times, dtype=np.float64) * fps).astype(np.int64)
+
+
+@app.task(bind=True, max_retries=CHUNK_TASK_MAX_RETRIES)
 def verify_video(
     self,
     object_key: str,
@@ -26,11 +231,26 @@ def verify_video(
     chunk_index: int,
     chunk_start_time: float,
     total_chunks: int,
+    chunk_duration: float | None = None,
 ) -> dict:
+    """
+    Verify one query chunk. Without chunk_duration object_key is the chunk's
+    own object; with it object_key is the whole query and the chunk is its
+    [chunk_start_time, chunk_start_time + chunk_duration) range (see
+    verify_session).
+    """
     task_id = self.request.id
     temp_video_path = None
+    started = time.perf_counter()
 
     try:
+        if VERIFY_EARLY_EXIT:
+            decision = get_verify_session_decision(session_id)
+            if decision is not None:
+                return _skip_verify_chunk(
+                    task_id, session_id, base_video_id, chunk_index, chunk_start_time, total_chunks, decision
+                )
+
         publish_status(task_id, {
             "type": "verify_chunk_processing",
             "session_id": session_id,
@@ -44,28 +264,48 @@ def verify_video(
         if not base_status or base_status["status"] != "completed":
             logger.warning(f"Base video {base_video_id} not ready, status: {base_status}")
 
-        temp_video_path = download_video(object_key)
-        frames, _, fps = extract_frames(temp_video_path)
+        if chunk_duration is None:
+            temp_video_path = download_video(object_key)
+            frame_batches, _, fps, audio_pcm, frame_times = decode_media(temp_video_path)
+        else:
+            temp_video_path = get_video_source(object_key)
+            frame_batches, _, fps, audio_pcm, frame_times = decode_media(
+                temp_video_path, start=chunk_start_time, duration=chunk_duration
+            )
 
-        logger.info(f"Generating query embeddings for {len(frames)} frames (chunk {chunk_index})")
+        logger.info(f"Generating query embeddings (chunk {chunk_index})")
         log_gpu_memory()
 
-        query_embeddings = generate_image_fingerprints(frames)
+        image_similarity, matched_frames, alignment = _verify_frames(
+            frame_batches, frame_times, fps, base_video_id, base_status
+        )
 
         log_gpu_memory()
-
-        base_embeddings = get_frame_fingerprints(base_video_id)
-        image_similarity, matched_frames = compare_image_fingerprints(query_embeddings, base_embeddings)
+        alignment_offset = alignment["offset_frames"] / fps if alignment["offset_frames"] is not None else None
 
         audio_similarity = None
-        audio_path, audio_duration = extract_audio(temp_video_path)
-        if audio_path:
-            query_fp = generate_audio_fingerprint(audio_path)
+        if audio_pcm:
+            query_fp = generate_audio_fingerprint_pcm(audio_pcm, AUDIO_SAMPLE_RATE)
             base_fp = get_audio_fingerprint(base_video_id)
-            if query_fp and base_fp:
+            if query_fp is not None and base_fp is not None:
                 audio_similarity = compare_audio_fingerprints(query_fp, base_fp)
 
-        progress = complete_verify_chunk(session_id, chunk_index, image_similarity, audio_similarity)
+        progress = complete_verify_chunk(
+            session_id,
+            chunk_index,
+            image_similarity,
+            audio_similarity,
+            alignment["alignment_score"],
+            alignment_offset,
+            time.perf_counter() - started,
+        )
+
+        # Enqueue before publishing; if either fails the retry sees is_last again
+        # until the session is finalized, so the finalize is not lost
+        if progress["is_last"]:
+            finalize_verify.delay(session_id, base_video_id)
+        elif VERIFY_EARLY_EXIT:
+            _decide_verify_session(task_id, session_id, base_video_id, chunk_index)
 
         result = {
             "type": "verify_chunk_complete",
@@ -77,17 +317,20 @@ def verify_video(
             "completed_chunks": progress["completed_chunks"],
             "image_similarity": image_similarity,
             "audio_similarity": audio_similarity,
+            "alignment_score": alignment["alignment_score"],
+            "alignment_offset_seconds": alignment_offset,
+            "aligned_frames": alignment["aligned_frames"],
             "status": "completed",
         }
-        publish_status(task_id, result)
-        publish_video_status(base_video_id, result)
-
-        if progress["completed_chunks"] == progress["total_chunks"]:
-            finalize_verify.delay(session_id, base_video_id)
-
+        publish_task_and_video_status(task_id, base_video_id, result)
         return result
 
     except Exception as e:
+        if should_retry(self, e):
+            countdown = retry_countdown(self.request.retries)
+            logger.warning(f"Verify chunk {chunk_index} failed: {e}, retrying in {countdown:.0f}s")
+            raise self.retry(exc=e, countdown=countdown)
+
         logger.error(f"Verify chunk {chunk_index} failed: {e}")
         error_result = {
             "type": "verify_chunk_error",
@@ -98,12 +341,342 @@ def verify_video(
             "message": str(e),
             "status": "failed",
         }
+        publish_task_and_video_status(task_id, base_video_id, error_result)
+        return error_result
+
+    finally:
+        release_video(temp_video_path)
+
+
+@app.task(bind=True)
+def verify_session(self, object_key: str, session_id: str, base_video_id: str, filename: str) -> dict:
+    """
+    Verify a whole uploaded query without pre-split chunk objects: probe its
+    duration, create the session and chunk rows and fan out one verify_video
+    per CHUNK_DURATION_SECONDS range of the same object.
+    """
+    task_id = self.request.id
+    source = None
+
+    try:
+        publish_status(task_id, {
+            "type": "verify_session_processing",
+            "session_id": session_id,
+            "base_video_id": base_video_id,
+            "status": "processing",
+        })
+
+        source = get_video_source(object_key)
+        ranges = chunk_ranges(get_video_duration(source))
+        if not ranges:
+            raise ValueError(f"Could not read a duration for {object_key}")
+
+        create_verify_session(session_id, base_video_id, filename, len(ranges))
+        task_ids = []
+        for chunk_index, (start_time, chunk_duration) in enumerate(ranges):
+            create_verify_chunk(session_id, chunk_index, start_time)
+            task = verify_video.delay(
+                object_key, session_id, base_video_id, chunk_index, start_time, len(ranges), chunk_duration
+            )
+            task_ids.append(task.id)
+
+        logger.info(f"Dispatched {len(ranges)} verify chunks for session {session_id}")
+
+        result = {
+            "type": "verify_session_dispatched",
+            "session_id": session_id,
+            "base_video_id": base_video_id,
+            "total_chunks": len(ranges),
+            "task_ids": task_ids,
+            "status": "completed",
+        }
+        publish_status(task_id, result)
+        return result
+
+    except Exception as e:
+        logger.error(f"Verify session {session_id} failed: {e}")
+        error_result = {
+            "type": "verify_session_error",
+            "session_id": session_id,
+            "base_video_id": base_video_id,
+            "message": str(e),
+            "status": "failed",
+        }
+        publish_task_and_video_status(task_id, base_video_id, error_result)
+        return error_result
+
+    finally:
+        release_video(source)
+
+
+@app.task(bind=True, max_retries=CHUNK_TASK_MAX_RETRIES)
+def verify_video_multi(
+    self,
+    object_key: str,
+    sessions: list[dict],
+    chunk_index: int,
+    chunk_start_time: float,
+    total_chunks: int,
+    chunk_duration: float | None = None,
+) -> dict:
+    """
+    Verify one query chunk against several bases, one verify session per
+    base ({"session_id", "base_video_id"} dicts). The chunk is downloaded,
+    decoded, embedded and fingerprinted once; only the scoring runs per base,
+    each against the shared query embeddings and audio fingerprint. Every
+    session gets its own verify_chunks row and finalizes independently.
+    chunk_duration selects a time range of object_key as in verify_video.
+
+    The hash prefilter (PHASH_PREFILTER_DISTANCE) applies per base as in
+    verify_video. Embedding reuse (PHASH_EXACT_DISTANCE) does not: which rows
+    could be reused depends on the base, so every query frame runs through
+    the model once and all bases score those embeddings.
+    """
+    task_id = self.request.id
+    temp_video_path = None
+    started = time.perf_counter()
+
+    try:
+        if VERIFY_EARLY_EXIT:
+            pending = []
+            for entry in sessions:
+                decision = get_verify_session_decision(entry["session_id"])
+                if decision is None:
+                    pending.append(entry)
+                    continue
+                _skip_verify_chunk(
+                    task_id, entry["session_id"], entry["base_video_id"], chunk_index, chunk_start_time,
+                    total_chunks, decision,
+                )
+            sessions = pending
+
+        publish_status(task_id, {
+            "type": "verify_multi_chunk_processing",
+            "sessions": sessions,
+            "chunk_index": chunk_index,
+            "total_chunks": total_chunks,
+            "status": "processing",
+        })
+
+        results = []
+        if sessions:
+            if chunk_duration is None:
+                temp_video_path = download_video(object_key)
+                frame_batches, _, fps, audio_pcm, frame_times = decode_media(temp_video_path)
+            else:
+                temp_video_path = get_video_source(object_key)
+                frame_batches, _, fps, audio_pcm, frame_times = decode_media(
+                    temp_video_path, start=chunk_start_time, duration=chunk_duration
+                )
+
+            logger.info(f"Generating query embeddings (chunk {chunk_index}, {len(sessions)} bases)")
+            query_hashes = []
+            query_embeddings = embed_frame_batches(
+                frame_batches, query_hashes if PHASH_PREFILTER_DISTANCE >= 0 else None
+            )
+            query_phashes = np.concatenate(query_hashes) if query_hashes else np.empty(0, dtype=np.int64)
+            query_frame_indices = _frame_grid_indices(frame_times, fps)
+            query_fp = generate_audio_fingerprint_pcm(audio_pcm, AUDIO_SAMPLE_RATE) if audio_pcm else None
+            # Shared work is charged to the sessions in equal parts
+            shared_seconds = (time.perf_counter() - started) / len(sessions)
+
+            for entry in sessions:
+                scored = time.perf_counter()
+                session_id, base_video_id = entry["session_id"], entry["base_video_id"]
+                base_status = get_base_video_status(base_video_id)
+                base_keep = None
+                if len(query_phashes) > 0:
+                    base_keep = _prefilter_base(query_phashes, _base_phashes(base_video_id, base_status))
+                image_similarity, _, alignment = _compare_with_base(
+                    query_embeddings, base_video_id, base_status, query_frame_indices, base_keep
+                )
+                alignment_offset = alignment["offset_frames"] / fps if alignment["offset_frames"] is not None else None
+
+                audio_similarity = None
+                if query_fp is not None:
+                    base_fp = get_audio_fingerprint(base_video_id)
+                    if base_fp is not None:
+                        audio_similarity = compare_audio_fingerprints(query_fp, base_fp)
+
+                progress = complete_verify_chunk(
+                    session_id,
+                    chunk_index,
+                    image_similarity,
+                    audio_similarity,
+                    alignment["alignment_score"],
+                    alignment_offset,
+                    shared_seconds + time.perf_counter() - scored,
+                )
+                # A retry re-runs every base and re-sends finalizes not yet run (see verify_video)
+                if progress["is_last"]:
+                    finalize_verify.delay(session_id, base_video_id)
+                elif VERIFY_EARLY_EXIT:
+                    _decide_verify_session(task_id, session_id, base_video_id, chunk_index)
+
+                result = {
+                    "type": "verify_chunk_complete",
+                    "session_id": session_id,
+                    "base_video_id": base_video_id,
+                    "chunk_index": chunk_index,
+                    "chunk_start_time": chunk_start_time,
+                    "total_chunks": total_chunks,
+                    "completed_chunks": progress["completed_chunks"],
+                    "image_similarity": image_similarity,
+                    "audio_similarity": audio_similarity,
+                    "alignment_score": alignment["alignment_score"],
+                    "alignment_offset_seconds": alignment_offset,
+                    "aligned_frames": alignment["aligned_frames"],
+                    "status": "completed",
+                }
+                publish_video_status(base_video_id, result)
+                results.append(result)
+
+        multi_result = {
+            "type": "verify_multi_chunk_complete",
+            "chunk_index": chunk_index,
+            "chunk_start_time": chunk_start_time,
+            "total_chunks": total_chunks,
+            "results": results,
+            "status": "completed",
+        }
+        publish_status(task_id, multi_result)
+        return multi_result
+
+    except Exception as e:
+        if should_retry(self, e):
+            countdown = retry_countdown(self.request.retries)
+            logger.warning(f"Verify multi chunk {chunk_index} failed: {e}, retrying in {countdown:.0f}s")
+            raise self.retry(exc=e, countdown=countdown)
+
+        logger.error(f"Verify multi chunk {chunk_index} failed: {e}")
+        error_result = {
+            "type": "verify_multi_chunk_error",
+            "sessions": sessions,
+            "chunk_index": chunk_index,
+            "total_chunks": total_chunks,
+            "message": str(e),
+            "status": "failed",
+        }
+        publish_status(task_id, error_result)
+        return error_result
+
+    finally:
+        release_video(temp_video_path)
+
+
+@app.task(bind=True)
+def verify_session_multi(self, object_key: str, base_video_ids: list[str], filename: str) -> dict:
+    """
+    Verify one uploaded query against several bases: one verify session per
+    base, sharing a group_id, and one verify_video_multi per chunk range
+    serving all of them.
+    """
+    task_id = self.request.id
+    group_id = str(uuid.uuid4())
+    source = None
+
+    try:
+        publish_status(task_id, {
+            "type": "verify_multi_processing",
+            "group_id": group_id,
+            "base_video_ids": base_video_ids,
+            "status": "processing",
+        })
+
+        source = get_video_source(object_key)
+        ranges = chunk_ranges(get_video_duration(source))
+        if not ranges:
+            raise ValueError(f"Could not read a duration for {object_key}")
+
+        sessions = [{"session_id": str(uuid.uuid4()), "base_video_id": base_video_id} for base_video_id in base_video_ids]
+        for entry in sessions:
+            create_verify_session(entry["session_id"], entry["base_video_id"], filename, len(ranges), group_id)
+            for chunk_index, (start_time, _) in enumerate(ranges):
+                create_verify_chunk(entry["session_id"], chunk_index, start_time)
+
+        task_ids = []
+        for chunk_index, (start_time, chunk_duration) in enumerate(ranges):
+            task = verify_video_multi.delay(object_key, sessions, chunk_index, start_time, len(ranges), chunk_duration)
+            task_ids.append(task.id)
+
+        logger.info(f"Dispatched {len(ranges)} verify chunks against {len(sessions)} bases (group {group_id})")
+
+        result = {
+            "type": "verify_multi_dispatched",
+            "group_id": group_id,
+            "sessions": sessions,
+            "total_chunks": len(ranges),
+            "task_ids": task_ids,
+            "status": "completed",
+        }
+        publish_status(task_id, result)
+        return result
+
+    except Exception as e:
+        logger.error(f"Verify multi failed for {object_key}: {e}")
+        error_result = {
+            "type": "verify_multi_error",
+            "group_id": group_id,
+            "base_video_ids": base_video_ids,
+            "message": str(e),
+            "status": "failed",
+        }
         publish_status(task_id, error_result)
-        publish_video_status(base_video_id, error_result)
         return error_result
 
     finally:
-        cleanup_temp_files(temp_video_path)
+        release_video(source)
+
+
+def _decide_verify_session(task_id: str, session_id: str, base_video_id: str, chunk_index: int) -> None:
+    decided = decide_verify_session(
+        session_id,
+        VERIFY_EARLY_EXIT_CHUNKS,
+        IMAGE_SIMILARITY_THRESHOLD,
+        AUDIO_SIMILARITY_THRESHOLD,
+        VERIFY_EARLY_EXIT_MARGIN,
+    )
+    if decided is None:
+        return
+    logger.info(f"Verify session {session_id} decided {decided['decision']} after chunk {chunk_index}")
+    publish_task_and_video_status(task_id, base_video_id, {
+        "type": "verify_decided",
+        "session_id": session_id,
+        "base_video_id": base_video_id,
+        **decided,
+        "status": "decided",
+    })
+
+
+def _skip_verify_chunk(
+    task_id: str,
+    session_id: str,
+    base_video_id: str,
+    chunk_index: int,
+    chunk_start_time: float,
+    total_chunks: int,
+    decision: str,
+) -> dict:
+    """Close a chunk of an already decided session without downloading or embedding it."""
+    progress = complete_verify_chunk(session_id, chunk_index, None, None, status="skipped")
+    # Also true on a retry while the session is not finalized, as in verify_video
+    if progress["is_last"]:
+        finalize_verify.delay(session_id, base_video_id)
+
+    result = {
+        "type": "verify_chunk_skipped",
+        "session_id": session_id,
+        "base_video_id": base_video_id,
+        "chunk_index": chunk_index,
+        "chunk_start_time": chunk_start_time,
+        "total_chunks": total_chunks,
+        "completed_chunks": progress["completed_chunks"],
+        "decision": decision,
+        # Closed like any other chunk so subscribers counting completions still finish
+        "status": "completed",
+    }
+    publish_task_and_video_status(task_id, base_video_id, result)
+    return result
 
 
 @app.task(bind=True)
@@ -114,6 +687,10 @@ def finalize_verify(self, session_id: str, base_video_id: str) -> dict:
         logger.info(f"Finalizing verification session {session_id}")
 
         stats = finalize_verify_session(session_id)
+        if stats is None:
+            # Enqueued again by a retried chunk after the first finalize ran
+            logger.info(f"Verification session {session_id} is already finalized")
+            return {"type": "verify_complete", "session_id": session_id, "status": "completed"}
 
         result = {
             "type": "verify_complete",
@@ -121,10 +698,12 @@ def finalize_verify(self, session_id: str, base_video_id: str) -> dict:
             "base_video_id": base_video_id,
             "avg_image_similarity": stats["avg_image_similarity"],
             "avg_audio_similarity": stats["avg_audio_similarity"],
+            "decision": stats["decision"],
+            "skipped_chunks": stats["skipped_chunks"],
+            "worker_seconds_saved": stats["worker_seconds_saved"],
             "status": "completed",
         }
-        publish_status(task_id, result)
-        publish_video_status(base_video_id, result)
+        publish_task_and_video_status(task_id, base_video_id, result)
         return result
 
     except Exception as e:
@@ -136,6 +715,125 @@ def finalize_verify(self, session_id: str, base_video_id: str) -> dict:
             "message": str(e),
             "status": "failed",
         }
+        publish_task_and_video_status(task_id, base_video_id, error_result)
+        return error_result
+
+
+@app.task(bind=True)
+def identify_audio(self, object_key: str) -> dict:
+    """
+    Find which registered videos a clip's audio came from, without a known
+    base_video_id. The inverted index proposes candidates by offset voting and
+    only those get the exact Hamming comparison.
+    """
+    task_id = self.request.id
+    temp_video_path = None
+
+    try:
+        publish_status(task_id, {
+            "type": "identify_audio_processing",
+            "object_key": object_key,
+            "status": "processing",
+        })
+
+        temp_video_path = download_video(object_key)
+        audio_pcm = extract_audio_pcm(temp_video_path)
+        query_fp = generate_audio_fingerprint_pcm(audio_pcm, AUDIO_SAMPLE_RATE) if audio_pcm else None
+
+        candidates = []
+        if query_fp is not None and len(query_fp) > 0:
+            hashes, offsets = audio_index_hashes(query_fp)
+            for candidate in search_audio_index(hashes.tolist(), offsets.tolist(), AUDIO_INDEX_CANDIDATES):
+                base_fp = get_audio_fingerprint(candidate["video_id"])
+                if base_fp is None:
+                    continue
+                similarity, offset = verify_audio_candidate(query_fp, base_fp, candidate["offset"])
+                candidates.append({
+                    "video_id": candidate["video_id"],
+                    "votes": candidate["votes"],
+                    "offset_seconds": offset * SECONDS_PER_SAMPLE,
+                    "audio_similarity": similarity,
+                })
+
+        candidates.sort(key=lambda c: c["audio_similarity"], reverse=True)
+
+        result = {
+            "type": "identify_audio_complete",
+            "object_key": object_key,
+            "candidates": candidates,
+            "status": "completed",
+        }
+        publish_status(task_id, result)
+        return result
+
+    except Exception as e:
+        logger.error(f"Identify audio failed for {object_key}: {e}")
+        error_result = {
+            "type": "identify_audio_error",
+            "object_key": object_key,
+            "message": str(e),
+            "status": "failed",
+        }
         publish_status(task_id, error_result)
-        publish_video_status(base_video_id, error_result)
         return error_result
+
+    finally:
+        release_video(temp_video_path)
+
+
+@app.task(bind=True)
+def identify_video(self, object_key: str, chunk_start_time: float = 0.0) -> dict:
+    """
+    Find which registered videos a query chunk's frames came from, without a
+    known base_video_id. Each frame gets top-k ANN neighbours from the HNSW
+    index and the neighbours vote for (base video, time offset).
+    """
+    task_id = self.request.id
+    temp_video_path = None
+
+    try:
+        publish_status(task_id, {
+            "type": "identify_video_processing",
+            "object_key": object_key,
+            "status": "processing",
+        })
+
+        temp_video_path = download_video(object_key)
+        frame_batches, _, fps, frame_times = stream_frames(temp_video_path)
+
+        logger.info(f"Generating query embeddings ({object_key})")
+        query_embeddings = embed_frame_batches(frame_batches)
+
+        matches = search_similar_frames(query_embeddings, ANN_TOP_K, ANN_EF_SEARCH)
+        query_frame_indices = _frame_grid_indices(frame_times, fps)
+        if query_frame_indices is not None:
+            for match in matches:
+                match["query_frame"] = int(query_frame_indices[match["query_frame"]])
+        candidates = vote_frame_matches(matches, fps, IDENTIFY_CANDIDATES)
+        for candidate in candidates:
+            candidate["offset_seconds"] = candidate["base_start_time"] - chunk_start_time
+
+        result = {
+            "type": "identify_video_complete",
+            "object_key": object_key,
+            "chunk_start_time": chunk_start_time,
+            "frame_count": len(query_embeddings),
+            "candidates": candidates,
+            "status": "completed",
+        }
+        publish_status(task_id, result)
+        return result
+
+    except Exception as e:
+        logger.error(f"Identify video failed for {object_key}: {e}")
+        error_result = {
+            "type": "identify_video_error",
+            "object_key": object_key,
+            "message": str(e),
+            "status": "failed",
+        }
+        publish_status(task_id, error_result)
+        return error_result
+
+    finally:
+        release_video(temp_video_path)
@@ -0,0 +1,16 @@
+import numpy as np
+
+_HAS_BITWISE_COUNT = hasattr(np, "bitwise_count")
+_POPCOUNT16 = np.array([bin(i).count("1") for i in range(1 << 16)], dtype=np.uint8)
+
+
+def popcount(values: np.ndarray) -> np.ndarray:
+    """Set bits of each element of an unsigned integer array, as uint8 of the same shape."""
+    if _HAS_BITWISE_COUNT:
+        return np.bitwise_count(values)
+    # NumPy < 2.0: 16-bit lookup table over each element's halfwords
+    values = np.ascontiguousarray(values)
+    if values.dtype.itemsize == 1:
+        return _POPCOUNT16[values]
+    halves = values.view(np.uint16).reshape(*values.shape, values.dtype.itemsize // 2)
+    return _POPCOUNT16[halves].sum(axis=-1, dtype=np.uint8)
@@ -1,19 +1,110 @@
+import atexit
 import json
+import logging
+import threading
+import time
 import redis
-from config import REDIS_URL
+from config import REDIS_URL, REDIS_PUBLISH_FLUSH_MS
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_STATUS = "processing"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# channel -> latest pending progress payload, only used when REDIS_PUBLISH_FLUSH_MS > 0
+_pending: dict[str, str] = {}
+_pending_lock = threading.Lock()
+# Held from draining _pending until the drained events are sent, so a flush and
+# a terminal publish cannot overtake each other on the wire
+_send_lock = threading.Lock()
+_flusher = None
 
 
 def get_redis_client() -> redis.Redis:
-    return redis.from_url(REDIS_URL)
+    """Client on a module-level connection pool (redis-py resets it after fork)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = redis.ConnectionPool.from_url(REDIS_URL)
+    return redis.Redis(connection_pool=_pool)
 
 
 def publish_status(task_id: str, data: dict) -> None:
-    client = get_redis_client()
-    channel = f"task:status:{task_id}"
-    client.publish(channel, json.dumps(data))
+    _publish([f"task:status:{task_id}"], data)
 
 
 def publish_video_status(video_id: str, data: dict) -> None:
+    _publish([f"video:status:{video_id}"], data)
+
+
+def publish_task_and_video_status(task_id: str, video_id: str, data: dict) -> None:
+    """Publish the same event to the task and video channels in one round trip."""
+    _publish([f"task:status:{task_id}", f"video:status:{video_id}"], data)
+
+
+def flush_status() -> None:
+    """Publish any coalesced progress events now."""
+    with _send_lock:
+        with _pending_lock:
+            pending = list(_pending.items())
+            _pending.clear()
+        if pending:
+            _send(pending)
+
+
+def _publish(channels: list[str], data: dict) -> None:
+    payload = json.dumps(data)
+
+    if REDIS_PUBLISH_FLUSH_MS > 0 and data.get("status") == PROGRESS_STATUS:
+        # Only the latest progress event per channel survives until the next flush
+        with _pending_lock:
+            for channel in channels:
+                _pending[channel] = payload
+        _ensure_flusher()
+        return
+
+    # Anything pending goes out first, in the same pipeline, so subscribers
+    # never see a progress event after the terminal one it preceded
+    with _send_lock:
+        with _pending_lock:
+            messages = list(_pending.items())
+            _pending.clear()
+        messages.extend((channel, payload) for channel in channels)
+        _send(messages)
+
+
+def _send(messages: list[tuple[str, str]]) -> None:
     client = get_redis_client()
-    channel = f"video:status:{video_id}"
-    client.publish(channel, json.dumps(data))
+    if len(messages) == 1:
+        client.publish(*messages[0])
+        return
+    pipe = client.pipeline(transaction=False)
+    for channel, payload in messages:
+        pipe.publish(channel, payload)
+    pipe.execute()
+
+
+def _ensure_flusher() -> None:
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _pending_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flush_loop, name="redis-status-flusher", daemon=True)
+            _flusher.start()
+
+
+def _flush_loop() -> None:
+    interval = REDIS_PUBLISH_FLUSH_MS / 1000
+    while True:
+        time.sleep(interval)
+        try:
+            flush_status()
+        except Exception as e:
+            logger.warning(f"Flushing status events failed: {e}")
+
+
+atexit.register(flush_status)
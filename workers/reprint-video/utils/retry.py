@@ -0,0 +1,31 @@
+import random
+import psycopg2
+import redis
+import sqlalchemy.exc
+import urllib3.exceptions
+from minio.error import S3Error
+from config import CHUNK_RETRY_BACKOFF_SECONDS, CHUNK_RETRY_BACKOFF_MAX_SECONDS
+
+# Failures worth recomputing a chunk for: storage, database and broker
+# connectivity. Decode and model errors are deterministic and fail at once.
+RETRYABLE_ERRORS = (
+    S3Error,
+    urllib3.exceptions.HTTPError,
+    sqlalchemy.exc.OperationalError,
+    sqlalchemy.exc.InterfaceError,
+    psycopg2.OperationalError,
+    redis.ConnectionError,
+    redis.TimeoutError,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+def should_retry(task, error: Exception) -> bool:
+    return isinstance(error, RETRYABLE_ERRORS) and task.request.retries < task.max_retries
+
+
+def retry_countdown(retries: int) -> float:
+    """Exponential backoff with full jitter."""
+    ceiling = min(CHUNK_RETRY_BACKOFF_MAX_SECONDS, CHUNK_RETRY_BACKOFF_SECONDS * 2 ** retries)
+    return random.uniform(0, ceiling)